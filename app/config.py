@@ -36,6 +36,9 @@ class Settings(BaseSettings):
     pusher_secret: Optional[str]
     pusher_cluster: Optional[str]
 
+    # "pusher", "native" or "all"
+    websocket_provider: str = "pusher"
+
     sentry_dsn: Optional[str]
 
     cloudflare_account_id: Optional[str]
@@ -53,6 +56,12 @@ class Settings(BaseSettings):
     openai_api_key: Optional[str]
     chatgpt_session_token: Optional[str]
     expo_access_token: Optional[str]
+    expo_api_url: str = "https://exp.host/--/api/v2"
+    expo_receipts_check_interval_seconds: int = 300
+    # collapse a user's pushes from the same channel within this window, 0 disables it
+    push_coalesce_window_seconds: int = 0
+    # write a busy channel's last_message_at at most once per interval, 0 writes it for every message
+    channel_last_message_coalesce_seconds: int = 0
     opengraph_app_id: Optional[str]
 
     # feature flags v0.1
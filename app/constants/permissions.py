@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import List
+from typing import Dict, Iterable, List, Union
 
 
 class Permission(Enum):
@@ -23,6 +23,57 @@ class Permission(Enum):
     APPS_MANAGE = "apps.manage"
 
 
+# bits are persisted in cache, never reuse or reorder them. new permissions get the next free bit
+PERMISSION_BITS: Dict[str, int] = {
+    Permission.MESSAGES_CREATE.value: 1 << 0,
+    Permission.MESSAGES_LIST.value: 1 << 1,
+    Permission.CHANNELS_CREATE.value: 1 << 2,
+    Permission.CHANNELS_VIEW.value: 1 << 3,
+    Permission.CHANNELS_INVITE.value: 1 << 4,
+    Permission.CHANNELS_JOIN.value: 1 << 5,
+    Permission.CHANNELS_PERMISSIONS_MANAGE.value: 1 << 6,
+    Permission.CHANNELS_KICK.value: 1 << 7,
+    Permission.CHANNELS_DELETE.value: 1 << 8,
+    Permission.CHANNELS_MEMBERS_LIST.value: 1 << 9,
+    Permission.MEMBERS_KICK.value: 1 << 10,
+    Permission.ROLES_LIST.value: 1 << 11,
+    Permission.ROLES_CREATE.value: 1 << 12,
+    Permission.APPS_MANAGE.value: 1 << 13,
+}
+
+
+def permissions_to_mask(permissions: Union[int, str, Iterable[str], None]) -> int:
+    """Accepts a mask, a cached mask string, a comma separated string or a list of permissions.
+
+    Unknown permissions are ignored.
+    """
+    if not permissions:
+        return 0
+    if isinstance(permissions, int):
+        return permissions
+    if isinstance(permissions, str):
+        if permissions.isdigit():
+            return int(permissions)
+        permissions = permissions.split(",")
+
+    mask = 0
+    for permission in permissions:
+        mask |= PERMISSION_BITS.get(permission, 0)
+    return mask
+
+
+def mask_to_permissions(mask: int) -> List[str]:
+    return sorted([permission for permission, bit in PERMISSION_BITS.items() if mask & bit])
+
+
+def has_permissions(mask: int, permissions: Iterable[str]) -> bool:
+    for permission in permissions:
+        bit = PERMISSION_BITS.get(permission)
+        if bit is None or not mask & bit:
+            return False
+    return True
+
+
 ALL_PERMISSIONS = [p.value for p in Permission]
 SERVER_OWNER_PERMISSIONS = ALL_PERMISSIONS
 CHANNEL_OWNER_PERMISSIONS = ALL_PERMISSIONS
@@ -71,3 +122,12 @@ DEFAULT_USER_PERMISSIONS = [p.value for p in [Permission.CHANNELS_CREATE]]
 MEMBERS_GROUP = "@members"
 OWNERS_GROUP = "@owners"
 PUBLIC_GROUP = "@public"
+
+ALL_PERMISSIONS_MASK = permissions_to_mask(ALL_PERMISSIONS)
+SERVER_OWNER_PERMISSIONS_MASK = permissions_to_mask(SERVER_OWNER_PERMISSIONS)
+CHANNEL_OWNER_PERMISSIONS_MASK = permissions_to_mask(CHANNEL_OWNER_PERMISSIONS)
+DEFAULT_DM_MEMBER_PERMISSIONS_MASK = permissions_to_mask(DEFAULT_DM_MEMBER_PERMISSIONS)
+DEFAULT_TOPIC_MEMBER_PERMISSIONS_MASK = permissions_to_mask(DEFAULT_TOPIC_MEMBER_PERMISSIONS)
+NON_WHITELISTED_TOPIC_MEMBER_PERMISSIONS_MASK = permissions_to_mask(NON_WHITELISTED_TOPIC_MEMBER_PERMISSIONS)
+DEFAULT_NOT_WHITELISTED_USER_PERMISSIONS_MASK = permissions_to_mask(DEFAULT_NOT_WHITELISTED_USER_PERMISSIONS)
+DEFAULT_USER_PERMISSIONS_MASK = permissions_to_mask(DEFAULT_USER_PERMISSIONS)
@@ -1,20 +1,22 @@
 import logging
-from typing import List, Optional, Union, cast
+from typing import Any, Awaitable, Callable, List, Optional, Union, cast
 
 from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBasic, HTTPBasicCredentials, HTTPBearer
+from fastapi.security.utils import get_authorization_scheme_param
 from jose import ExpiredSignatureError, JWTError
 from sentry_sdk import set_user
-from starlette.requests import Request
+from starlette.requests import HTTPConnection, Request
+from starlette.websockets import WebSocket
 
-from app.helpers.cache_utils import cache
 from app.helpers.jwt import decode_jwt_token
 from app.helpers.permissions import check_request_permissions
+from app.helpers.principals import fetch_cached_app, fetch_cached_user
 from app.helpers.signers import get_user_from_signed_request
+from app.helpers.tokens import is_token_revoked
 from app.models.app import App
 from app.models.user import User
 from app.services.apps import get_app_by_client_id
-from app.services.users import get_user_by_id
 
 oauth2_scheme = HTTPBearer()
 oauth2_no_error_scheme = HTTPBearer(auto_error=False)
@@ -47,17 +49,47 @@ async def get_current_client(request: Request, credentials: HTTPBasicCredentials
     return app
 
 
-async def get_user_from_bearer_request(token: HTTPAuthorizationCredentials):
-    payload = decode_jwt_token(token.credentials)
-    user_id: str = payload.get("sub")
+def _decode_request_jwt(request: HTTPConnection, token: str) -> dict:
+    # user and app dependencies share the same bearer token, decode it only once per request
+    cached_token, payload = getattr(request.state, "jwt_payload", (None, None))
+    if cached_token != token:
+        try:
+            payload = decode_jwt_token(token)
+        except Exception as e:
+            payload = e
+        request.state.jwt_payload = (token, payload)
+
+    if isinstance(payload, Exception):
+        raise payload
+    return cast(dict, payload)
+
+
+async def _resolve_once(request: HTTPConnection, state_key: str, resolver: Callable[[], Awaitable[Any]]):
+    try:
+        result = getattr(request.state, state_key)
+    except AttributeError:
+        try:
+            result = await resolver()
+        except Exception as e:
+            result = e
+        setattr(request.state, state_key, result)
+
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+async def get_user_from_bearer_request(request: HTTPConnection, token: HTTPAuthorizationCredentials):
+    payload = _decode_request_jwt(request, token.credentials)
+    user_id: Optional[str] = payload.get("sub")
     if not user_id:
         raise Exception("User not present in JWT token.")
 
-    client_id: str = payload.get("client_id")
+    client_id: Optional[str] = payload.get("client_id")
     if client_id:
         return None
 
-    user: User = await get_user_by_id(user_id=user_id)
+    user, request.state.principal_cache = await fetch_cached_user(user_id=user_id)
     if not user:
         logger.warning("User in JWT token not found. [user_id=%s]", user_id)
         raise Exception("User in JWT token not found.")
@@ -65,7 +97,13 @@ async def get_user_from_bearer_request(token: HTTPAuthorizationCredentials):
     return user
 
 
-async def get_current_user(request: Request, token: HTTPAuthorizationCredentials = Depends(oauth2_no_error_scheme)):
+async def get_current_user(
+    request: HTTPConnection, token: Optional[HTTPAuthorizationCredentials] = Depends(oauth2_no_error_scheme)
+):
+    return await _resolve_once(request, "auth_user", lambda: _authenticate_user(request, token))
+
+
+async def _authenticate_user(request: HTTPConnection, token: Optional[HTTPAuthorizationCredentials]):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate token",
@@ -87,7 +125,7 @@ async def get_current_user(request: Request, token: HTTPAuthorizationCredentials
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authenticated")
 
         try:
-            user = await get_user_from_bearer_request(token=token)
+            user = await get_user_from_bearer_request(request=request, token=token)
             if not user:
                 return None
 
@@ -101,8 +139,8 @@ async def get_current_user(request: Request, token: HTTPAuthorizationCredentials
             logger.exception("Unknown problems decoding JWT. [jwt=%s]" % token.credentials)
             raise credentials_exception
 
-        if not await cache.client.smembers(f"refresh_tokens:{user_id}"):
-            logger.warning("Refresh tokens have all been revoked. [user_id=%s]", user_id)
+        if await is_token_revoked(user_id, _decode_request_jwt(request, token.credentials)):
+            logger.warning("Tokens have been revoked. [user_id=%s]", user_id)
             raise credentials_exception
 
     request.state.user_id = user_id
@@ -113,15 +151,24 @@ async def get_current_user(request: Request, token: HTTPAuthorizationCredentials
     return user
 
 
-async def get_current_app(request: Request, token: HTTPAuthorizationCredentials = Depends(oauth2_scheme)):
+async def get_current_app(
+    request: HTTPConnection, token: Optional[HTTPAuthorizationCredentials] = Depends(oauth2_scheme)
+):
+    return await _resolve_once(request, "auth_app", lambda: _authenticate_app(request, token))
+
+
+async def _authenticate_app(request: HTTPConnection, token: Optional[HTTPAuthorizationCredentials]):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate token",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if not token:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authenticated")
+
     try:
-        payload = decode_jwt_token(token.credentials)
-        sub: str = payload.get("sub")
+        payload = _decode_request_jwt(request, token.credentials)
+        sub: Optional[str] = payload.get("sub")
         if not sub:
             raise credentials_exception
     except JWTError as e:
@@ -131,20 +178,20 @@ async def get_current_app(request: Request, token: HTTPAuthorizationCredentials
         logger.exception("Problems decoding JWT. [jwt=%s]", token.credentials)
         raise credentials_exception
 
-    client_id: str = payload.get("client_id")
+    client_id: Optional[str] = payload.get("client_id")
     if not client_id:
         return None
 
-    app: App = await get_app_by_client_id(client_id)
-    if str(app.pk) != sub:
-        raise credentials_exception
-
+    app, request.state.principal_cache = await fetch_cached_app(client_id)
     if not app:
         logger.warning("App in JWT token not found. [app_id=%s]", sub)
         raise credentials_exception
 
-    if not await cache.client.smembers(f"refresh_tokens:{str(app.pk)}"):
-        logger.warning("Refresh tokens have all been revoked. [app_id=%s]", sub)
+    if str(app.pk) != sub:
+        raise credentials_exception
+
+    if await is_token_revoked(str(app.pk), payload):
+        logger.warning("Tokens have been revoked. [app_id=%s]", sub)
         raise credentials_exception
 
     request.state.auth_type = "bearer"
@@ -184,6 +231,26 @@ async def get_current_app_non_error(
         return e
 
 
+async def get_current_websocket_actor(
+    websocket: WebSocket, token: Optional[str] = Query(None)
+) -> Union[User, App, None]:
+    # browsers can't set headers on websocket connections, so the access token can also be sent as a query param
+    if not token:
+        _, token = get_authorization_scheme_param(websocket.headers.get("Authorization"))
+
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token) if token else None
+
+    try:
+        user = await get_current_user(websocket, credentials)
+        if user:
+            return user
+
+        return await get_current_app(websocket, credentials)
+    except Exception as e:
+        logger.info("Problem authenticating websocket connection: %s", e)
+        return None
+
+
 class PermissionsChecker:
     def __init__(self, needs_bearer: bool = True, permissions: List[str] = None, raise_exception: Exception = None):
         self.needs_bearer = needs_bearer
@@ -1,5 +1,8 @@
+from typing import Dict, Union
+
 from bson import ObjectId
 
+from app.constants.permissions import permissions_to_mask
 from app.helpers.cache_utils import cache
 from app.models.app import App, AppInstalled
 from app.services.crud import get_item_by_id, get_items
@@ -15,7 +18,7 @@ async def fetch_and_cache_app(app_id: str):
 
     installations = await get_items(filters={"app": ObjectId(app_id)}, result_obj=AppInstalled)
 
-    dict_app = {
+    dict_app: Dict[str, Union[str, int]] = {
         "id": app_id,
         "creator": str(app.creator.pk),
     }
@@ -24,7 +27,7 @@ async def fetch_and_cache_app(app_id: str):
     for installation in installations:
         channel_id = str(installation.channel.pk)
         channel_ids.append(channel_id)
-        dict_app[f"channel:{channel_id}"] = ",".join(installation.scopes)
+        dict_app[f"channel:{channel_id}"] = permissions_to_mask(installation.scopes)
 
     dict_app["channels"] = ",".join(channel_ids)
 
@@ -21,9 +21,10 @@ from starlette.requests import Request
 from starlette.responses import Response
 
 from app.config import get_settings
+from app.constants.permissions import permissions_to_mask
 from app.helpers.cache_utils import cache
-from app.helpers.jwt import generate_jwt_token
-from app.helpers.permissions import validate_oauth_request_scope_str
+from app.helpers.permissions import bump_permissions_version, validate_oauth_request_scope_str
+from app.helpers.tokens import discard_refresh_token, generate_actor_tokens
 from app.models.app import App, AppInstalled
 from app.models.auth import AuthorizationCode, RefreshToken
 from app.models.user import User
@@ -215,7 +216,7 @@ class Storage(BaseStorage):
         if not r_token:
             raise Exception("refresh token not found")
         await delete_item(r_token)
-        await cache.client.srem(f"refresh_tokens:{str(r_token.app.pk)}", refresh_token)
+        await discard_refresh_token(str(r_token.app.pk), refresh_token)
 
     async def create_token(self, request: OAuth2Request, client_id: str, scope: str, *args) -> Token:
         app_settings = get_settings()
@@ -260,19 +261,20 @@ class Storage(BaseStorage):
                 existing_scopes = prev_installed_app.scopes
                 final_scopes = list(set(existing_scopes) | set(scopes))
                 await update_item(prev_installed_app, {"scopes": final_scopes})
-                await cache.client.hset(f"app:{str(app.pk)}", f"channel:{channel_id}", ",".join(final_scopes))
+                await cache.client.hset(
+                    f"app:{str(app.pk)}", f"channel:{channel_id}", permissions_to_mask(final_scopes)
+                )
+
+            await bump_permissions_version(channel_id=channel_id, app_id=str(app.pk))
 
         elif request.post.grant_type == "refresh_token":
             scopes = await validate_oauth_request_scope_str(scope=scope)
         else:
             raise Exception("unexpected grant type", request.post.grant_type)
 
-        access_token = generate_jwt_token({"sub": str(app.pk), "client_id": client_id, "scopes": scopes})
-        refresh_token = generate_jwt_token(
-            {"sub": str(app.pk), "client_id": client_id, "scopes": scopes}, token_type="refresh"
+        access_token, refresh_token = await generate_actor_tokens(
+            str(app.pk), claims={"client_id": client_id, "scopes": scopes}
         )
-
-        await cache.client.sadd(f"refresh_tokens:{str(app.pk)}", refresh_token)
         await create_item(
             RefreshTokenCreateSchema(refresh_token=refresh_token, app=str(app.pk), scopes=scopes),
             result_obj=RefreshToken,
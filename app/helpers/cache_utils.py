@@ -1,16 +1,22 @@
-from typing import Any, List
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
 
 from redis.asyncio.client import Redis
+from redis.exceptions import NoScriptError
 
 from app.config import get_settings
 
 
 class Cache:
     client: Redis = None
+    script_shas: Dict[str, str] = {}
 
 
 cache = Cache()
 
+_cache_scripts: Dict[str, str] = {}
+
 
 async def connect_to_redis(db=None):
     settings = get_settings()
@@ -35,6 +41,74 @@ async def close_redis_connection():
     await cache.client.close()
 
 
+def get_channel_cache_key(channel_id: str, suffix: Optional[str] = None) -> str:
+    # all cached data of a channel shares the same hash tag, so it lives on the same cluster slot
+    key = f"channel:{{{channel_id}}}"
+    if suffix:
+        key += f":{suffix}"
+    return key
+
+
+def register_cache_script(name: str, script: str):
+    _cache_scripts[name] = script
+
+
+async def load_cache_scripts():
+    for name, script in _cache_scripts.items():
+        cache.script_shas[name] = await cache.client.script_load(script)
+
+
+async def eval_cache_script(name: str, keys: List[str], args: Optional[List[Any]] = None) -> Any:
+    args = args or []
+    sha = cache.script_shas.get(name)
+    if sha:
+        try:
+            return await cache.client.evalsha(sha, len(keys), *keys, *args)
+        except NoScriptError:
+            pass
+
+    # script cache was flushed (e.g. redis restart) or scripts weren't loaded yet
+    cache.script_shas[name] = await cache.client.script_load(_cache_scripts[name])
+    return await cache.client.evalsha(cache.script_shas[name], len(keys), *keys, *args)
+
+
 async def convert_redis_list_to_dict(data: List[Any]):
     data_iter = iter(data)
     return dict(zip(data_iter, data_iter))
+
+
+class TTLCache:
+    """Small in-process LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 1.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -1,21 +1,112 @@
+import asyncio
 import datetime
 import json
 import logging
-from typing import Any, Dict, List, Optional
+import secrets
+import time
+from typing import Any, Dict, List, Optional, Set
 
 from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from sentry_sdk import capture_exception
 
-from app.helpers.cache_utils import cache
+from app.config import get_settings
+from app.constants.permissions import permissions_to_mask
+from app.helpers.cache_utils import cache, eval_cache_script, get_channel_cache_key, register_cache_script
+from app.helpers.dates import get_mongo_utc_date
 from app.helpers.queue_utils import timed_task
 from app.helpers.w3 import checksum_address, is_account_address
-from app.models.channel import Channel
+from app.models.channel import Channel, ChannelMember
 from app.models.server import ServerMember
 from app.models.user import User
 from app.schemas.users import UserCreateSchema
-from app.services.crud import create_item, get_item, get_item_by_id, get_items, update_item
+from app.services.crud import create_item, find_and_update_item, get_item, get_item_by_id, get_items, parse_object_id
 
 logger = logging.getLogger(__name__)
 
+# an empty set can't exist in redis, the placeholder tells "no members" apart from "members not cached"
+CHANNEL_MEMBERS_PLACEHOLDER = "-"
+
+CHANNEL_MEMBERS_ADD_SCRIPT_NAME = "add_cached_channel_members"
+CHANNEL_MEMBERS_REMOVE_SCRIPT_NAME = "remove_cached_channel_members"
+CHANNEL_MEMBERS_SWAP_SCRIPT_NAME = "swap_cached_channel_members"
+CHANNEL_MEMBERS_CACHE_BATCH_SIZE = 1000
+# a rebuild that dies halfway leaves its temporary set behind, it expires after this long
+CHANNEL_MEMBERS_BUILD_TTL_SECONDS = 60
+
+# while a rebuild runs, membership changes are also journaled (user -> 1 joined / 0 left) and replayed once
+# the rebuilt set is swapped in, otherwise changes landing between the mongo read and the swap would be lost.
+# members are only added to an already cached set, a partial set would deny access to everyone else
+register_cache_script(
+    CHANNEL_MEMBERS_ADD_SCRIPT_NAME,
+    """
+    if redis.call('EXISTS', KEYS[2]) == 1 then
+        for i = 1, #ARGV do
+            redis.call('HSET', KEYS[2], ARGV[i], '1')
+        end
+    end
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return -1
+    end
+    local added = 0
+    for i = 1, #ARGV do
+        added = added + redis.call('SADD', KEYS[1], ARGV[i])
+    end
+    return added
+    """,
+)
+
+register_cache_script(
+    CHANNEL_MEMBERS_REMOVE_SCRIPT_NAME,
+    """
+    if redis.call('EXISTS', KEYS[2]) == 1 then
+        for i = 1, #ARGV do
+            redis.call('HSET', KEYS[2], ARGV[i], '0')
+        end
+    end
+    local removed = 0
+    for i = 1, #ARGV do
+        removed = removed + redis.call('SREM', KEYS[1], ARGV[i])
+    end
+    return removed
+    """,
+)
+
+register_cache_script(
+    CHANNEL_MEMBERS_SWAP_SCRIPT_NAME,
+    """
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    redis.call('PERSIST', KEYS[2])
+    local changes = redis.call('HGETALL', KEYS[3])
+    for i = 1, #changes, 2 do
+        if changes[i + 1] == '1' then
+            redis.call('SADD', KEYS[2], changes[i])
+        elseif changes[i + 1] == '0' then
+            redis.call('SREM', KEYS[2], changes[i])
+        end
+    end
+    return 1
+    """,
+)
+
+CHANNEL_LAST_MESSAGE_PENDING_SCRIPT_NAME = "set_pending_channel_last_message"
+CHANNEL_LAST_MESSAGE_DUE_KEY = "channels:last_message:due"
+CHANNEL_LAST_MESSAGE_FLUSH_INTERVAL_SECONDS = 1
+CHANNEL_LAST_MESSAGE_FLUSH_BATCH_SIZE = 500
+CHANNEL_LAST_MESSAGE_KEY_MARGIN_SECONDS = 60 * 60
+
+register_cache_script(
+    CHANNEL_LAST_MESSAGE_PENDING_SCRIPT_NAME,
+    """
+    local current = redis.call('GET', KEYS[1])
+    if current and tonumber(current) >= tonumber(ARGV[1]) then
+        return 0
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+    """,
+)
+
 
 async def is_user_in_channel(user: User, channel: Channel) -> bool:
     if channel.kind == "server":
@@ -31,11 +122,117 @@ async def is_user_in_channel(user: User, channel: Channel) -> bool:
             return True
 
     elif channel.kind == "dm" or channel.kind == "topic":
-        return user in channel.members
+        return await is_channel_member(channel, user.pk)
 
     return False
 
 
+async def is_channel_member(channel: Channel, user_id: ObjectId) -> bool:
+    return bool(await filter_channel_members(channel, [user_id]))
+
+
+async def filter_channel_members(channel: Channel, user_ids: List[ObjectId]) -> Set[ObjectId]:
+    if not channel.external_members:
+        return {member.pk for member in channel.members or []} & set(user_ids)
+
+    cursor = ChannelMember.collection.find(
+        {"channel": channel.pk, "user": {"$in": user_ids}}, projection={"user": 1, "_id": 0}
+    )
+    return {doc["user"] async for doc in cursor}
+
+
+async def get_channel_member_ids(
+    channel: Channel, after: Optional[ObjectId] = None, limit: Optional[int] = None
+) -> List[ObjectId]:
+    if not channel.external_members:
+        member_ids = sorted(member.pk for member in channel.members or [])
+        if after:
+            member_ids = [member_id for member_id in member_ids if member_id > after]
+        return member_ids[:limit] if limit else member_ids
+
+    filters: Dict[str, Any] = {"channel": channel.pk}
+    if after:
+        filters["user"] = {"$gt": after}
+
+    cursor = ChannelMember.collection.find(filters, projection={"user": 1, "_id": 0}).sort("user", ASCENDING)
+    if limit:
+        cursor.limit(limit)
+
+    return [doc["user"] async for doc in cursor]
+
+
+async def add_channel_members(channel: Channel, user_ids: List[ObjectId]) -> Channel:
+    if not user_ids:
+        return channel
+
+    if not channel.external_members:
+        # a single pipeline update, so concurrent joins can't overwrite each other or skew member_count
+        current_members = {"$ifNull": ["$members", []]}
+        new_members = {"$filter": {"input": user_ids, "cond": {"$not": [{"$in": ["$$this", current_members]}]}}}
+        return await find_and_update_item(
+            filters={"_id": channel.pk},
+            data=[
+                {"$set": {"members": {"$concatArrays": [current_members, new_members]}}},
+                {"$set": {"member_count": {"$size": "$members"}}},
+            ],
+            result_obj=Channel,
+        )
+
+    joined_at = get_mongo_utc_date()
+    operations = [
+        UpdateOne(
+            {"channel": channel.pk, "user": user_id},
+            {"$setOnInsert": {"joined_at": joined_at, "created_at": joined_at, "deleted": False}},
+            upsert=True,
+        )
+        for user_id in user_ids
+    ]
+    result = await ChannelMember.collection.bulk_write(operations, ordered=False)
+    return await find_and_update_item(
+        filters={"_id": channel.pk}, data={"$inc": {"member_count": result.upserted_count}}, result_obj=Channel
+    )
+
+
+async def remove_channel_members(channel: Channel, user_ids: List[ObjectId]) -> Channel:
+    if not channel.external_members:
+        current_members = {"$ifNull": ["$members", []]}
+        return await find_and_update_item(
+            filters={"_id": channel.pk},
+            data=[
+                {
+                    "$set": {
+                        "members": {
+                            "$filter": {"input": current_members, "cond": {"$not": [{"$in": ["$$this", user_ids]}]}}
+                        }
+                    }
+                },
+                {"$set": {"member_count": {"$size": "$members"}}},
+            ],
+            result_obj=Channel,
+        )
+
+    # rows are removed rather than soft-deleted, the unique (channel, user) index would block joining again
+    result = await ChannelMember.collection.delete_many({"channel": channel.pk, "user": {"$in": user_ids}})
+    return await find_and_update_item(
+        filters={"_id": channel.pk}, data={"$inc": {"member_count": -result.deleted_count}}, result_obj=Channel
+    )
+
+
+async def get_member_channels_filter(user_ids: List[ObjectId]) -> Dict[str, Any]:
+    """Mongo filter matching the channels all given users are members of."""
+    members_filter: Dict[str, Any] = {"members": {"$all": user_ids}}
+
+    external_channel_ids: Set[ObjectId] = set()
+    for index, user_id in enumerate(user_ids):
+        user_channel_ids = set(await ChannelMember.collection.distinct("channel", {"user": user_id}))
+        external_channel_ids = user_channel_ids if index == 0 else external_channel_ids & user_channel_ids
+        if not external_channel_ids:
+            return members_filter
+
+    # wrapped in $and so it doesn't clash with the $or of the deleted filter
+    return {"$and": [{"$or": [members_filter, {"_id": {"$in": list(external_channel_ids)}}]}]}
+
+
 async def get_channel_online_users(channel: Channel) -> List[User]:
     users = await get_channel_users(channel)
     return [user for user in users if user.status == "online"]
@@ -60,40 +257,256 @@ async def convert_permission_object_to_cached(channel: Channel) -> str:
     channel_overwrites = {}
     for overwrite in channel.permission_overwrites:
         if overwrite.role:
-            channel_overwrites[str(overwrite.role.pk)] = overwrite.permissions
+            channel_overwrites[str(overwrite.role.pk)] = permissions_to_mask(overwrite.permissions)
         elif overwrite.group:
-            channel_overwrites[str(overwrite.group)] = overwrite.permissions
+            channel_overwrites[str(overwrite.group)] = permissions_to_mask(overwrite.permissions)
 
     return json.dumps(channel_overwrites)
 
 
+def get_channel_members_key(channel_id: str) -> str:
+    return get_channel_cache_key(channel_id, "members")
+
+
+def _get_channel_members_journal_key(channel_id: str) -> str:
+    return get_channel_cache_key(channel_id, "members_journal")
+
+
+async def convert_channel_to_cached(channel: Channel) -> Dict[str, Any]:
+    dict_channel = {"kind": channel.kind, "owner": str(channel.owner.pk)}
+
+    if channel.kind == "server":
+        dict_channel["server"] = str(channel.server.pk)
+
+    dict_channel["permissions"] = await convert_permission_object_to_cached(channel)
+    return dict_channel
+
+
 async def fetch_and_cache_channel(channel_id: Optional[str]) -> Optional[Dict[str, Any]]:
     if not channel_id:
         return None
 
+    await _start_channel_members_journals([channel_id])
     channel = await get_item_by_id(id_=channel_id, result_obj=Channel)
     if not channel:
         return None
 
-    dict_channel = {"kind": channel.kind, "owner": str(channel.owner.pk)}
+    dict_channel = await convert_channel_to_cached(channel)
+    member_ids = await get_channel_member_ids(channel)
+    async with cache.client.pipeline(transaction=False) as pipe:
+        building_key = _cache_channel(pipe, channel_id, channel, dict_channel, member_ids)
+        await pipe.execute()
 
-    if channel.kind == "dm" or channel.kind == "topic":
-        dict_channel["members"] = ",".join([str(member.pk) for member in channel.members])
+    if building_key:
+        await _swap_cached_channel_members(channel_id, building_key)
 
-    if channel.kind == "server":
-        dict_channel["server"] = str(channel.server.pk)
+    return dict_channel
 
-    dict_channel["permissions"] = await convert_permission_object_to_cached(channel)
 
-    await cache.client.hset(f"channel:{channel_id}", mapping=dict_channel)
-    return dict_channel
+async def fetch_and_cache_channels(channel_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    if not channel_ids:
+        return {}
+
+    await _start_channel_members_journals(channel_ids)
+    object_ids = [ObjectId(channel_id) for channel_id in channel_ids]
+    channels = await get_items(filters={"_id": {"$in": object_ids}}, result_obj=Channel, limit=None)
+
+    dict_channels = {}
+    building_keys = {}
+    async with cache.client.pipeline(transaction=False) as pipe:
+        for channel in channels:
+            channel_id = str(channel.pk)
+            dict_channels[channel_id] = await convert_channel_to_cached(channel)
+            member_ids = await get_channel_member_ids(channel)
+            building_key = _cache_channel(pipe, channel_id, channel, dict_channels[channel_id], member_ids)
+            if building_key:
+                building_keys[channel_id] = building_key
+        await pipe.execute()
+
+    for channel_id, building_key in building_keys.items():
+        await _swap_cached_channel_members(channel_id, building_key)
+
+    return dict_channels
+
+
+async def _start_channel_members_journals(channel_ids: List[str]):
+    # started before members are read from mongo, so every change the read might have missed is journaled
+    async with cache.client.pipeline(transaction=False) as pipe:
+        for channel_id in channel_ids:
+            journal_key = _get_channel_members_journal_key(channel_id)
+            pipe.hset(journal_key, CHANNEL_MEMBERS_PLACEHOLDER, "")
+            pipe.expire(journal_key, CHANNEL_MEMBERS_BUILD_TTL_SECONDS)
+        await pipe.execute()
+
+
+async def _swap_cached_channel_members(channel_id: str, building_key: str):
+    await eval_cache_script(
+        CHANNEL_MEMBERS_SWAP_SCRIPT_NAME,
+        keys=[building_key, get_channel_members_key(channel_id), _get_channel_members_journal_key(channel_id)],
+    )
+
+
+def _cache_channel(
+    pipe, channel_id: str, channel: Channel, dict_channel: Dict[str, Any], member_ids: List[ObjectId]
+) -> Optional[str]:
+    channel_key = get_channel_cache_key(channel_id)
+    pipe.hset(channel_key, mapping=dict_channel)
+    # members used to be cached as a comma-joined field of the channel hash
+    pipe.hdel(channel_key, "members")
+
+    if channel.kind != "dm" and channel.kind != "topic":
+        return None
+
+    # the set is built under a temporary key and swapped into place, so readers never see it partly filled
+    building_key = get_channel_cache_key(channel_id, f"members:{secrets.token_hex(8)}")
+    pipe.sadd(building_key, CHANNEL_MEMBERS_PLACEHOLDER)
+    pipe.expire(building_key, CHANNEL_MEMBERS_BUILD_TTL_SECONDS)
+    for index in range(0, len(member_ids), CHANNEL_MEMBERS_CACHE_BATCH_SIZE):
+        batch = member_ids[index : index + CHANNEL_MEMBERS_CACHE_BATCH_SIZE]
+        pipe.sadd(building_key, *[str(member_id) for member_id in batch])
+    return building_key
+
+
+async def is_user_channel_member(channel_id: str, user_id: str) -> bool:
+    members_key = get_channel_members_key(channel_id)
+    async with cache.client.pipeline(transaction=False) as pipe:
+        pipe.exists(members_key)
+        pipe.sismember(members_key, user_id)
+        members_cached, is_member = await pipe.execute()
+
+    if not members_cached:
+        await fetch_and_cache_channel(channel_id)
+        is_member = await cache.client.sismember(members_key, user_id)
+
+    return bool(is_member)
+
+
+async def add_cached_channel_members(channel_id: str, member_ids: List[str]):
+    if not member_ids:
+        return
+
+    await eval_cache_script(
+        CHANNEL_MEMBERS_ADD_SCRIPT_NAME,
+        keys=[get_channel_members_key(channel_id), _get_channel_members_journal_key(channel_id)],
+        args=member_ids,
+    )
+
+
+async def remove_cached_channel_members(channel_id: str, member_ids: List[str]):
+    if not member_ids:
+        return
+
+    await eval_cache_script(
+        CHANNEL_MEMBERS_REMOVE_SCRIPT_NAME,
+        keys=[get_channel_members_key(channel_id), _get_channel_members_journal_key(channel_id)],
+        args=member_ids,
+    )
+
+
+async def _set_channel_last_message_at(channel_id: ObjectId, message_created_at: datetime.datetime):
+    # $max keeps the latest timestamp no matter in which order concurrent messages land
+    await Channel.collection.update_one({"_id": channel_id}, {"$max": {"last_message_at": message_created_at}})
+
+
+async def _flush_pending_channel_last_message(channel_id: str) -> bool:
+    pending_timestamp = await cache.client.getdel(get_channel_cache_key(channel_id, "last_message_pending"))
+    if not pending_timestamp:
+        return False
+
+    pending_created_at = datetime.datetime.fromtimestamp(float(pending_timestamp), tz=datetime.timezone.utc)
+    await _set_channel_last_message_at(ObjectId(channel_id), pending_created_at)
+    return True
+
+
+async def flush_due_channel_last_messages(until: Optional[float] = None) -> int:
+    until = until or time.time()
+    flushed_channels = 0
+
+    while True:
+        due_channel_ids = await cache.client.zrangebyscore(
+            CHANNEL_LAST_MESSAGE_DUE_KEY, 0, until, start=0, num=CHANNEL_LAST_MESSAGE_FLUSH_BATCH_SIZE
+        )
+        if not due_channel_ids:
+            break
+
+        # a channel is flushed by whichever worker manages to remove it from the due set
+        async with cache.client.pipeline(transaction=False) as pipe:
+            for channel_id in due_channel_ids:
+                pipe.zrem(CHANNEL_LAST_MESSAGE_DUE_KEY, channel_id)
+            removed = await pipe.execute()
+
+        for channel_id, was_removed in zip(due_channel_ids, removed):
+            if was_removed and await _flush_pending_channel_last_message(channel_id):
+                flushed_channels += 1
+
+    return flushed_channels
+
+
+class ChannelLastMessageJob:
+    task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def _run(cls):
+        while True:
+            await asyncio.sleep(CHANNEL_LAST_MESSAGE_FLUSH_INTERVAL_SECONDS)
+            try:
+                await flush_due_channel_last_messages()
+            except Exception as e:
+                logger.exception("problem flushing pending channel last messages")
+                capture_exception(e)
+
+    @classmethod
+    def start(cls):
+        if get_settings().channel_last_message_coalesce_seconds <= 0 or cls.task is not None:
+            return
+
+        cls.task = asyncio.create_task(cls._run(), name="ChannelLastMessageJob")
+
+    @classmethod
+    async def stop(cls):
+        if cls.task is None:
+            return
+
+        cls.task.cancel()
+        try:
+            await cls.task
+        except asyncio.CancelledError:
+            pass
+        cls.task = None
+
+        # writing a pending timestamp early is harmless, so nothing is left waiting for another worker
+        await flush_due_channel_last_messages(until=float("inf"))
+
+
+async def channel_last_message_job_start() -> None:
+    ChannelLastMessageJob.start()
+
+
+async def channel_last_message_job_shutdown() -> None:
+    await ChannelLastMessageJob.stop()
 
 
 @timed_task()
 async def update_channel_last_message(channel_id, message_created_at: datetime.datetime):
-    channel = await get_item_by_id(id_=channel_id, result_obj=Channel)
-    if not channel.last_message_at or message_created_at > channel.last_message_at:
-        await update_item(item=channel, data={"last_message_at": message_created_at})
+    channel_pk = await parse_object_id(channel_id)
+    coalesce_seconds = get_settings().channel_last_message_coalesce_seconds
+    if coalesce_seconds <= 0:
+        await _set_channel_last_message_at(channel_pk, message_created_at)
+        return
+
+    # the first message of an interval is written right away, the ones that follow are flushed by the job
+    lock_key = get_channel_cache_key(str(channel_pk), "last_message_lock")
+    if await cache.client.set(lock_key, 1, nx=True, ex=coalesce_seconds):
+        await _set_channel_last_message_at(channel_pk, message_created_at)
+        return
+
+    # the pending value is stored before the channel is marked due, so a flush can never miss it
+    await eval_cache_script(
+        CHANNEL_LAST_MESSAGE_PENDING_SCRIPT_NAME,
+        keys=[get_channel_cache_key(str(channel_pk), "last_message_pending")],
+        args=[message_created_at.timestamp(), coalesce_seconds + CHANNEL_LAST_MESSAGE_KEY_MARGIN_SECONDS],
+    )
+    await cache.client.zadd(CHANNEL_LAST_MESSAGE_DUE_KEY, {str(channel_pk): time.time() + coalesce_seconds}, nx=True)
 
 
 async def parse_member_list(members: List[str], create_if_not_user: bool = True) -> List[User]:
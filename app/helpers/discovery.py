@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import secrets
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from app.helpers.cache_utils import cache, eval_cache_script, register_cache_script
+from app.helpers.queue_utils import queue_bg_task
+from app.models.channel import Channel
+
+logger = logging.getLogger(__name__)
+
+# payloads are refreshed in the background once stale, and only dropped after the hard ttl
+DISCOVERY_CACHE_FRESH_SECONDS = 60
+DISCOVERY_CACHE_STALE_SECONDS = 600
+DISCOVERY_CACHE_LOCK_SECONDS = 30
+
+# requests that miss the cache while another worker builds it wait up to this long before building on their own
+DISCOVERY_CACHE_WAIT_SECONDS = 1.0
+DISCOVERY_CACHE_WAIT_INTERVAL_SECONDS = 0.05
+
+DISCOVERY_PUBLIC_PERMISSIONS = ["messages.list", "channels.view"]
+
+# same hash tag on every discovery key, so the store script can touch them together
+_DISCOVERY_KEY_PREFIX = "discovery:{channels}:@public"
+_DISCOVERY_VERSION_KEY = f"{_DISCOVERY_KEY_PREFIX}:version"
+_DISCOVERY_VARIANTS_KEY = f"{_DISCOVERY_KEY_PREFIX}:variants"
+
+DISCOVERY_STORE_SCRIPT_NAME = "store_discovery_payload"
+DISCOVERY_RELEASE_LOCK_SCRIPT_NAME = "release_discovery_lock"
+
+# a refresh that started before an invalidation must not write its outdated payload back
+register_cache_script(
+    DISCOVERY_STORE_SCRIPT_NAME,
+    """
+    local version = redis.call('GET', KEYS[2]) or '0'
+    if version ~= ARGV[1] then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'payload', ARGV[2], 'fresh_until', ARGV[3])
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+    redis.call('SADD', KEYS[3], KEYS[1])
+    return 1
+    """,
+)
+
+# a build that outlived its lock must not release the one another worker has taken since
+register_cache_script(
+    DISCOVERY_RELEASE_LOCK_SCRIPT_NAME,
+    """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """,
+)
+
+
+def get_discovery_cache_key(tags: Optional[List[str]], limit: int) -> str:
+    cache_key = _DISCOVERY_KEY_PREFIX
+    if tags:
+        cache_key += f":{','.join(sorted(tags))}"
+    return f"{cache_key}:{limit}"
+
+
+def _get_lock_key(cache_key: str) -> str:
+    return f"{cache_key}:lock"
+
+
+def is_discoverable_channel(channel: Channel) -> bool:
+    if channel.kind != "topic" or channel.deleted:
+        return False
+
+    for overwrite in channel.permission_overwrites or []:
+        if overwrite.group == "@public" and set(DISCOVERY_PUBLIC_PERMISSIONS) <= set(overwrite.permissions or []):
+            return True
+
+    return False
+
+
+async def _store_payload(cache_key: str, version: str, payload: str):
+    fresh_until = time.time() + DISCOVERY_CACHE_FRESH_SECONDS
+    await eval_cache_script(
+        DISCOVERY_STORE_SCRIPT_NAME,
+        keys=[cache_key, _DISCOVERY_VERSION_KEY, _DISCOVERY_VARIANTS_KEY],
+        args=[version, payload, fresh_until, DISCOVERY_CACHE_STALE_SECONDS],
+    )
+
+
+async def _build_and_store_payload(cache_key: str, build_payload: Callable[[], Awaitable[str]], lock_token: str) -> str:
+    try:
+        version = await cache.client.get(_DISCOVERY_VERSION_KEY) or "0"
+        payload = await build_payload()
+        await _store_payload(cache_key, version, payload)
+        return payload
+    finally:
+        await eval_cache_script(DISCOVERY_RELEASE_LOCK_SCRIPT_NAME, keys=[_get_lock_key(cache_key)], args=[lock_token])
+
+
+async def _acquire_lock(cache_key: str) -> Optional[str]:
+    lock_token = secrets.token_hex(8)
+    if await cache.client.set(_get_lock_key(cache_key), lock_token, nx=True, ex=DISCOVERY_CACHE_LOCK_SECONDS):
+        return lock_token
+    return None
+
+
+async def _wait_for_payload(cache_key: str) -> Optional[str]:
+    waited = 0.0
+    while waited < DISCOVERY_CACHE_WAIT_SECONDS:
+        await asyncio.sleep(DISCOVERY_CACHE_WAIT_INTERVAL_SECONDS)
+        waited += DISCOVERY_CACHE_WAIT_INTERVAL_SECONDS
+        payload = await cache.client.hget(cache_key, "payload")
+        if payload is not None:
+            return payload
+
+    return None
+
+
+async def get_cached_discovery_payload(cache_key: str, build_payload: Callable[[], Awaitable[str]]) -> str:
+    cached = await cache.client.hgetall(cache_key)
+    if cached:
+        if float(cached["fresh_until"]) < time.time():
+            lock_token = await _acquire_lock(cache_key)
+            if lock_token:
+                await queue_bg_task(_build_and_store_payload, cache_key, build_payload, lock_token)
+        return cached["payload"]
+
+    lock_token = await _acquire_lock(cache_key)
+    if lock_token:
+        return await _build_and_store_payload(cache_key, build_payload, lock_token)
+
+    payload = await _wait_for_payload(cache_key)
+    if payload is not None:
+        return payload
+
+    logger.info("discovery payload still missing after waiting for refresh. [key=%s]", cache_key)
+    return await build_payload()
+
+
+async def invalidate_discovery_cache():
+    await cache.client.incr(_DISCOVERY_VERSION_KEY)
+    cache_keys = await cache.client.smembers(_DISCOVERY_VARIANTS_KEY)
+    await cache.client.delete(_DISCOVERY_VARIANTS_KEY, *cache_keys)
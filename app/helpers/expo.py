@@ -1,95 +1,334 @@
 import asyncio
+import gzip
 import json
 import logging
 import random
-import zlib
-from typing import List
+import time
+from typing import Dict, List, Optional, Tuple
 
 import aiohttp
+from aiohttp import ClientTimeout
+from pymongo import UpdateMany
+from sentry_sdk import capture_exception
 
 from app.config import get_settings
+from app.helpers.cache_utils import cache
 from app.models.user import User
-from app.services.crud import find_and_update_item
 
 logger = logging.getLogger(__name__)
 
+EXPO_MAX_MESSAGES_PER_REQUEST = 100
+EXPO_MAX_RECEIPT_IDS_PER_REQUEST = 1000
+EXPO_MAX_CONCURRENT_REQUESTS = 6
+EXPO_MAX_RETRIES = 5
 
-async def expo_push(headers, data, attempts=0, max_retries=5):
-    async with aiohttp.ClientSession(headers=headers) as session:
-        try:
-            async with session.post("https://exp.host/--/api/v2/push/send", data=data) as resp:
-                if not resp.ok:
-                    if resp.status == 429 or str(resp.status).startswith("5"):
-                        if attempts >= max_retries:
-                            logger.error(f"unable to send notifications. max retries exceeded ({max_retries})")
-                            resp.raise_for_status()
-
-                        attempts += 1
-                        delay = 2**attempts + random.uniform(0, 1)
-                        logger.warning(
-                            f"notifications failed (attempt {attempts}), waiting {delay:.2f}s and trying again. "
-                            f"{resp.status}"
+# expo recommends checking receipts ~15 minutes after sending, and only keeps them for 24 hours
+EXPO_RECEIPT_DELAY_SECONDS = 15 * 60
+EXPO_RECEIPT_MAX_AGE_SECONDS = 24 * 60 * 60
+
+PUSH_RECEIPTS_PENDING_KEY = "expo:receipts:pending"
+PUSH_RECEIPTS_TOKENS_KEY = "expo:receipts:tokens"
+PUSH_RECEIPTS_LOCK_KEY = "expo:receipts:lock"
+
+
+def _get_message_tokens(push_message: dict) -> List[str]:
+    tokens = push_message.get("to", [])
+    if isinstance(tokens, str):
+        return [tokens]
+    return list(tokens)
+
+
+def chunk_push_messages(push_messages: List[dict], max_size: int = EXPO_MAX_MESSAGES_PER_REQUEST) -> List[List[dict]]:
+    # expo counts every recipient token as a separate message
+    chunks: List[List[dict]] = []
+    current_chunk: List[dict] = []
+    current_size = 0
+
+    for push_message in push_messages:
+        message_size = max(len(_get_message_tokens(push_message)), 1)
+        if current_chunk and current_size + message_size > max_size:
+            chunks.append(current_chunk)
+            current_chunk, current_size = [], 0
+
+        current_chunk.append(push_message)
+        current_size += message_size
+
+    if current_chunk:
+        chunks.append(current_chunk)
+
+    return chunks
+
+
+class ExpoClient:
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        max_concurrency: int = EXPO_MAX_CONCURRENT_REQUESTS,
+        max_retries: int = EXPO_MAX_RETRIES,
+        retry_base_delay: float = 1.0,
+    ):
+        self._base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def base_url(self) -> str:
+        return (self._base_url or get_settings().expo_api_url).rstrip("/")
+
+    def _reset_if_loop_changed(self):
+        # sessions and semaphores are bound to the loop they were created in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._session = None
+            self._semaphore = None
+            self._loop = loop
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        self._reset_if_loop_changed()
+        if self._session is None or self._session.closed:
+            settings = get_settings()
+            headers = {
+                "accept": "application/json",
+                "accept-encoding": "gzip, deflate",
+                "content-type": "application/json",
+                "content-encoding": "gzip",
+            }
+            if settings.expo_access_token:
+                headers["authorization"] = f"bearer {settings.expo_access_token}"
+
+            self._session = aiohttp.ClientSession(
+                headers=headers,
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=ClientTimeout(total=30),
+            )
+
+        return self._session
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        self._reset_if_loop_changed()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._semaphore = None
+
+    async def _post(self, path: str, payload) -> dict:
+        session = self._get_session()
+        url = f"{self.base_url}{path}"
+        data = gzip.compress(json.dumps(payload).encode("utf-8"))
+
+        attempts = 0
+        while True:
+            try:
+                async with session.post(url, data=data) as resp:
+                    if resp.status == 429 or resp.status >= 500:
+                        raise aiohttp.ClientResponseError(
+                            resp.request_info, resp.history, status=resp.status, message=resp.reason or ""
                         )
-                        await asyncio.sleep(delay)
-                        return await expo_push(headers, data, attempts=attempts)
+                    resp.raise_for_status()
+                    return await resp.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, aiohttp.ClientResponseError) and e.status != 429 and e.status < 500:
+                    raise
+
+                if attempts >= self.max_retries:
+                    logger.error(f"unable to reach expo. max retries exceeded ({self.max_retries})")
+                    raise
+
+                attempts += 1
+                delay = self.retry_base_delay * 2**attempts + random.uniform(0, self.retry_base_delay)
+                logger.warning(f"expo request failed (attempt {attempts}), waiting {delay:.2f}s and trying again: {e}")
+                await asyncio.sleep(delay)
+
+    async def _send_chunk(self, push_messages: List[dict]) -> List[Tuple[Optional[str], dict]]:
+        async with self._get_semaphore():
+            json_resp = await self._post("/push/send", push_messages)
+
+        tickets = json_resp.get("data", [])
+        tokens = [token for push_message in push_messages for token in _get_message_tokens(push_message)]
+        if len(tokens) != len(tickets):
+            logger.warning(f"unexpected number of push tickets: {len(tickets)} (expected {len(tokens)})")
+            return [(None, ticket) for ticket in tickets]
+
+        return list(zip(tokens, tickets))
+
+    async def send_push_messages(self, push_messages: List[dict]) -> List[Tuple[Optional[str], dict]]:
+        chunks = chunk_push_messages(push_messages)
+        results = await asyncio.gather(*[self._send_chunk(chunk) for chunk in chunks], return_exceptions=True)
+
+        tickets = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"unable to send push notifications: {result}")
+                capture_exception(result)
+                continue
+            tickets.extend(result)
 
-                return await resp.json()
-        except Exception as e:
-            attempts += 1
-            delay = 2**attempts + random.uniform(0, 1)
-            await asyncio.sleep(delay)
-            logger.warning("unable to send notifications", exc_info=e)
-            return await expo_push(headers, data, attempts=attempts)
+        return tickets
 
+    async def get_receipts(self, ticket_ids: List[str]) -> Dict[str, dict]:
+        async with self._get_semaphore():
+            json_resp = await self._post("/push/getReceipts", {"ids": ticket_ids})
+        return json_resp.get("data", {})
 
-async def handle_expo_response(json_resp):
-    tickets = json_resp.get("data")
 
+expo_client = ExpoClient()
+
+
+async def prune_push_tokens(tokens: List[str]):
+    tokens = list({token for token in tokens if token})
+    if not tokens:
+        return
+
+    operations = [UpdateMany({"push_tokens": token}, {"$pull": {"push_tokens": token}}) for token in tokens]
+    await User.collection.bulk_write(operations, ordered=False)
+    logger.info(f"removed {len(tokens)} unregistered push tokens")
+
+
+async def handle_expo_tickets(tickets: List[Tuple[Optional[str], dict]]):
     ok_messages = 0
     error_messages = 0
+    pending_receipts: Dict[str, str] = {}
+    invalid_tokens: List[str] = []
 
-    for index, ticket in enumerate(tickets):
-        status = ticket.get("status")
-        if status == "ok":
+    for token, ticket in tickets:
+        if ticket.get("status") == "ok":
             ok_messages += 1
+            if ticket.get("id"):
+                pending_receipts[ticket["id"]] = token or ""
             continue
 
         error_messages += 1
-        details = ticket.get("details")
+        details = ticket.get("details") or {}
         error = details.get("error")
 
         if error == "DeviceNotRegistered":
-            error_token = details.get("expoPushToken")
+            error_token = details.get("expoPushToken") or token
             logger.debug(f"DeviceNotRegistered found, removing token {error_token}")
-            await find_and_update_item(
-                filters={"push_tokens": error_token}, data={"$pull": {"push_tokens": error_token}}, result_obj=User
-            )
+            if error_token:
+                invalid_tokens.append(error_token)
         else:
             logger.error(f"unhandled push error: {ticket}")
 
-    # todo: according to expo's docs* we should always check the push receipts 15' after the delivery response,
-    # regardless of individual ticket status. Delaying this until we have a proper task manager (e.g. celery) in place.
-    # *https://docs.expo.dev/push-notifications/sending-notifications/#check-push-receipts-for-errors
+    await prune_push_tokens(invalid_tokens)
+
+    if pending_receipts:
+        now = time.time()
+        async with cache.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(PUSH_RECEIPTS_PENDING_KEY, {ticket_id: now for ticket_id in pending_receipts})
+            pipe.hset(PUSH_RECEIPTS_TOKENS_KEY, mapping=pending_receipts)
+            await pipe.execute()
 
-    logger.debug(f"push receipts. OK: {ok_messages} | ERROR: {error_messages}")
+    logger.debug(f"push tickets. OK: {ok_messages} | ERROR: {error_messages}")
 
 
-async def send_expo_push_notifications(push_messages: List[str]):
+async def send_expo_push_notifications(push_messages: List[dict]):
     if not push_messages:
         logger.info("no tokens to push notifications to")
         return
 
-    settings = get_settings()
-    headers = {
-        "host": "exp.host",
-        "accept": "application/json",
-        "accept-encoding": "gzip, deflate",
-        "content-type": "application/json",
-        "content-encoding": "gzip",
-        "authorization": f"bearer {settings.expo_access_token}",
-    }
+    tickets = await expo_client.send_push_messages(push_messages)
+    await handle_expo_tickets(tickets)
+
+
+async def check_push_receipts(delay_seconds: int = EXPO_RECEIPT_DELAY_SECONDS) -> int:
+    checked_receipts = 0
+    now = time.time()
+
+    # receipts older than a day are gone on expo's side, no point asking for them
+    stale_ticket_ids = await cache.client.zrangebyscore(
+        PUSH_RECEIPTS_PENDING_KEY, 0, now - EXPO_RECEIPT_MAX_AGE_SECONDS
+    )
+    if stale_ticket_ids:
+        async with cache.client.pipeline(transaction=False) as pipe:
+            pipe.zrem(PUSH_RECEIPTS_PENDING_KEY, *stale_ticket_ids)
+            pipe.hdel(PUSH_RECEIPTS_TOKENS_KEY, *stale_ticket_ids)
+            await pipe.execute()
+
+    while True:
+        ticket_ids = await cache.client.zrangebyscore(
+            PUSH_RECEIPTS_PENDING_KEY, 0, now - delay_seconds, start=0, num=EXPO_MAX_RECEIPT_IDS_PER_REQUEST
+        )
+        if not ticket_ids:
+            break
+
+        tokens = await cache.client.hmget(PUSH_RECEIPTS_TOKENS_KEY, ticket_ids)
+        receipts = await expo_client.get_receipts(ticket_ids)
+
+        invalid_tokens = []
+        for ticket_id, token in zip(ticket_ids, tokens):
+            receipt = receipts.get(ticket_id)
+            if not receipt or receipt.get("status") == "ok":
+                continue
+
+            details = receipt.get("details") or {}
+            if details.get("error") == "DeviceNotRegistered":
+                invalid_tokens.append(details.get("expoPushToken") or token)
+            else:
+                logger.error(f"unhandled push receipt error: {receipt}")
+
+        await prune_push_tokens(invalid_tokens)
+
+        async with cache.client.pipeline(transaction=False) as pipe:
+            pipe.zrem(PUSH_RECEIPTS_PENDING_KEY, *ticket_ids)
+            pipe.hdel(PUSH_RECEIPTS_TOKENS_KEY, *ticket_ids)
+            await pipe.execute()
+
+        checked_receipts += len(ticket_ids)
+
+    logger.info(f"checked {checked_receipts} push receipts")
+    return checked_receipts
+
+
+class PushReceiptsJob:
+    task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def _run(cls, interval_seconds: int):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                # only one worker checks receipts per interval
+                acquired = await cache.client.set(PUSH_RECEIPTS_LOCK_KEY, "1", nx=True, ex=interval_seconds)
+                if acquired:
+                    await check_push_receipts()
+            except Exception as e:
+                logger.exception("problem checking push receipts")
+                capture_exception(e)
+
+    @classmethod
+    def start(cls):
+        interval_seconds = get_settings().expo_receipts_check_interval_seconds
+        if not interval_seconds or cls.task is not None:
+            return
+
+        cls.task = asyncio.create_task(cls._run(interval_seconds), name="PushReceiptsJob")
+
+    @classmethod
+    async def stop(cls):
+        if cls.task is None:
+            return
+
+        cls.task.cancel()
+        try:
+            await cls.task
+        except asyncio.CancelledError:
+            pass
+        cls.task = None
+
+
+async def expo_client_start() -> None:
+    PushReceiptsJob.start()
 
-    compressed_data = zlib.compress(json.dumps(push_messages).encode("utf-8"))
 
-    json_resp = await expo_push(headers=headers, data=compressed_data)
-    await handle_expo_response(json_resp)
+async def expo_client_shutdown() -> None:
+    await PushReceiptsJob.stop()
+    await expo_client.close()
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import secrets
+import time
+from typing import Dict, List, Optional
+
+from redis.asyncio.client import PubSub
+from sentry_sdk import capture_exception
+from starlette import status
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+
+from app.helpers.cache_utils import cache
+from app.helpers.events import EventType
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_CHANNEL_PREFIX = "native-"
+GATEWAY_PUBSUB_PREFIX = "gateway:"
+
+HEARTBEAT_INTERVAL_SECONDS = 25
+HEARTBEAT_TIMEOUT_SECONDS = 60
+SEND_BUFFER_MAX_SIZE = 256
+
+HEARTBEAT_TIMEOUT_CLOSE_CODE = 4000
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+
+def is_gateway_channel(channel_name: str) -> bool:
+    return channel_name.startswith(GATEWAY_CHANNEL_PREFIX)
+
+
+class GatewayConnection:
+    def __init__(self, websocket: WebSocket, actor_id: str):
+        self.websocket = websocket
+        self.actor_id = actor_id
+        self.channel_name = f"{GATEWAY_CHANNEL_PREFIX}{actor_id}-{secrets.token_hex(8)}"
+        self.send_buffer: asyncio.Queue = asyncio.Queue(maxsize=SEND_BUFFER_MAX_SIZE)
+        self.last_seen_at = time.monotonic()
+        self.close_code: Optional[int] = None
+        self._closing = asyncio.Event()
+
+    def enqueue(self, payload: str) -> bool:
+        if self._closing.is_set():
+            return False
+
+        try:
+            self.send_buffer.put_nowait(payload)
+        except asyncio.QueueFull:
+            logger.warning("slow consumer, closing connection. [channel=%s]", self.channel_name)
+            self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+            return False
+
+        return True
+
+    def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        if self._closing.is_set():
+            return
+
+        self.close_code = code
+        self._closing.set()
+
+    async def _send_loop(self):
+        while True:
+            payload = await self.send_buffer.get()
+            await self.websocket.send_text(payload)
+
+    async def _receive_loop(self):
+        while True:
+            message = await self.websocket.receive_text()
+            self.last_seen_at = time.monotonic()
+
+            try:
+                event = json.loads(message).get("event")
+            except Exception:
+                logger.debug("unexpected client message. [channel=%s]", self.channel_name)
+                continue
+
+            if event == "PING":
+                self.enqueue(json.dumps({"event": "PONG"}))
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            if time.monotonic() - self.last_seen_at > HEARTBEAT_TIMEOUT_SECONDS:
+                logger.info("heartbeat timed out, closing connection. [channel=%s]", self.channel_name)
+                self.close(code=HEARTBEAT_TIMEOUT_CLOSE_CODE)
+                return
+
+            self.enqueue(json.dumps({"event": "PING"}))
+
+    async def run(self):
+        tasks = [
+            asyncio.create_task(self._send_loop()),
+            asyncio.create_task(self._receive_loop()),
+            asyncio.create_task(self._heartbeat_loop()),
+            asyncio.create_task(self._closing.wait()),
+        ]
+
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        for task in done:
+            if task.cancelled():
+                continue
+            exc = task.exception()
+            if exc and not isinstance(exc, WebSocketDisconnect):
+                logger.warning("websocket connection failed. [channel=%s]", self.channel_name, exc_info=exc)
+
+        if self.websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                await self.websocket.close(code=self.close_code or status.WS_1000_NORMAL_CLOSURE)
+            except Exception:
+                pass
+
+
+class Gateway:
+    def __init__(self):
+        self.connections: Dict[str, GatewayConnection] = {}
+        self._pubsub: Optional[PubSub] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def register(self, connection: GatewayConnection):
+        if self._pubsub is None:
+            self._pubsub = cache.client.pubsub()
+
+        self.connections[connection.channel_name] = connection
+        await self._pubsub.subscribe(f"{GATEWAY_PUBSUB_PREFIX}{connection.channel_name}")
+
+        if not self._reader or self._reader.done():
+            self._reader = asyncio.create_task(self._read_messages(), name="GatewayReader")
+
+    async def unregister(self, connection: GatewayConnection):
+        self.connections.pop(connection.channel_name, None)
+        if self._pubsub is None:
+            return
+
+        try:
+            await self._pubsub.unsubscribe(f"{GATEWAY_PUBSUB_PREFIX}{connection.channel_name}")
+        except Exception as e:
+            logger.warning("problem unsubscribing from gateway channel. [channel=%s]", connection.channel_name)
+            capture_exception(e)
+
+    async def _read_messages(self):
+        while self.connections:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as e:
+                logger.exception("problem reading gateway messages")
+                capture_exception(e)
+                await asyncio.sleep(1)
+                continue
+
+            if not message:
+                continue
+
+            channel_name = message["channel"][len(GATEWAY_PUBSUB_PREFIX) :]
+            connection = self.connections.get(channel_name)
+            if connection:
+                connection.enqueue(message["data"])
+
+    async def close(self):
+        for connection in list(self.connections.values()):
+            connection.close(code=status.WS_1001_GOING_AWAY)
+
+        if self._reader:
+            self._reader.cancel()
+
+        if self._pubsub is not None:
+            await self._pubsub.reset()
+            self._pubsub = None
+
+
+gateway = Gateway()
+
+
+async def close_gateway_connections():
+    await gateway.close()
+
+
+async def broadcast_gateway(event: EventType, data: dict, gateway_channels: Optional[List[str]] = None):
+    if not gateway_channels:
+        logger.debug("no online gateway channels. [event=%s]", event)
+        return
+
+    payload = json.dumps({"event": event.value, "data": data})
+
+    async with cache.client.pipeline(transaction=False) as pipe:
+        for channel_name in set(gateway_channels):
+            pipe.publish(f"{GATEWAY_PUBSUB_PREFIX}{channel_name}", payload)
+        await pipe.execute()
+
+    logger.info("Event broadcast successful. [event_name=%s, provider=native]", event.value)
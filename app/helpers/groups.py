@@ -0,0 +1,135 @@
+import logging
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from bson import ObjectId
+
+from app.helpers.cache_utils import cache
+from app.helpers.w3 import checksum_address
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+GROUP_MEMBERSHIP_CACHE_SECONDS = 5 * 60
+
+# receives a list of (checksummed) wallet addresses and returns whether each one belongs to the group
+GroupHandlerFunc = Callable[[List[str]], Awaitable[List[bool]]]
+
+
+class GroupHandler(NamedTuple):
+    group: str
+    func: GroupHandlerFunc
+    cache_seconds: int
+    negative_cache_seconds: int
+
+
+_group_handlers: Dict[str, GroupHandler] = {}
+
+
+def register_group_handler(
+    group: str,
+    func: GroupHandlerFunc,
+    cache_seconds: int = GROUP_MEMBERSHIP_CACHE_SECONDS,
+    negative_cache_seconds: Optional[int] = None,
+):
+    if negative_cache_seconds is None:
+        negative_cache_seconds = cache_seconds
+
+    _group_handlers[group] = GroupHandler(
+        group=group, func=func, cache_seconds=cache_seconds, negative_cache_seconds=negative_cache_seconds
+    )
+
+
+def group_handler(group: str, cache_seconds: int = GROUP_MEMBERSHIP_CACHE_SECONDS, **kwargs):
+    def decorator(func: GroupHandlerFunc) -> GroupHandlerFunc:
+        register_group_handler(group, func, cache_seconds=cache_seconds, **kwargs)
+        return func
+
+    return decorator
+
+
+def is_custom_group(group: str) -> bool:
+    return group in _group_handlers
+
+
+def _get_group_membership_key(group: str, user_id: str) -> str:
+    return f"group:{group}:{user_id}"
+
+
+async def fetch_users_wallet_addresses(user_ids: List[str]) -> Dict[str, str]:
+    async with cache.client.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.hget(f"user:{user_id}", "wallet_address")
+        cached_wallets = await pipe.execute()
+
+    wallets = {user_id: wallet for user_id, wallet in zip(user_ids, cached_wallets) if wallet}
+    missing_ids = [user_id for user_id in user_ids if user_id not in wallets]
+    if not missing_ids:
+        return wallets
+
+    cursor = User.collection.find(
+        {"_id": {"$in": [ObjectId(user_id) for user_id in missing_ids]}}, projection={"wallet_address": 1}
+    )
+    async with cache.client.pipeline(transaction=False) as pipe:
+        async for doc in cursor:
+            if not doc.get("wallet_address"):
+                continue
+            user_id = str(doc["_id"])
+            wallets[user_id] = checksum_address(doc["wallet_address"])
+            pipe.hset(f"user:{user_id}", "wallet_address", wallets[user_id])
+        await pipe.execute()
+
+    return wallets
+
+
+async def fetch_users_group_membership(group: str, user_ids: List[str]) -> Dict[str, bool]:
+    handler = _group_handlers.get(group)
+    if not handler:
+        logger.warning(f"unhandled group: {group}")
+        return {user_id: False for user_id in user_ids}
+
+    cached_memberships = await cache.client.mget([_get_group_membership_key(group, user_id) for user_id in user_ids])
+    memberships = {
+        user_id: cached == "1" for user_id, cached in zip(user_ids, cached_memberships) if cached is not None
+    }
+
+    missing_ids = [user_id for user_id in user_ids if user_id not in memberships]
+    if not missing_ids:
+        return memberships
+
+    wallets = await fetch_users_wallet_addresses(missing_ids)
+    wallet_user_ids = [user_id for user_id in missing_ids if user_id in wallets]
+    results = await handler.func([wallets[user_id] for user_id in wallet_user_ids]) if wallet_user_ids else []
+
+    for user_id in missing_ids:
+        memberships[user_id] = False
+    memberships.update(dict(zip(wallet_user_ids, results)))
+
+    async with cache.client.pipeline(transaction=False) as pipe:
+        for user_id in wallet_user_ids:
+            is_member = memberships[user_id]
+            expiry = handler.cache_seconds if is_member else handler.negative_cache_seconds
+            if expiry:
+                pipe.set(_get_group_membership_key(group, user_id), "1" if is_member else "0", ex=expiry)
+        await pipe.execute()
+
+    return memberships
+
+
+async def fetch_user_groups_membership(user_id: str, groups: List[str]) -> Dict[str, bool]:
+    memberships = {}
+    for group in groups:
+        group_memberships = await fetch_users_group_membership(group, [user_id])
+        memberships[group] = group_memberships[user_id]
+
+    return memberships
+
+
+# new voters are synced into redis and should get access right away, so only positive results are cached
+@group_handler("@nouners", negative_cache_seconds=0)
+async def is_nouns_voter(wallet_addresses: List[str]) -> List[bool]:
+    async with cache.client.pipeline(transaction=False) as pipe:
+        for wallet_address in wallet_addresses:
+            pipe.zscore("nouns:voters", wallet_address)
+        votes = await pipe.execute()
+
+    return [(no_votes or 0) > 0 for no_votes in votes]
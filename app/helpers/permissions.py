@@ -1,67 +1,137 @@
+import hashlib
 import json
 import logging
 import re
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional
 
 from bson import ObjectId
 from fastapi import HTTPException
+from redis.exceptions import NoScriptError
 from starlette.requests import Request
 
 from app.config import get_settings
 from app.constants.permissions import (
     ALL_PERMISSIONS,
-    CHANNEL_OWNER_PERMISSIONS,
-    DEFAULT_DM_MEMBER_PERMISSIONS,
-    DEFAULT_NOT_WHITELISTED_USER_PERMISSIONS,
-    DEFAULT_TOPIC_MEMBER_PERMISSIONS,
-    DEFAULT_USER_PERMISSIONS,
+    CHANNEL_OWNER_PERMISSIONS_MASK,
+    DEFAULT_DM_MEMBER_PERMISSIONS_MASK,
+    DEFAULT_NOT_WHITELISTED_USER_PERMISSIONS_MASK,
+    DEFAULT_TOPIC_MEMBER_PERMISSIONS_MASK,
+    DEFAULT_USER_PERMISSIONS_MASK,
     MEMBERS_GROUP,
-    NON_WHITELISTED_TOPIC_MEMBER_PERMISSIONS,
+    NON_WHITELISTED_TOPIC_MEMBER_PERMISSIONS_MASK,
     OWNERS_GROUP,
     PUBLIC_GROUP,
-    SERVER_OWNER_PERMISSIONS,
+    SERVER_OWNER_PERMISSIONS_MASK,
+    has_permissions,
+    mask_to_permissions,
+    permissions_to_mask,
 )
 from app.exceptions import APIPermissionError
 from app.helpers.apps import fetch_and_cache_app
-from app.helpers.cache_utils import cache, convert_redis_list_to_dict
-from app.helpers.channels import fetch_and_cache_channel
+from app.helpers.cache_utils import (
+    TTLCache,
+    cache,
+    convert_redis_list_to_dict,
+    eval_cache_script,
+    get_channel_cache_key,
+    register_cache_script,
+)
+from app.helpers.channels import (
+    fetch_and_cache_channel,
+    fetch_and_cache_channels,
+    get_channel_members_key,
+    is_user_channel_member,
+)
+from app.helpers.groups import fetch_user_groups_membership, is_custom_group
 from app.helpers.sections import fetch_and_cache_section
 from app.helpers.servers import fetch_and_cache_server
 from app.helpers.users import fetch_and_cache_user, get_user_roles_permissions
-from app.helpers.w3 import checksum_address
-from app.helpers.whitelist import is_wallet_whitelisted
+from app.helpers.whitelist import is_user_whitelisted
 from app.models.app import App
 from app.models.channel import Channel
 from app.models.server import Server, ServerMember
 from app.models.user import User
-from app.services.crud import get_item, get_item_by_id
+from app.services.crud import get_item
 
 logger = logging.getLogger(__name__)
 
+PERMISSIONS_CACHE_TTL_SECONDS = 10 * 60
+PERMISSIONS_LOCAL_CACHE_TTL_SECONDS = 2
+PERMISSIONS_MAX_BODY_SIZE_BYTES = 100 * 1024
+
+PERMISSIONS_SCRIPT_NAME = "fetch_cached_permissions_data"
+
+# set on cached channel dicts when the permissions script already checked the user's membership
+USER_IS_MEMBER_FIELD = "user_is_member"
+
+# every key read is passed in KEYS and shares the channel's hash tag.
+# membership is -1 when the members set isn't cached, or no user was given in ARGV[1]
+register_cache_script(
+    PERMISSIONS_SCRIPT_NAME,
+    """
+    local channel_data = redis.call('HGETALL', KEYS[1])
+    local section_data = redis.call('HGETALL', KEYS[2])
+    local server_data = redis.call('HGETALL', KEYS[3])
+    local is_member = -1
+    if ARGV[1] ~= '' and redis.call('EXISTS', KEYS[4]) == 1 then
+        is_member = redis.call('SISMEMBER', KEYS[4], ARGV[1])
+    end
+    return { channel_data, section_data, server_data, is_member }
+    """,
+)
 
-async def _fetch_fields_from_request_body(fields: List[str], request: Request) -> Optional[str]:
+# short-lived per-process copy of compiled permissions, covers repeated checks from the same client
+_local_permissions_cache = TTLCache(maxsize=4096, ttl=PERMISSIONS_LOCAL_CACHE_TTL_SECONDS)
+
+
+async def _get_request_json_body(request: Request) -> Optional[dict]:
     try:
+        return request.state.permissions_json_body
+    except AttributeError:
+        pass
+
+    body = None
+    content_type = request.headers.get("content-type", "")
+    try:
+        content_length = int(request.headers.get("content-length", 0))
+    except ValueError:
+        content_length = 0
+
+    if hasattr(request, "_json"):
+        # already decoded by fastapi while parsing the route's body model
         body = await request.json()
-    except Exception as e:
-        body = await request.body()
-        if body == b"":
-            return None
-        logger.warning(f"issue decoding json body: {e}")
-        return None
+    elif content_type.startswith("application/json") and 0 < content_length <= PERMISSIONS_MAX_BODY_SIZE_BYTES:
+        # large bodies are never decoded just to look for a channel or server id
+        try:
+            body = await request.json()
+        except Exception as e:
+            logger.warning(f"issue decoding json body: {e}")
+
+    if not isinstance(body, dict):
+        body = None
+
+    request.state.permissions_json_body = body
+    return body
+
 
+async def _fetch_fields_from_request_body(fields: List[str], request: Request) -> Optional[str]:
+    body = await _get_request_json_body(request)
     if not body:
         return None
 
-    if isinstance(body, dict):
-        for field in fields:
-            value = body.get(field)
-            if value:
-                return value
+    for field in fields:
+        value = body.get(field)
+        if value:
+            return value
 
     return None
 
 
 async def _fetch_channel_from_request(request: Request) -> Optional[str]:
+    channel_id = request.path_params.get("channel_id")
+    if channel_id:
+        return channel_id
+
     request_path = request.url.path
     channel_matches = re.findall(r"^/channels/(.{24})/?", request_path)
     if channel_matches:
@@ -75,6 +145,10 @@ async def _fetch_channel_from_request(request: Request) -> Optional[str]:
 
 
 async def _fetch_server_from_request(request: Request) -> Optional[str]:
+    server_id = request.path_params.get("server_id")
+    if server_id:
+        return server_id
+
     request_path = request.url.path
     server_matches = re.findall(r"^/servers/(.{24})/?", request_path)
     if server_matches:
@@ -107,122 +181,190 @@ async def _fetch_server_from_kwargs(kwargs: dict) -> Optional[str]:
     return server_id
 
 
+def _load_cached_overwrites(cached_overwrites: Optional[str]) -> Dict[str, int]:
+    if not cached_overwrites:
+        return {}
+
+    # entries cached before the switch to bitmasks still hold permission lists
+    return {group: permissions_to_mask(permissions) for group, permissions in json.loads(cached_overwrites).items()}
+
+
 async def _calc_final_permissions(
-    user_roles: Dict[str, List[str]], section_overwrites: Dict[str, List[str]], channel_overwrites: Dict[str, List[str]]
-) -> Set[str]:
-    permissions = set()
+    user_roles: Dict[str, int], section_overwrites: Dict[str, int], channel_overwrites: Dict[str, int]
+) -> int:
+    permissions = 0
     for role_id, role_permissions in user_roles.items():
         c_permissions = channel_overwrites.get(role_id)
         if c_permissions is not None:
-            permissions |= set(c_permissions)
+            permissions |= c_permissions
             continue
 
         s_permissions = section_overwrites.get(role_id)
         if s_permissions is not None:
-            permissions |= set(s_permissions)
+            permissions |= s_permissions
             continue
 
-        permissions |= set(role_permissions)
+        permissions |= role_permissions
 
-    permissions |= set(channel_overwrites.get(PUBLIC_GROUP, []))
+    permissions |= channel_overwrites.get(PUBLIC_GROUP, 0)
 
     return permissions
 
 
+def _get_permissions_script_keys(channel_id: str) -> List[str]:
+    return [
+        get_channel_cache_key(channel_id),
+        get_channel_cache_key(channel_id, "section"),
+        get_channel_cache_key(channel_id, "server"),
+        get_channel_members_key(channel_id),
+    ]
+
+
+async def _convert_permissions_script_result(script_result: list) -> tuple:
+    channel_data, section_data, server_data, is_member = script_result
+    channel = await convert_redis_list_to_dict(channel_data)
+    if is_member >= 0:
+        channel[USER_IS_MEMBER_FIELD] = is_member
+
+    section = await convert_redis_list_to_dict(section_data)
+    server = await convert_redis_list_to_dict(server_data)
+    return channel, section, server
+
+
+async def _is_channel_member(channel_id: str, channel: dict, user_id: str) -> bool:
+    is_member = channel.get(USER_IS_MEMBER_FIELD)
+    if is_member is not None:
+        return bool(is_member)
+
+    return await is_user_channel_member(channel_id=channel_id, user_id=user_id)
+
+
 async def fetch_cached_permissions_data(channel_id: Optional[str], user_id: str, app_id: str):
-    lua_script = """
-        local channel_data = redis.call('HGETALL', KEYS[1])
-        local user_data
-        local app_data
-        if KEYS[2] then
-            user_data = redis.call('HGETALL', KEYS[2])
-        else
-            user_data = {}
-        end
-        if KEYS[3] then
-            app_data = redis.call('HGETALL', KEYS[3])
-        else
-            app_data = {}
-        end
-        local server_id = redis.call('HGET', KEYS[1], 'server')
-        local server_data
-        if server_id then
-            server_data = redis.call('HGETALL', "server:" .. server_id)
-        else
-            server_data = {}
-        end
-        local section_id = redis.call('HGET', KEYS[1], 'section')
-        local section_data
-        if section_id then
-            section_data = redis.call('HGETALL', "section:" .. section_id)
-        else
-            section_data = {}
-        end
-
-        return { channel_data, user_data, server_data, section_data, app_data }
-        """
-    fetch_cached_data = cache.client.register_script(lua_script)
-    channel, user, server, section, app = await fetch_cached_data(
-        keys=[
-            f"channel:{channel_id}",
-            f"user:{user_id}" if user_id != "" else user_id,
-            f"app:{app_id}" if app_id != "" else app_id,
-        ]
-    )
-    channel_data = await convert_redis_list_to_dict(channel)
-    user_data = await convert_redis_list_to_dict(user)
-    server_data = await convert_redis_list_to_dict(server)
-    section_data = await convert_redis_list_to_dict(section)
-    app_data = await convert_redis_list_to_dict(app)
-    return channel_data, user_data, server_data, section_data, app_data
+    script_keys = _get_permissions_script_keys(channel_id) if channel_id else []
 
+    script_sha = cache.script_shas.get(PERMISSIONS_SCRIPT_NAME)
 
-async def user_belongs_to_group(user_id: str, group: str) -> bool:
-    if group in [PUBLIC_GROUP, MEMBERS_GROUP, OWNERS_GROUP]:
-        return False
+    commands = []
+    async with cache.client.pipeline(transaction=False) as pipe:
+        if script_keys and script_sha:
+            pipe.evalsha(script_sha, len(script_keys), *script_keys, user_id)
+            commands.append("channel")
+        if user_id:
+            pipe.hgetall(f"user:{user_id}")
+            commands.append("user")
+        if app_id:
+            pipe.hgetall(f"app:{app_id}")
+            commands.append("app")
 
-    # TODO: add proper support for custom groups
-    if group == "@nouners":
-        user = await get_item_by_id(id_=user_id, result_obj=User)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        responses = await pipe.execute(raise_on_error=False) if commands else []
 
-        wallet_address = checksum_address(user.wallet_address)
-        no_votes = await cache.client.zscore("nouns:voters", wallet_address) or 0
-        logger.debug(f"number of noun votes for {wallet_address}: {no_votes}")
+    results = dict(zip(commands, responses))
+    for command, response in results.items():
+        if isinstance(response, Exception) and not isinstance(response, NoScriptError):
+            raise response
 
-        return no_votes > 0
-    else:
-        logger.warning(f"unhandled group: {group}")
+    channel: Dict[str, Any] = {}
+    section: Dict[str, Any] = {}
+    server: Dict[str, Any] = {}
+    if script_keys:
+        script_result = results.get("channel")
+        if script_result is None or isinstance(script_result, NoScriptError):
+            script_result = await eval_cache_script(PERMISSIONS_SCRIPT_NAME, keys=script_keys, args=[user_id])
+        channel, section, server = await _convert_permissions_script_result(script_result)
+
+    return channel, results.get("user") or {}, server, section, results.get("app") or {}
+
+
+async def user_belongs_to_group(user_id: str, group: str) -> bool:
+    if not is_custom_group(group):
+        return False
 
-    return False
+    memberships = await fetch_user_groups_membership(user_id, [group])
+    return memberships[group]
 
 
 async def get_channel_user_group_roles(
-    user_id: str, channel: dict, user_roles: dict, user_whitelisted: Optional[bool] = False
+    channel_id: str,
+    user_id: str,
+    channel: dict,
+    user_roles: dict,
+    user_whitelisted: Optional[bool] = False,
+    compile_info: Optional[dict] = None,
 ):
     settings = get_settings()
-    channel_perms = json.loads(channel.get("permissions", ""))
+    channel_perms = _load_cached_overwrites(channel.get("permissions"))
 
     channel_perm_groups = list(channel_perms.keys())
 
     # handle default groups: @members, @?
-    members = channel.get("members", []).split(",")
-    if user_id in members:
-        member_perms = channel_perms.get(MEMBERS_GROUP, [])
+    if await _is_channel_member(channel_id=channel_id, channel=channel, user_id=user_id):
+        member_perms = channel_perms.get(MEMBERS_GROUP, 0)
         if member_perms:
             user_roles[MEMBERS_GROUP] = member_perms
             channel_perm_groups.remove(MEMBERS_GROUP)
         else:
             if settings.feature_whitelist and not user_whitelisted:
-                user_roles[MEMBERS_GROUP] = NON_WHITELISTED_TOPIC_MEMBER_PERMISSIONS
+                user_roles[MEMBERS_GROUP] = NON_WHITELISTED_TOPIC_MEMBER_PERMISSIONS_MASK
             else:
-                user_roles[MEMBERS_GROUP] = DEFAULT_TOPIC_MEMBER_PERMISSIONS
+                user_roles[MEMBERS_GROUP] = DEFAULT_TOPIC_MEMBER_PERMISSIONS_MASK
 
     # handle custom groups: @nouners, etc.
-    for remaining_group in channel_perm_groups:
-        if await user_belongs_to_group(user_id, remaining_group):
-            user_roles[remaining_group] = channel_perms[remaining_group]
+    custom_groups = [group for group in channel_perm_groups if is_custom_group(group)]
+    if not custom_groups:
+        return
+
+    if compile_info is not None:
+        # custom group membership depends on external data, which isn't versioned
+        compile_info["cacheable"] = False
+
+    memberships = await fetch_user_groups_membership(user_id, custom_groups)
+    for group, is_member in memberships.items():
+        if is_member:
+            user_roles[group] = channel_perms[group]
+
+
+def _get_permissions_version_key(resource: str, resource_id: str) -> str:
+    return f"permissions_version:{resource}:{resource_id}"
+
+
+async def bump_permissions_version(
+    channel_id: Optional[str] = None, server_id: Optional[str] = None, app_id: Optional[str] = None
+):
+    version_keys = []
+    if channel_id:
+        version_keys.append(_get_permissions_version_key("channel", str(channel_id)))
+    if server_id:
+        version_keys.append(_get_permissions_version_key("server", str(server_id)))
+    if app_id:
+        version_keys.append(_get_permissions_version_key("app", str(app_id)))
+
+    if not version_keys:
+        return
+
+    async with cache.client.pipeline(transaction=False) as pipe:
+        for version_key in version_keys:
+            pipe.incr(version_key)
+        await pipe.execute()
+
+    _local_permissions_cache.clear()
+
+
+def _get_compiled_permissions_key(
+    channel_id: Optional[str],
+    server_id: Optional[str],
+    user_id: Optional[str],
+    app_id: Optional[str],
+    token_scopes: Optional[List[str]],
+    restricted: bool,
+) -> str:
+    scopes_hash = ""
+    if token_scopes:
+        scopes_hash = hashlib.sha1(",".join(sorted(token_scopes)).encode("utf-8")).hexdigest()[:16]
+
+    return (
+        f"permissions:{user_id or ''}:{channel_id or ''}:{server_id or ''}:{app_id or ''}:{scopes_hash}:"
+        f"{int(restricted)}"
+    )
 
 
 async def fetch_user_permissions(
@@ -233,17 +375,239 @@ async def fetch_user_permissions(
     token_scopes: Optional[List[str]] = None,
     user_whitelisted: Optional[bool] = False,
 ) -> List[str]:
+    permissions_mask = await fetch_user_permissions_mask(
+        channel_id=channel_id,
+        server_id=server_id,
+        user_id=user_id,
+        app_id=app_id,
+        token_scopes=token_scopes,
+        user_whitelisted=user_whitelisted,
+    )
+    return mask_to_permissions(permissions_mask)
+
+
+async def fetch_user_permissions_mask(
+    channel_id: Optional[str],
+    server_id: Optional[str],
+    user_id: Optional[str],
+    app_id: Optional[str] = None,
+    token_scopes: Optional[List[str]] = None,
+    user_whitelisted: Optional[bool] = False,
+) -> int:
     logger.debug(f"fetching permissions. user: {user_id} | channel: {channel_id} | server: {server_id} | app: {app_id}")
     settings = get_settings()
+    restricted = settings.feature_whitelist and not user_whitelisted
     if not channel_id and not server_id:
-        if settings.feature_whitelist and not user_whitelisted:
-            return DEFAULT_NOT_WHITELISTED_USER_PERMISSIONS
+        if restricted:
+            return DEFAULT_NOT_WHITELISTED_USER_PERMISSIONS_MASK
+
+        return DEFAULT_USER_PERMISSIONS_MASK
+
+    compiled_key = _get_compiled_permissions_key(channel_id, server_id, user_id, app_id, token_scopes, restricted)
+    local_permissions = _local_permissions_cache.get(compiled_key)
+    if local_permissions is not None:
+        return local_permissions
+
+    version_keys = [
+        _get_permissions_version_key(resource, resource_id)
+        for resource, resource_id in [("channel", channel_id), ("server", server_id), ("app", app_id)]
+        if resource_id
+    ]
+
+    async with cache.client.pipeline(transaction=False) as pipe:
+        pipe.get(compiled_key)
+        pipe.mget(version_keys)
+        cached_compiled, versions = await pipe.execute()
+
+    versions = [version or "0" for version in versions]
+
+    compiled_mask = await _load_compiled_permissions(cached_compiled, versions)
+    if compiled_mask is not None:
+        _local_permissions_cache.set(compiled_key, compiled_mask)
+        return compiled_mask
+
+    compile_info: Dict[str, Any] = {"cacheable": True}
+    permissions = await _compute_user_permissions(
+        channel_id=channel_id,
+        server_id=server_id,
+        user_id=user_id,
+        app_id=app_id,
+        token_scopes=token_scopes,
+        user_whitelisted=user_whitelisted,
+        compile_info=compile_info,
+    )
+
+    if not compile_info["cacheable"]:
+        return permissions
+
+    compiled = await _build_compiled_permissions(permissions, versions, compile_info, server_id)
+    await cache.client.set(compiled_key, json.dumps(compiled), ex=PERMISSIONS_CACHE_TTL_SECONDS)
+    _local_permissions_cache.set(compiled_key, permissions)
+
+    return permissions
+
+
+async def fetch_user_channels_permissions_masks(
+    channel_ids: List[str], user_id: str, user_whitelisted: Optional[bool] = False
+) -> Dict[str, int]:
+    settings = get_settings()
+    restricted = settings.feature_whitelist and not user_whitelisted
+
+    masks: Dict[str, int] = {}
+    compiled_keys: Dict[str, str] = {}
+    for channel_id in channel_ids:
+        compiled_key = _get_compiled_permissions_key(channel_id, None, user_id, None, None, restricted)
+        local_permissions = _local_permissions_cache.get(compiled_key)
+        if local_permissions is not None:
+            masks[channel_id] = local_permissions
+        else:
+            compiled_keys[channel_id] = compiled_key
+
+    if not compiled_keys:
+        return masks
+
+    pending_ids = list(compiled_keys.keys())
+    script_sha = cache.script_shas.get(PERMISSIONS_SCRIPT_NAME)
+
+    # compiled entries, versions and raw cached data for every channel in a single round trip
+    async with cache.client.pipeline(transaction=False) as pipe:
+        pipe.mget([compiled_keys[channel_id] for channel_id in pending_ids])
+        pipe.mget([_get_permissions_version_key("channel", channel_id) for channel_id in pending_ids])
+        pipe.hgetall(f"user:{user_id}")
+        if script_sha:
+            for channel_id in pending_ids:
+                script_keys = _get_permissions_script_keys(channel_id)
+                pipe.evalsha(script_sha, len(script_keys), *script_keys, user_id)
+        responses = await pipe.execute(raise_on_error=False)
+
+    cached_compiled_list, versions_list, user = responses[:3]
+    script_results = responses[3:] or [None] * len(pending_ids)
+    for response in [cached_compiled_list, versions_list, user]:
+        if isinstance(response, Exception):
+            raise response
+
+    missing_ids = []
+    cached_data: Dict[str, tuple] = {}
+    channel_versions: Dict[str, List[str]] = {}
+    for index, channel_id in enumerate(pending_ids):
+        versions = [versions_list[index] or "0"]
+        channel_versions[channel_id] = versions
+        compiled_mask = await _load_compiled_permissions(cached_compiled_list[index], versions)
+        if compiled_mask is not None:
+            _local_permissions_cache.set(compiled_keys[channel_id], compiled_mask)
+            masks[channel_id] = compiled_mask
+            continue
 
-        return DEFAULT_USER_PERMISSIONS
+        script_result = script_results[index]
+        if script_result is None or isinstance(script_result, NoScriptError):
+            script_result = await eval_cache_script(
+                PERMISSIONS_SCRIPT_NAME, keys=_get_permissions_script_keys(channel_id), args=[user_id]
+            )
+        elif isinstance(script_result, Exception):
+            raise script_result
+
+        channel, section, server = await _convert_permissions_script_result(script_result)
+        cached_data[channel_id] = (channel, user, server, section, {})
+        if "kind" not in channel:
+            missing_ids.append(channel_id)
+
+    # channels not in cache yet are fetched with a single query
+    fetched_channels = await fetch_and_cache_channels(missing_ids)
+
+    compiled_entries = {}
+    for channel_id, (channel, user, server, section, app) in cached_data.items():
+        if channel_id in missing_ids:
+            channel = fetched_channels.get(channel_id) or {}
+            if not channel:
+                masks[channel_id] = 0
+                continue
+
+        compile_info: Dict[str, Any] = {"cacheable": True}
+        try:
+            permissions = await _compute_user_permissions(
+                channel_id=channel_id,
+                server_id=None,
+                user_id=user_id,
+                app_id=None,
+                token_scopes=None,
+                user_whitelisted=user_whitelisted,
+                compile_info=compile_info,
+                cached_data=(channel, user, server, section, app),
+            )
+        except (HTTPException, APIPermissionError):
+            masks[channel_id] = 0
+            continue
+
+        masks[channel_id] = permissions
+        if compile_info["cacheable"]:
+            compiled_entries[channel_id] = await _build_compiled_permissions(
+                permissions, channel_versions[channel_id], compile_info, None
+            )
+
+    if compiled_entries:
+        async with cache.client.pipeline(transaction=False) as pipe:
+            for channel_id, compiled in compiled_entries.items():
+                pipe.set(compiled_keys[channel_id], json.dumps(compiled), ex=PERMISSIONS_CACHE_TTL_SECONDS)
+                _local_permissions_cache.set(compiled_keys[channel_id], compiled["mask"])
+            await pipe.execute()
 
-    channel, user, server, section, app = await fetch_cached_permissions_data(
-        channel_id=channel_id, user_id=user_id or "", app_id=app_id or ""
+    return masks
+
+
+async def fetch_user_channels_permissions(
+    channel_ids: List[str], user_id: str, user_whitelisted: Optional[bool] = False
+) -> Dict[str, List[str]]:
+    masks = await fetch_user_channels_permissions_masks(
+        channel_ids=channel_ids, user_id=user_id, user_whitelisted=user_whitelisted
     )
+    return {channel_id: mask_to_permissions(mask) for channel_id, mask in masks.items()}
+
+
+async def _load_compiled_permissions(cached_compiled: Optional[str], versions: List[str]) -> Optional[int]:
+    if not cached_compiled:
+        return None
+
+    compiled = json.loads(cached_compiled)
+    if "mask" not in compiled or compiled.get("versions") != versions:
+        return None
+
+    if compiled.get("server"):
+        server_version_key = _get_permissions_version_key("server", compiled["server"])
+        if (await cache.client.get(server_version_key) or "0") != compiled.get("server_version"):
+            return None
+
+    return compiled["mask"]
+
+
+async def _build_compiled_permissions(
+    permissions: int, versions: List[str], compile_info: dict, server_id: Optional[str]
+) -> Dict[str, Any]:
+    compiled: Dict[str, Any] = {"versions": versions, "mask": permissions}
+    resolved_server_id = compile_info.get("server")
+    if resolved_server_id and resolved_server_id != server_id:
+        compiled["server"] = resolved_server_id
+        server_version_key = _get_permissions_version_key("server", resolved_server_id)
+        compiled["server_version"] = await cache.client.get(server_version_key) or "0"
+
+    return compiled
+
+
+async def _compute_user_permissions(
+    channel_id: Optional[str],
+    server_id: Optional[str],
+    user_id: Optional[str],
+    app_id: Optional[str],
+    token_scopes: Optional[List[str]],
+    user_whitelisted: Optional[bool],
+    compile_info: dict,
+    cached_data: Optional[tuple] = None,
+) -> int:
+    if cached_data:
+        channel, user, server, section, app = cached_data
+    else:
+        channel, user, server, section, app = await fetch_cached_permissions_data(
+            channel_id=channel_id, user_id=user_id or "", app_id=app_id or ""
+        )
 
     user_roles = {}
 
@@ -255,23 +619,27 @@ async def fetch_user_permissions(
             raise HTTPException(status_code=404, detail="channel not found")
 
         if channel.get("kind") == "dm":
-            members = channel.get("members", []).split(",")
-            if not user_id or user_id not in members:
+            if not user_id or not await _is_channel_member(channel_id=channel_id, channel=channel, user_id=user_id):
                 raise APIPermissionError("user is not a member of DM channel")
-            return DEFAULT_DM_MEMBER_PERMISSIONS
+            return DEFAULT_DM_MEMBER_PERMISSIONS_MASK
         elif channel.get("kind") == "topic":
-            channel_perms = json.loads(channel.get("permissions", ""))
+            channel_perms = _load_cached_overwrites(channel.get("permissions"))
 
             if user_id:
                 if channel.get("owner", "") == user_id:
-                    owner_perms = channel_perms.get(OWNERS_GROUP, [])
+                    owner_perms = channel_perms.get(OWNERS_GROUP, 0)
                     if not owner_perms:
-                        return CHANNEL_OWNER_PERMISSIONS
+                        return CHANNEL_OWNER_PERMISSIONS_MASK
 
                     user_roles[OWNERS_GROUP] = owner_perms
 
                 await get_channel_user_group_roles(
-                    user_id=user_id, channel=channel, user_roles=user_roles, user_whitelisted=user_whitelisted
+                    channel_id=channel_id,
+                    user_id=user_id,
+                    channel=channel,
+                    user_roles=user_roles,
+                    user_whitelisted=user_whitelisted,
+                    compile_info=compile_info,
                 )
 
             if app_id:
@@ -284,19 +652,20 @@ async def fetch_user_permissions(
 
                 # TODO: revisit this once apps can have access to servers or DMs
                 if token_scopes:
-                    return token_scopes
+                    return permissions_to_mask(token_scopes)
                 else:
-                    return app.get(f"channel:{channel_id}", "").split(",")
+                    return permissions_to_mask(app.get(f"channel:{channel_id}"))
 
         elif channel.get("kind") == "server":
             server_id = channel.get("server")
+            compile_info["server"] = server_id
         else:
             raise APIPermissionError(f"unknown channel type: {channel}")
 
     if server_id and not server:
-        server = await fetch_and_cache_server(server_id=server_id)
+        server = await fetch_and_cache_server(server_id=server_id, channel_id=channel_id)
         if user_id and server.get("owner") == user_id:
-            return SERVER_OWNER_PERMISSIONS
+            return SERVER_OWNER_PERMISSIONS_MASK
         # TODO: add admin flag with specific permission overwrite
 
     if server and user_id:
@@ -306,23 +675,21 @@ async def fetch_user_permissions(
         user_roles = await get_user_roles_permissions(user=user, server=server)
 
     section_overwrites = {}
-    channel_overwrites = json.loads(channel.get("permissions", "{}"))
+    channel_overwrites = _load_cached_overwrites(channel.get("permissions"))
     if not section and channel_id:
         section_id = channel.get("section")
         if section_id != "":
             section = await fetch_and_cache_section(section_id=section_id, channel_id=channel_id)
 
     if section:
-        section_overwrites = json.loads(section.get("permissions", {}))
+        section_overwrites = _load_cached_overwrites(section.get("permissions"))
 
-    user_permissions = await _calc_final_permissions(
+    return await _calc_final_permissions(
         user_roles=user_roles,
         section_overwrites=section_overwrites,
         channel_overwrites=channel_overwrites,
     )
 
-    return sorted(list(user_permissions))
-
 
 async def validate_resource_permission(user: User, action: str, resource: Any) -> None:
     user_id = str(user.pk)
@@ -338,10 +705,10 @@ async def validate_resource_permission(user: User, action: str, resource: Any) -
     else:
         raise Exception("unexpected resource: {}".format(resource))
 
-    user_permissions = await fetch_user_permissions(user_id=user_id, channel_id=channel_id, server_id=server_id)
+    permissions_mask = await fetch_user_permissions_mask(user_id=user_id, channel_id=channel_id, server_id=server_id)
 
-    if action not in user_permissions:
-        raise APIPermissionError(needed_permissions=[action], user_permissions=user_permissions)
+    if not has_permissions(permissions_mask, [action]):
+        raise APIPermissionError(needed_permissions=[action], user_permissions=mask_to_permissions(permissions_mask))
 
 
 async def check_request_permissions(
@@ -356,12 +723,7 @@ async def check_request_permissions(
     user_id = str(current_user.pk) if current_user else None
     app_id = str(current_app.pk) if current_app else None
 
-    user_whitelisted = False
-    if current_user:
-        try:
-            user_whitelisted = await is_wallet_whitelisted(wallet_address=current_user.wallet_address)
-        except Exception:
-            logger.error("failed to check user wallet address")
+    user_whitelisted = await is_user_whitelisted(current_user)
 
     try:
         token_scopes = request.state.scopes
@@ -369,7 +731,7 @@ async def check_request_permissions(
         token_scopes = []
 
     try:
-        user_permissions = await fetch_user_permissions(
+        permissions_mask = await fetch_user_permissions_mask(
             user_id=user_id,
             channel_id=channel_id,
             server_id=server_id,
@@ -385,10 +747,10 @@ async def check_request_permissions(
 
     request.state.permissions_used = ",".join(permissions)
 
-    if not all([req_permission in user_permissions for req_permission in permissions]):
+    if not has_permissions(permissions_mask, permissions):
         if raise_exception:
             raise raise_exception
-        raise APIPermissionError(needed_permissions=permissions, user_permissions=user_permissions)
+        raise APIPermissionError(needed_permissions=permissions, user_permissions=mask_to_permissions(permissions_mask))
 
 
 # TODO: Deprecate this and use the @needs decorator instead
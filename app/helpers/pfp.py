@@ -4,6 +4,7 @@ from re import Pattern
 from typing import Optional, Tuple
 
 from app.helpers import cloudflare
+from app.helpers.principals import clear_cached_users
 from app.models.user import User, UserAvatar
 from app.services.crud import update_item
 
@@ -54,4 +55,6 @@ async def upload_pfp_url_and_update_profile(input_str: str, image_url: str, prof
     if profile_pfp and profile_pfp.input == input_str:
         profile_pfp.cf_id = cf_id
         await update_item(item=profile, data={"pfp": profile_pfp})
+        if isinstance(profile, User):
+            await clear_cached_users([profile.pk])
         logger.info(f"PFP for profile {profile.pk} uploaded to cloudflare successfully with id: {cf_id}")
@@ -0,0 +1,95 @@
+import logging
+from typing import List, Optional, Tuple, Type, TypeVar, Union
+
+from bson import ObjectId, json_util
+
+from app.helpers.cache_utils import TTLCache, cache
+from app.models.app import App
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_CACHE_SECONDS = 60
+PRINCIPAL_LOCAL_CACHE_SECONDS = 5
+
+PRINCIPAL_CACHE_HIT_LOCAL = "hit_local"
+PRINCIPAL_CACHE_HIT = "hit"
+PRINCIPAL_CACHE_MISS = "miss"
+
+# fields that change too often to be cached, or are never needed once a request is authenticated
+USER_UNCACHED_FIELDS = ["online_channels", "push_tokens", "signers"]
+APP_UNCACHED_FIELDS = ["online_channels", "client_secret"]
+
+PrincipalType = TypeVar("PrincipalType", User, App)
+
+_local_principal_cache = TTLCache(maxsize=10000, ttl=PRINCIPAL_LOCAL_CACHE_SECONDS)
+
+
+def _get_user_principal_key(user_id: str) -> str:
+    return f"principal:user:{user_id}"
+
+
+def _get_app_principal_key(client_id: str) -> str:
+    return f"principal:app:{client_id}"
+
+
+async def _fetch_cached_principal(
+    key: str, filters: dict, result_obj: Type[PrincipalType], uncached_fields: List[str]
+) -> Tuple[Optional[PrincipalType], str]:
+    # the serialized document is cached rather than the object, so every request gets its own copy to mutate
+    cached_doc = _local_principal_cache.get(key)
+    status = PRINCIPAL_CACHE_HIT_LOCAL
+
+    if cached_doc is None:
+        cached_doc = await cache.client.get(key)
+        status = PRINCIPAL_CACHE_HIT
+
+    if cached_doc is None:
+        status = PRINCIPAL_CACHE_MISS
+        deleted_filter = {"$or": [{"deleted": {"$exists": False}}, {"deleted": False}]}
+        doc = await result_obj.collection.find_one(
+            {**filters, **deleted_filter}, projection={field: 0 for field in uncached_fields}
+        )
+        if not doc:
+            return None, status
+
+        cached_doc = json_util.dumps(doc)
+        await cache.client.set(key, cached_doc, ex=PRINCIPAL_CACHE_SECONDS)
+
+    _local_principal_cache.set(key, cached_doc)
+    return result_obj.build_from_mongo(json_util.loads(cached_doc)), status
+
+
+async def fetch_cached_user(user_id: str) -> Tuple[Optional[User], str]:
+    return await _fetch_cached_principal(
+        key=_get_user_principal_key(user_id),
+        filters={"_id": ObjectId(user_id)},
+        result_obj=User,
+        uncached_fields=USER_UNCACHED_FIELDS,
+    )
+
+
+async def fetch_cached_app(client_id: str) -> Tuple[Optional[App], str]:
+    return await _fetch_cached_principal(
+        key=_get_app_principal_key(client_id),
+        filters={"client_id": client_id},
+        result_obj=App,
+        uncached_fields=APP_UNCACHED_FIELDS,
+    )
+
+
+async def _clear_cached_principals(keys: List[str]):
+    if not keys:
+        return
+
+    for key in keys:
+        _local_principal_cache.delete(key)
+    await cache.client.delete(*keys)
+
+
+async def clear_cached_users(user_ids: List[Union[str, ObjectId]]):
+    await _clear_cached_principals([_get_user_principal_key(str(user_id)) for user_id in user_ids])
+
+
+async def clear_cached_apps(client_ids: List[str]):
+    await _clear_cached_principals([_get_app_principal_key(client_id) for client_id in client_ids])
@@ -1,9 +1,10 @@
 import json
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from bson import ObjectId
 
-from app.helpers.cache_utils import cache
+from app.constants.permissions import permissions_to_mask
+from app.helpers.cache_utils import cache, get_channel_cache_key
 from app.models.section import Section
 from app.services.crud import get_item, get_item_by_id
 
@@ -18,13 +19,23 @@ async def fetch_and_cache_section(section_id: str, channel_id: str) -> Dict[str,
             section_id = str(section.pk)
 
     if not section:
-        await cache.client.hset(f"channel:{channel_id}", "section", "")
+        await cache.client.hset(get_channel_cache_key(channel_id), "section", "")
         return {}
 
-    section_overwrites = {str(overwrite.role.pk): overwrite.permissions for overwrite in section.permission_overwrites}
+    section_overwrites = {
+        str(overwrite.role.pk): permissions_to_mask(overwrite.permissions)
+        for overwrite in section.permission_overwrites
+    }
 
-    dict_section = {"permissions": json.dumps(section_overwrites)}
+    dict_section = {"id": section_id, "permissions": json.dumps(section_overwrites)}
 
-    await cache.client.hset(f"section:{section_id}", mapping=dict_section)
-    await cache.client.hset(f"channel:{channel_id}", "section", section_id)
+    await cache.client.hset(get_channel_cache_key(channel_id, "section"), mapping=dict_section)
+    await cache.client.hset(get_channel_cache_key(channel_id), "section", section_id)
     return dict_section
+
+
+async def clear_cached_channel_sections(channel_ids: List[str]):
+    if not channel_ids:
+        return
+
+    await cache.client.delete(*[get_channel_cache_key(channel_id, "section") for channel_id in channel_ids])
@@ -1,12 +1,16 @@
+from typing import Dict, Optional, Union
+
 from bson import ObjectId
 
-from app.helpers.cache_utils import cache
+from app.constants.permissions import permissions_to_mask
+from app.helpers.cache_utils import cache, get_channel_cache_key
+from app.models.channel import Channel
 from app.models.server import Server
 from app.models.user import Role
 from app.services.crud import get_item_by_id, get_items
 
 
-async def fetch_and_cache_server(server_id: str):
+async def fetch_and_cache_server(server_id: str, channel_id: Optional[str] = None):
     if not server_id:
         return {}
 
@@ -15,10 +19,24 @@ async def fetch_and_cache_server(server_id: str):
         return {}
 
     server_roles = await get_items(filters={"server": ObjectId(server_id)}, result_obj=Role)
-    dict_server = {f"roles.{str(role.pk)}": ",".join(role.permissions) for role in server_roles}
+    dict_server: Dict[str, Union[str, int]] = {
+        f"roles.{str(role.pk)}": permissions_to_mask(role.permissions) for role in server_roles
+    }
 
     dict_server["owner"] = str(server.owner.pk)
     dict_server["id"] = server_id
 
     await cache.client.hset(f"server:{server_id}", mapping=dict_server)
+    if channel_id:
+        # copy kept next to the channel's data, read together with it when checking permissions
+        await cache.client.hset(get_channel_cache_key(channel_id, "server"), mapping=dict_server)
+
     return dict_server
+
+
+async def clear_cached_channel_servers(server_id: str):
+    channels = await get_items(filters={"server": ObjectId(server_id)}, result_obj=Channel, limit=None)
+    if not channels:
+        return
+
+    await cache.client.delete(*[get_channel_cache_key(str(channel.pk), "server") for channel in channels])
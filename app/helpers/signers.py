@@ -1,22 +1,69 @@
+import hashlib
 import logging
 import time
+from typing import List, Optional
 
-from starlette.requests import Request
+from starlette.requests import HTTPConnection, Request
 
+from app.helpers.cache_utils import TTLCache, cache
 from app.helpers.crypto import verify_keccak_ed25519_signature
+from app.helpers.principals import fetch_cached_user
 from app.services.users import get_user_by_signer
 
 logger = logging.getLogger(__name__)
 
 MAX_REQUEST_TIMESTAMP_DIFF_IN_SECONDS = 5
+SIGNER_CACHE_SECONDS = 24 * 60 * 60
 
+# a signed request can only be verified within the timestamp window, so its verification is only worth that long
+_verified_signatures = TTLCache(maxsize=10000, ttl=MAX_REQUEST_TIMESTAMP_DIFF_IN_SECONDS)
 
-async def _build_base_encryption_string(request: Request):
+
+def _get_signer_key(signer: str) -> str:
+    return f"signer:{signer}"
+
+
+async def get_user_id_by_signer(signer: str) -> Optional[str]:
+    user_id = await cache.client.get(_get_signer_key(signer))
+    if user_id:
+        return user_id
+
+    user = await get_user_by_signer(signer=signer)
+    if not user:
+        return None
+
+    user_id = str(user.pk)
+    await cache.client.set(_get_signer_key(signer), user_id, ex=SIGNER_CACHE_SECONDS)
+    return user_id
+
+
+async def cache_user_signers(user_id: str, signers: List[str], previous_signers: Optional[List[str]] = None):
+    stale_signers = [signer for signer in previous_signers or [] if signer not in signers]
+    async with cache.client.pipeline(transaction=False) as pipe:
+        if stale_signers:
+            pipe.delete(*[_get_signer_key(signer) for signer in stale_signers])
+        for signer in signers:
+            pipe.set(_get_signer_key(signer), user_id, ex=SIGNER_CACHE_SECONDS)
+        await pipe.execute()
+
+
+async def _verify_request_signature(data: bytes, signature: str, signer: str):
+    verification_key = hashlib.sha256(b":".join([signer.encode(), signature.encode(), data])).hexdigest()
+    if _verified_signatures.get(verification_key):
+        return
+
+    await verify_keccak_ed25519_signature(
+        data=data, signature=bytes.fromhex(signature), signer=bytes.fromhex(signer[2:])
+    )
+    _verified_signatures.set(verification_key, True)
+
+
+async def _build_base_encryption_string(request: HTTPConnection):
     timestamp = request.headers.get("X-NOM-Timestamp")
     if int(time.time()) - int(timestamp) > MAX_REQUEST_TIMESTAMP_DIFF_IN_SECONDS:
         raise Exception("Timestamp is too old")
 
-    request_body = (await request.body()).decode()
+    request_body = (await request.body()).decode() if isinstance(request, Request) else ""
 
     # request_path var is the request url path + query params if exists
     request_path = request.url.path
@@ -26,7 +73,7 @@ async def _build_base_encryption_string(request: Request):
     return f"{timestamp}:{request_path}:{request_body}"
 
 
-async def get_user_from_signed_request(request: Request):
+async def get_user_from_signed_request(request: HTTPConnection):
     timestamp = request.headers.get("X-NOM-Timestamp")
     signature = request.headers.get("X-NOM-Signature")
     signer = request.headers.get("X-NOM-Signer")
@@ -41,13 +88,13 @@ async def get_user_from_signed_request(request: Request):
         raise Exception("Missing required headers for signature authentication")
 
     base_string = await _build_base_encryption_string(request)
-    data = base_string.encode()
-    signature_bytes = bytes.fromhex(signature)
-    signer_bytes = bytes.fromhex(signer[2:])
+    await _verify_request_signature(data=base_string.encode(), signature=signature, signer=signer)
 
-    await verify_keccak_ed25519_signature(data=data, signature=signature_bytes, signer=signer_bytes)
+    user_id = await get_user_id_by_signer(signer=signer)
+    if not user_id:
+        raise Exception(f"User not found with signer: {signer}")
 
-    user = await get_user_by_signer(signer=signer)
+    user, request.state.principal_cache = await fetch_cached_user(user_id=user_id)
     if not user:
         raise Exception(f"User not found with signer: {signer}")
 
@@ -0,0 +1,93 @@
+import logging
+from typing import Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.helpers.cache_utils import cache, eval_cache_script, register_cache_script
+from app.helpers.dates import get_mongo_utc_date
+from app.helpers.jwt import generate_jwt_token
+from app.models.auth import TokenGeneration
+
+logger = logging.getLogger(__name__)
+
+TOKEN_GENERATION_CLAIM = "gen"
+
+TOKEN_GENERATION_SET_SCRIPT_NAME = "set_token_generation"
+
+# generations only go up, a copy read from mongo before a revoke must not overwrite the bumped one
+register_cache_script(
+    TOKEN_GENERATION_SET_SCRIPT_NAME,
+    """
+    local current = redis.call('GET', KEYS[1])
+    if current and tonumber(current) >= tonumber(ARGV[1]) then
+        return tonumber(current)
+    end
+    redis.call('SET', KEYS[1], ARGV[1])
+    return tonumber(ARGV[1])
+    """,
+)
+
+
+def _get_token_generation_key(actor_id: str) -> str:
+    return f"token_generation:{actor_id}"
+
+
+def _get_legacy_refresh_tokens_key(actor_id: str) -> str:
+    # tokens issued before generations were introduced were tracked in a single set per actor
+    return f"refresh_tokens:{actor_id}"
+
+
+async def _cache_token_generation(actor_id: str, generation: int) -> int:
+    return int(
+        await eval_cache_script(
+            TOKEN_GENERATION_SET_SCRIPT_NAME, keys=[_get_token_generation_key(actor_id)], args=[generation]
+        )
+    )
+
+
+async def get_token_generation(actor_id: str) -> int:
+    cached_generation = await cache.client.get(_get_token_generation_key(actor_id))
+    if cached_generation is not None:
+        return int(cached_generation)
+
+    # an evicted copy must not bring revoked tokens back, so a miss is answered by mongo
+    doc = await TokenGeneration.collection.find_one({"actor": ObjectId(actor_id)}, projection={"generation": 1})
+    return await _cache_token_generation(actor_id, doc["generation"] if doc else 0)
+
+
+async def generate_actor_tokens(actor_id: str, claims: dict) -> Tuple[str, str]:
+    generation = await get_token_generation(actor_id)
+    token_claims = {**claims, "sub": actor_id, TOKEN_GENERATION_CLAIM: generation}
+
+    access_token = generate_jwt_token(token_claims)
+    refresh_token = generate_jwt_token(token_claims, token_type="refresh")
+    return access_token, refresh_token
+
+
+async def is_token_revoked(actor_id: str, payload: dict) -> bool:
+    token_generation = payload.get(TOKEN_GENERATION_CLAIM)
+    if token_generation is None:
+        return not await cache.client.exists(_get_legacy_refresh_tokens_key(actor_id))
+
+    return await get_token_generation(actor_id) != token_generation
+
+
+async def discard_refresh_token(actor_id: str, refresh_token: str):
+    # refresh tokens are validated against their stored document, only the legacy set still tracks them here
+    await cache.client.srem(_get_legacy_refresh_tokens_key(actor_id), refresh_token)
+
+
+async def revoke_actor_tokens(actor_id: str):
+    # every token carries the generation it was issued in, so bumping it invalidates all of them at once
+    now = get_mongo_utc_date()
+    doc = await TokenGeneration.collection.find_one_and_update(
+        {"actor": ObjectId(actor_id)},
+        {"$inc": {"generation": 1}, "$setOnInsert": {"created_at": now, "deleted": False}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    await _cache_token_generation(actor_id, doc["generation"])
+    await cache.client.delete(_get_legacy_refresh_tokens_key(actor_id))
+
+    logger.info("revoked all tokens. [actor_id=%s]", actor_id)
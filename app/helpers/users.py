@@ -1,8 +1,9 @@
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Optional
 
 from bson import ObjectId
 
+from app.constants.permissions import permissions_to_mask
 from app.exceptions import APIPermissionError
 from app.helpers.cache_utils import cache
 from app.models.server import ServerMember
@@ -11,7 +12,7 @@ from app.services.crud import get_item
 logger = logging.getLogger(__name__)
 
 
-async def get_user_roles_permissions(user: Dict[str, Any], server: Dict[str, Any]) -> Dict[str, List[str]]:
+async def get_user_roles_permissions(user: Dict[str, Any], server: Dict[str, Any]) -> Dict[str, int]:
     server_id = server.get("id")
     server_role_ids = user.get(f"{server_id}.roles", "")
     user_roles = server_role_ids.split(",")
@@ -24,7 +25,7 @@ async def get_user_roles_permissions(user: Dict[str, Any], server: Dict[str, Any
     if any([perm is None for perm in server_roles_permissions]):
         raise Exception("unexpected none permission")
 
-    result = {pair[0]: pair[1].split(",") for pair in zip(user_roles, server_roles_permissions)}
+    result = {pair[0]: permissions_to_mask(pair[1]) for pair in zip(user_roles, server_roles_permissions)}
     return result
 
 
@@ -1,16 +1,78 @@
+import functools
 import logging
+from typing import Optional
 
+from app.config import get_settings
+from app.helpers.cache_utils import TTLCache, cache
 from app.helpers.w3 import checksum_address
-from app.models.user import WhitelistedWallet
-from app.services.crud import get_item
+from app.models.user import User, WhitelistedWallet
 
 logger = logging.getLogger(__name__)
 
+WHITELIST_KEY = "whitelist:wallets"
+WHITELIST_LOADED_KEY = "whitelist:wallets:loaded"
+WHITELIST_LOAD_BATCH_SIZE = 1000
+WHITELIST_LOCAL_CACHE_TTL_SECONDS = 10
+
+_local_whitelist_cache = TTLCache(maxsize=10000, ttl=WHITELIST_LOCAL_CACHE_TTL_SECONDS)
+
+
+@functools.lru_cache(maxsize=10000)
+def _checksum_address(wallet_address: str) -> str:
+    return checksum_address(wallet_address)
+
+
+async def load_whitelisted_wallets() -> int:
+    loaded_wallets = 0
+    batch = []
+
+    cursor = WhitelistedWallet.collection.find({}, projection={"wallet_address": 1})
+    async for doc in cursor:
+        batch.append(doc["wallet_address"])
+        if len(batch) >= WHITELIST_LOAD_BATCH_SIZE:
+            await cache.client.sadd(WHITELIST_KEY, *batch)
+            loaded_wallets += len(batch)
+            batch = []
+
+    if batch:
+        await cache.client.sadd(WHITELIST_KEY, *batch)
+        loaded_wallets += len(batch)
+
+    await cache.client.set(WHITELIST_LOADED_KEY, "1")
+    logger.info(f"loaded {loaded_wallets} whitelisted wallets")
+    return loaded_wallets
+
 
 async def is_wallet_whitelisted(wallet_address: str) -> bool:
-    wallet_address_checksum = checksum_address(wallet_address)
-    exists = await get_item(filters={"wallet_address": wallet_address_checksum}, result_obj=WhitelistedWallet)
-    return exists is not None
+    wallet_address_checksum = _checksum_address(wallet_address)
+    whitelisted = _local_whitelist_cache.get(wallet_address_checksum)
+    if whitelisted is not None:
+        return whitelisted
+
+    async with cache.client.pipeline(transaction=False) as pipe:
+        pipe.exists(WHITELIST_LOADED_KEY)
+        pipe.sismember(WHITELIST_KEY, wallet_address_checksum)
+        loaded, whitelisted = await pipe.execute()
+
+    if not loaded:
+        await load_whitelisted_wallets()
+        whitelisted = await cache.client.sismember(WHITELIST_KEY, wallet_address_checksum)
+
+    whitelisted = bool(whitelisted)
+    _local_whitelist_cache.set(wallet_address_checksum, whitelisted)
+    return whitelisted
+
+
+async def is_user_whitelisted(user: Optional[User]) -> bool:
+    # only permission checks care about the whitelist, and only while the feature is on
+    if not user or not get_settings().feature_whitelist:
+        return False
+
+    try:
+        return await is_wallet_whitelisted(wallet_address=user.wallet_address)
+    except Exception:
+        logger.error("failed to check user wallet address")
+        return False
 
 
 async def whitelist_wallet(wallet_address: str) -> WhitelistedWallet:
@@ -18,4 +80,7 @@ async def whitelist_wallet(wallet_address: str) -> WhitelistedWallet:
     db_object = WhitelistedWallet(wallet_address=wallet_address_checksum)
     await db_object.commit()
     logger.info("Object created. [object_type=%s, object_id=%s]", WhitelistedWallet.__name__, str(db_object.id))
+
+    await cache.client.sadd(WHITELIST_KEY, wallet_address_checksum)
+    _local_whitelist_cache.delete(wallet_address_checksum)
     return db_object
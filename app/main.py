@@ -20,8 +20,16 @@ from app.exceptions import (
     marshmallow_validation_error_handler,
     type_error_handler,
 )
-from app.helpers.cache_utils import close_redis_connection, connect_to_redis, connect_to_redis_testing
+from app.helpers.cache_utils import (
+    close_redis_connection,
+    connect_to_redis,
+    connect_to_redis_testing,
+    load_cache_scripts,
+)
+from app.helpers.channels import channel_last_message_job_shutdown, channel_last_message_job_start
 from app.helpers.db_utils import close_mongo_connection, connect_to_mongo, create_all_indexes, override_connect_to_mongo
+from app.helpers.expo import expo_client_shutdown, expo_client_start
+from app.helpers.gateway import close_gateway_connections
 from app.helpers.logconf import log_configuration
 from app.helpers.queue_utils import stop_background_tasks
 from app.helpers.unfurl_singleton import unfurl_singleton_shutdown, unfurl_singleton_start
@@ -31,6 +39,7 @@ from app.routers import (
     auth,
     base,
     channels,
+    events,
     integrations,
     media,
     messages,
@@ -42,6 +51,7 @@ from app.routers import (
     webhooks,
     websockets,
 )
+from app.services.push_notifications import push_coalesce_job_shutdown, push_coalesce_job_start
 
 logging.config.dictConfig(log_configuration)
 logger = logging.getLogger(__name__)
@@ -53,14 +63,24 @@ def get_application(testing=False):
     if testing:
         app_.add_event_handler("startup", override_connect_to_mongo)
         app_.add_event_handler("startup", connect_to_redis_testing)
+        app_.add_event_handler("startup", load_cache_scripts)
     else:
         app_.add_event_handler("startup", connect_to_mongo)
         app_.add_event_handler("startup", create_all_indexes)
         app_.add_event_handler("startup", connect_to_redis)
+        app_.add_event_handler("startup", load_cache_scripts)
+        app_.add_event_handler("startup", expo_client_start)
+        app_.add_event_handler("startup", push_coalesce_job_start)
+        app_.add_event_handler("startup", channel_last_message_job_start)
 
     app_.add_event_handler("startup", unfurl_singleton_start)
     app_.add_event_handler("shutdown", unfurl_singleton_shutdown)
 
+    app_.add_event_handler("shutdown", close_gateway_connections)
+    # pending push windows are flushed before the expo client goes away
+    app_.add_event_handler("shutdown", push_coalesce_job_shutdown)
+    app_.add_event_handler("shutdown", channel_last_message_job_shutdown)
+    app_.add_event_handler("shutdown", expo_client_shutdown)
     app_.add_event_handler("shutdown", stop_background_tasks)
     app_.add_event_handler("shutdown", close_mongo_connection)
     app_.add_event_handler("shutdown", close_redis_connection)
@@ -109,6 +129,7 @@ def get_application(testing=False):
     app_.include_router(channels.router, prefix="/channels", tags=["channels"])
     app_.include_router(messages.router, prefix="/messages", tags=["messages"])
     app_.include_router(websockets.router, prefix="/websockets", tags=["websockets"])
+    app_.include_router(events.router, prefix="/events", tags=["events"])
     app_.include_router(webhooks.router, prefix="/webhooks", tags=["webhooks"])
     app_.include_router(media.router, prefix="/media", tags=["media"])
     app_.include_router(integrations.router, prefix="/integrations", tags=["integrations"])
@@ -87,7 +87,15 @@ class CanonicalLoggingMiddleware:
                 "type": "request",
             }
 
-            for attr in ["user_id", "auth_type", "auth_source", "actor_type", "app_id", "permissions_used"]:
+            for attr in [
+                "user_id",
+                "auth_type",
+                "auth_source",
+                "actor_type",
+                "app_id",
+                "permissions_used",
+                "principal_cache",
+            ]:
                 try:
                     log_line_data[attr] = getattr(request.state, attr)
                 except AttributeError:
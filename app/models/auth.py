@@ -1,3 +1,4 @@
+from pymongo import ASCENDING
 from umongo import fields
 
 from app.helpers.db_utils import instance
@@ -34,3 +35,14 @@ class AuthorizationCode(APIDocument):
 
     class Meta:
         collection_name = "auth_codes"
+
+
+@instance.register
+class TokenGeneration(APIDocument):
+    # source of truth for token revocation, redis only keeps a copy of the generation
+    actor = fields.ObjectIdField()
+    generation = fields.IntField(default=0)
+
+    class Meta:
+        collection_name = "token_generations"
+        indexes = [[("actor", ASCENDING), {"unique": True}]]
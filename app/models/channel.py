@@ -1,7 +1,8 @@
 from marshmallow import ValidationError
-from pymongo import ASCENDING
+from pymongo import ASCENDING, DESCENDING
 from umongo import fields, validate
 
+from app.helpers.dates import get_mongo_utc_date
 from app.helpers.db_utils import instance
 from app.models.base import APIDocument
 from app.models.common import PermissionOverwrite
@@ -17,6 +18,9 @@ class Channel(APIDocument):
 
     # DM / Topic field
     members = fields.ListField(fields.ReferenceField("User"))
+    # very large channels keep their members in the channel_members collection instead
+    external_members = fields.BoolField(default=False, load_only=True)
+    member_count = fields.IntField(default=0, load_only=True)
 
     # Server field
     server = fields.ReferenceField(Server)
@@ -30,6 +34,8 @@ class Channel(APIDocument):
     permission_overwrites = fields.ListField(fields.EmbeddedField(PermissionOverwrite), default=[], load_only=True)
 
     def pre_insert(self):
+        self.member_count = len(self.members or [])
+
         if self.kind == "dm":
             if not hasattr(self, "members"):
                 raise ValidationError("missing 'members' field")
@@ -46,7 +52,7 @@ class Channel(APIDocument):
 
     class Meta:
         collection_name = "channels"
-        indexes = ["server"]
+        indexes = ["server", [("kind", ASCENDING), ("deleted", ASCENDING), ("member_count", DESCENDING)]]
 
 
 @instance.register
@@ -62,3 +68,18 @@ class ChannelReadState(APIDocument):
             "user",
             [("user", ASCENDING), ("channel", ASCENDING), {"unique": True}],
         ]
+
+
+@instance.register
+class ChannelMember(APIDocument):
+    channel = fields.ReferenceField("Channel", required=True)
+    user = fields.ReferenceField("User", required=True)
+
+    joined_at = fields.AwareDateTimeField(default=get_mongo_utc_date)
+
+    class Meta:
+        collection_name = "channel_members"
+        indexes = [
+            [("channel", ASCENDING), ("user", ASCENDING), {"unique": True}],
+            [("user", ASCENDING), ("channel", ASCENDING)],
+        ]
@@ -35,7 +35,7 @@ class User(APIDocument):
 
     class Meta:
         collection_name = "users"
-        indexes = [[("wallet_address", ASCENDING)]]
+        indexes = [[("wallet_address", ASCENDING)], [("signers", ASCENDING)]]
 
 
 @instance.register
@@ -3,8 +3,9 @@ from datetime import datetime
 from typing import List, Optional, Union
 from urllib.parse import unquote
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
 from starlette import status
+from starlette.responses import Response
 
 from app.dependencies import PermissionsChecker, common_parameters, get_current_user, get_current_user_non_error
 from app.models.user import User
@@ -58,7 +59,8 @@ async def get_fetch_channels(
     unescaped_tags = unquote(tags) if tags else None
 
     if scope == "discovery":
-        return await get_public_channels(tags=unescaped_tags, **common_params)
+        payload = await get_public_channels(tags=unescaped_tags, **common_params)
+        return Response(content=payload, media_type="application/json")
     else:
         if not current_user_or_exception or isinstance(current_user_or_exception, Exception):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
@@ -78,7 +80,8 @@ async def get_fetch_channels(
 # deprecated in favour of /channels?kind=topic&scope=discovery
 @router.get("/@public", response_description="Get public channels", response_model=List[EitherChannel])
 async def get_fetch_public_channels():
-    return await get_public_channels()
+    payload = await get_public_channels()
+    return Response(content=payload, media_type="application/json")
 
 
 @router.post(
@@ -244,5 +247,7 @@ async def post_join_server(channel_id: str, current_user: User = Depends(get_cur
     response_model_exclude_none=True,
     dependencies=[Depends(PermissionsChecker(needs_bearer=False, permissions=["channels.members.list"]))],
 )
-async def get_fetch_channel_members(channel_id: str):
-    return await get_channel_members(channel_id=channel_id)
+async def get_fetch_channel_members(
+    channel_id: str, after: Optional[str] = None, limit: int = Query(default=1000, gt=0, le=1000)
+):
+    return await get_channel_members(channel_id=channel_id, after=after, limit=limit)
@@ -0,0 +1,19 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app.dependencies import get_current_user
+from app.models.user import User
+from app.schemas.events import EventStreamSchema
+from app.services.event_streams import get_user_events
+
+router = APIRouter()
+
+
+@router.get("", summary="List events since sequence id", response_model=EventStreamSchema)
+async def get_list_events(
+    since: Optional[str] = None,
+    limit: int = Query(100, gt=0, le=500),
+    current_user: User = Depends(get_current_user),
+):
+    return await get_user_events(current_user=current_user, since=since, limit=limit)
@@ -1,5 +1,5 @@
 import http
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
 from fastapi import APIRouter, Body, Depends, Response
 from starlette.status import HTTP_204_NO_CONTENT
@@ -7,11 +7,12 @@ from starlette.status import HTTP_204_NO_CONTENT
 from app.dependencies import get_current_user, get_current_user_non_error
 from app.models.user import User
 from app.schemas.channels import ChannelReadStateSchema, EitherChannel
+from app.schemas.permissions import ChannelsPermissionsRequestSchema
 from app.schemas.preferences import UserPreferencesSchema, UserPreferencesUpdateSchema
 from app.schemas.reports import UserReportCreateSchema, UserReportSchema
 from app.schemas.servers import ServerMemberUpdateSchema, ServerSchema
 from app.schemas.users import PublicUserSchema, UserBlockCreateSchema, UserBlockSchema, UserSchema, UserUpdateSchema
-from app.services.channels import get_user_channels, get_user_member_channels
+from app.services.channels import get_user_channels, get_user_channels_permissions, get_user_member_channels
 from app.services.servers import get_user_servers
 from app.services.users import (
     block_user,
@@ -66,6 +67,15 @@ async def fetch_get_user_channels(current_user: User = Depends(get_current_user)
     return await get_user_channels(current_user)
 
 
+@router.post(
+    "/me/permissions", summary="List current user's permissions per channel", response_model=Dict[str, List[str]]
+)
+async def post_get_user_channels_permissions(
+    data: ChannelsPermissionsRequestSchema = Body(...), current_user: User = Depends(get_current_user)
+):
+    return await get_user_channels_permissions(channel_ids=data.channels, current_user=current_user)
+
+
 @router.get("/{account_address}/channels", summary="Get user channels", response_model=List[EitherChannel])
 async def fetch_get_user_member_channels(
     account_address: str, current_user_or_exception=Depends(get_current_user_non_error)
@@ -11,7 +11,7 @@ from app.models.webhook import Webhook
 from app.schemas.messages import WebhookMessageCreateSchema
 from app.services.crud import get_item_by_id
 from app.services.messages import create_app_message
-from app.services.webhooks import handle_pusher_event
+from app.services.webhooks import handle_pusher_events
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +36,7 @@ async def post_pusher_webhooks(
             detail="Could not validate webhook",
         )
 
-    [await queue_bg_task(handle_pusher_event, event) for event in webhook["events"]]
+    await queue_bg_task(handle_pusher_events, webhook["events"])
 
     return {"received": "ok"}
 
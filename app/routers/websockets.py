@@ -1,12 +1,16 @@
 import logging
-from typing import Optional
+from typing import Optional, Union
 
-from fastapi import APIRouter, Depends, Form, HTTPException
+from fastapi import APIRouter, Depends, Form, HTTPException, WebSocket
+from starlette import status
 
-from app.dependencies import get_current_app, get_current_user
+from app.config import get_settings
+from app.dependencies import get_current_app, get_current_user, get_current_websocket_actor
+from app.helpers.gateway import GatewayConnection, gateway
 from app.helpers.pusher import pusher_client
 from app.models.app import App
 from app.models.user import User
+from app.services.webhooks import process_channel_occupied_event, process_channel_vacated_event
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -38,3 +42,29 @@ async def post_websocket_authentication(
 
     auth = pusher_client.authenticate(channel=channel_name, socket_id=socket_id)
     return auth
+
+
+@router.websocket("/gateway")
+async def websocket_gateway(
+    websocket: WebSocket, current_actor: Union[User, App, None] = Depends(get_current_websocket_actor)
+):
+    settings = get_settings()
+    if settings.websocket_provider.lower() not in ["native", "all"]:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    if not current_actor:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+
+    connection = GatewayConnection(websocket=websocket, actor_id=str(current_actor.pk))
+    await gateway.register(connection)
+    await process_channel_occupied_event(channel_name=connection.channel_name, actor=current_actor)
+
+    try:
+        await connection.run()
+    finally:
+        await gateway.unregister(connection)
+        await process_channel_vacated_event(channel_name=connection.channel_name, actor=current_actor)
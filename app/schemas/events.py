@@ -0,0 +1,32 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+class StreamEventSchema(BaseModel):
+    seq: str
+    event: str
+    data: dict
+
+
+class EventStreamSchema(BaseModel):
+    seq: str
+    events: List[StreamEventSchema] = []
+    resync: bool = False
+    has_more: bool = False
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "seq": "1681902381043-0",
+                "events": [
+                    {
+                        "seq": "1681902381043-0",
+                        "event": "CHANNEL_READ",
+                        "data": {"read_at": "2023-04-19T11:06:21.043000+00:00", "channel": "61e17018c3ee162141baf5c9"},
+                    }
+                ],
+                "resync": False,
+                "has_more": False,
+            }
+        }
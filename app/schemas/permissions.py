@@ -1,5 +1,7 @@
 from typing import List, Optional
 
+from pydantic import BaseModel, Field
+
 from app.schemas.base import APIBaseCreateSchema, APIBaseUpdateSchema
 
 
@@ -26,3 +28,10 @@ class PermissionCreateSchema(APIBaseCreateSchema):
                 {"group": "@public", "permissions": ["messages.list"]},
             ]
         }
+
+
+class ChannelsPermissionsRequestSchema(BaseModel):
+    channels: List[str] = Field(..., max_items=200)
+
+    class Config:
+        schema_extra = {"example": {"channels": ["63a0c5b3c2b4a3b7a8f1e2d3"]}}
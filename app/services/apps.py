@@ -3,6 +3,7 @@ import secrets
 from fastapi import HTTPException
 from starlette import status
 
+from app.helpers.principals import clear_cached_apps
 from app.models.app import App
 from app.models.user import User
 from app.models.webhook import Webhook
@@ -40,5 +41,7 @@ async def get_app_by_client_id(client_id):
 
 
 async def delete_user_apps(user: User):
+    apps = await get_items(filters={"creator": user.pk}, result_obj=App, limit=None)
     await delete_items(filters={"creator": user.pk}, result_obj=App)
+    await clear_cached_apps([app.client_id for app in apps])
     await delete_items(filters={"creator": user.pk}, result_obj=Webhook)
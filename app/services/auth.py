@@ -1,3 +1,5 @@
+import asyncio
+import hashlib
 import logging
 import re
 from typing import Dict, List
@@ -9,7 +11,11 @@ from starlette import status
 
 from app.config import get_settings
 from app.helpers.cache_utils import cache
-from app.helpers.jwt import decode_jwt_token, generate_jwt_token
+from app.helpers.jwt import decode_jwt_token
+from app.helpers.principals import clear_cached_users
+from app.helpers.queue_utils import queue_bg_task
+from app.helpers.signers import cache_user_signers
+from app.helpers.tokens import generate_actor_tokens, is_token_revoked, revoke_actor_tokens
 from app.helpers.w3 import (
     checksum_address,
     get_wallet_address_from_broadcast_identity_payload,
@@ -36,22 +42,49 @@ NONCE_SIGNATURE_REGEX = re.compile(r"nonce:\s?(.+?)\b", flags=re.IGNORECASE)
 SIGNED_AT_SIGNATURE_REGEX = re.compile(r"issued at:\s?(.+?)$", flags=re.IGNORECASE)
 
 
+def _get_auto_join_channel_ids() -> List[str]:
+    channel_ids = get_settings().feature_auto_join_channel_ids or ""
+    return sorted({channel_id.strip() for channel_id in channel_ids.split(",") if channel_id.strip()})
+
+
+def _get_auto_join_key(user_id: str) -> str:
+    return f"auto_join:{user_id}"
+
+
+def _get_auto_join_version(channel_ids: List[str]) -> str:
+    # users are joined again only when the configured channels change
+    return hashlib.sha1(",".join(channel_ids).encode()).hexdigest()
+
+
 async def add_user_to_default_channels(user_id):
     settings = get_settings()
 
     if not settings.feature_auto_join:
         return
 
+    channel_ids = _get_auto_join_channel_ids()
     user = await get_user_by_id(user_id=user_id)
-    for channel_id in settings.feature_auto_join_channel_ids.split(","):
-        channel_id = channel_id.strip()
+    for channel_id in channel_ids:
         channel = await get_item_by_id(id_=channel_id, result_obj=Channel)
         if not channel:
             logger.debug("channel not found")
-            return
+            continue
 
         await join_channel(channel_id=str(channel.pk), current_user=user)
 
+    await cache.client.set(_get_auto_join_key(user_id), _get_auto_join_version(channel_ids))
+
+
+async def queue_add_user_to_default_channels(user_id: str):
+    if not get_settings().feature_auto_join:
+        return
+
+    joined_version = await cache.client.get(_get_auto_join_key(user_id))
+    if joined_version == _get_auto_join_version(_get_auto_join_channel_ids()):
+        return
+
+    await queue_bg_task(add_user_to_default_channels, user_id)
+
 
 async def generate_wallet_token(data: AuthWalletSchema) -> AccessTokenSchema:
     message = data.message
@@ -64,10 +97,8 @@ async def generate_wallet_token(data: AuthWalletSchema) -> AccessTokenSchema:
     signed_at = arrow.get(data.signed_at)
     nonce = data.nonce
 
-    try:
-        signed_address = get_wallet_address_from_signed_message(message, signature)
-    except Exception as e:
-        raise e
+    # signature recovery is cpu-bound, keep it off the event loop so concurrent logins don't block other requests
+    signed_address = await asyncio.to_thread(get_wallet_address_from_signed_message, message, signature)
 
     assert signed_address == checksum_address(address)
     assert signed_address.lower() in message.lower()
@@ -93,11 +124,9 @@ async def generate_wallet_token(data: AuthWalletSchema) -> AccessTokenSchema:
     if not user:
         user = await create_user(UserCreateSchema(wallet_address=signed_address))
 
-    await add_user_to_default_channels(str(user.pk))
+    await queue_add_user_to_default_channels(str(user.pk))
 
-    access_token = generate_jwt_token({"sub": str(user.id)})
-    refresh_token = generate_jwt_token({"sub": str(user.id)}, token_type="refresh")
-    await cache.client.sadd(f"refresh_tokens:{str(user.pk)}", refresh_token)
+    access_token, refresh_token = await generate_actor_tokens(str(user.pk), claims={})
 
     await create_item(
         RefreshTokenCreateSchema(refresh_token=refresh_token, user=str(user.id)),
@@ -139,30 +168,32 @@ async def create_refresh_token(token_model: RefreshTokenCreateSchema) -> AccessT
         logger.warning("User in refresh token not found. [user_id=%s]", user_id)
         raise credentials_exception
 
+    if await is_token_revoked(user_id, payload):
+        logger.warning("Refresh token was revoked. [user_id=%s]", user_id)
+        raise credentials_exception
+
     if refresh_token.used is True:
         logger.warning("tried to reuse already used refresh token. revoking all! [user_id=%s]", user_id)
         await delete_items(filters={"user": user.pk}, result_obj=RefreshToken)
-        await cache.client.delete(f"refresh_tokens:{str(user.pk)}")
+        await revoke_actor_tokens(str(user.pk))
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token already used")
     else:
         await update_item(refresh_token, data={"used": True})
 
-    access_token = generate_jwt_token({"sub": str(user.id)})
-    refresh_token = generate_jwt_token({"sub": str(user.id)}, token_type="refresh")
-    await cache.client.sadd(f"refresh_tokens:{str(user.pk)}", refresh_token)
+    access_token, new_refresh_token = await generate_actor_tokens(str(user.pk), claims={})
 
     await create_item(
-        RefreshTokenCreateSchema(refresh_token=refresh_token, user=str(user.id)),
+        RefreshTokenCreateSchema(refresh_token=new_refresh_token, user=str(user.id)),
         result_obj=RefreshToken,
         current_user=user,
     )
 
-    token = AccessTokenSchema(access_token=access_token, refresh_token=refresh_token)
+    token = AccessTokenSchema(access_token=access_token, refresh_token=new_refresh_token)
     return token
 
 
 async def revoke_tokens(current_user: User):
-    await cache.client.delete(f"refresh_tokens:{str(current_user.pk)}")
+    await revoke_actor_tokens(str(current_user.pk))
     await delete_items(filters={"user": current_user.pk}, result_obj=RefreshToken)
 
 
@@ -188,14 +219,17 @@ async def broadcast_user_identity(data: AccountBroadcastIdentitySchema):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="signature_expired")
 
     signers: List[Dict[str, str]] = payload.body.get("signers", [])
-    if not signers:
+    signers_pks = [s["public_key"] for s in signers if s.get("public_key")]
+    if not signers_pks:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="no signers found")
 
     user = await get_user_by_wallet_address(wallet_address=signed_address)
     if not user:
         user = await create_user(UserCreateSchema(wallet_address=signed_address))
 
-    signers_pks = [s.get("public_key") for s in signers]
+    previous_signers = list(user.signers or [])
     await update_item(user, data={"signers": signers_pks})
+    await clear_cached_users([user.pk])
+    await cache_user_signers(str(user.pk), signers=signers_pks, previous_signers=previous_signers)
 
-    await add_user_to_default_channels(str(user.pk))
+    await queue_add_user_to_default_channels(str(user.pk))
@@ -25,9 +25,11 @@ async def get_connection_ready_data(current_user: User) -> dict:
 
     channels = []
     for channel in await get_all_member_channels(current_user=current_user, limit=None):
-        unique_user_ids.update([member.pk for member in channel.members])
+        # members of very large channels aren't inlined, they're listed through the paginated members endpoint
+        channel_members = channel.members or []
+        unique_user_ids.update([member.pk for member in channel_members])
         dumped_channel = channel.dump()
-        dumped_channel["members"] = [{"user": str(member.pk)} for member in channel.members]
+        dumped_channel["members"] = [{"user": str(member.pk)} for member in channel_members]
         channels.append(dumped_channel)
 
     data["channels"] = channels
@@ -1,22 +1,47 @@
 import http
-import json
 import logging
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional, Union, cast
 
 from bson import ObjectId
 from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
 from sentry_sdk import capture_exception
 from starlette import status
 
 from app.helpers import cloudflare
-from app.helpers.cache_utils import cache
-from app.helpers.channels import convert_permission_object_to_cached, is_user_in_channel, parse_member_list
+from app.helpers.cache_utils import cache, get_channel_cache_key
+from app.helpers.channels import (
+    add_cached_channel_members,
+    add_channel_members,
+    convert_permission_object_to_cached,
+    filter_channel_members,
+    get_channel_member_ids,
+    get_member_channels_filter,
+    is_channel_member,
+    is_user_in_channel,
+    parse_member_list,
+    remove_cached_channel_members,
+    remove_channel_members,
+)
+from app.helpers.discovery import (
+    DISCOVERY_PUBLIC_PERMISSIONS,
+    get_cached_discovery_payload,
+    get_discovery_cache_key,
+    invalidate_discovery_cache,
+    is_discoverable_channel,
+)
 from app.helpers.events import EventType
-from app.helpers.permissions import fetch_user_permissions, user_belongs_to_server
+from app.helpers.permissions import (
+    bump_permissions_version,
+    fetch_user_channels_permissions,
+    fetch_user_permissions,
+    user_belongs_to_server,
+)
 from app.helpers.queue_utils import queue_bg_task
 from app.helpers.w3 import checksum_address
-from app.helpers.whitelist import is_wallet_whitelisted
+from app.helpers.whitelist import is_user_whitelisted
 from app.models.base import APIDocument
 from app.models.channel import Channel, ChannelReadState
 from app.models.common import PermissionOverwrite
@@ -29,6 +54,7 @@ from app.schemas.channels import (
     ChannelReadStateCreateSchema,
     ChannelUpdateSchema,
     DMChannelCreateSchema,
+    EitherChannel,
     ServerChannelCreateSchema,
     TopicChannelCreateSchema,
 )
@@ -42,6 +68,7 @@ from app.services.crud import (
     get_item,
     get_item_by_id,
     get_items,
+    parse_object_id,
     update_item,
 )
 from app.services.events import broadcast_event
@@ -147,7 +174,8 @@ async def get_server_channels(server_id, current_user: User) -> List[Union[Chann
 
 
 async def get_all_member_channels(current_user: User, **kwargs) -> List[Union[Channel, APIDocument]]:
-    return await get_items(filters={"members": current_user.pk}, result_obj=Channel, **kwargs)
+    filters = await get_member_channels_filter([current_user.pk])
+    return await get_items(filters=filters, result_obj=Channel, **kwargs)
 
 
 async def get_dm_channels(current_user: User, **kwargs) -> List[Union[Channel, APIDocument]]:
@@ -155,7 +183,8 @@ async def get_dm_channels(current_user: User, **kwargs) -> List[Union[Channel, A
 
 
 async def get_topic_channels(current_user: User, **kwargs) -> List[Union[Channel, APIDocument]]:
-    return await get_items(filters={"members": current_user.pk, "kind": "topic"}, result_obj=Channel, **kwargs)
+    filters = await get_member_channels_filter([current_user.pk])
+    return await get_items(filters={**filters, "kind": "topic"}, result_obj=Channel, **kwargs)
 
 
 async def delete_channel(channel_id, current_user: User):
@@ -176,7 +205,11 @@ async def delete_channel(channel_id, current_user: User):
     else:
         raise Exception(f"unexpected kind of channel: {channel.kind}")
 
+    was_discoverable = is_discoverable_channel(channel)
     deleted_channel = await delete_item(item=channel)
+    await bump_permissions_version(channel_id=channel_id)
+    if was_discoverable:
+        await invalidate_discovery_cache()
 
     try:
         section = await get_item(filters={"channels": ObjectId(channel_id)}, result_obj=Section)
@@ -262,7 +295,7 @@ async def update_channel(channel_id: str, update_data: ChannelUpdateSchema, curr
         if channel.owner != current_user and server.owner != current_user:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User cannot change this channel")
     elif channel.kind == "dm" or channel.kind == "topic":
-        if current_user not in channel.members or channel.owner != current_user:
+        if channel.owner != current_user or not await is_channel_member(channel, current_user.pk):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User cannot change this channel")
     else:
         raise Exception(f"unknown channel kind: {channel.kind}")
@@ -277,6 +310,8 @@ async def update_channel(channel_id: str, update_data: ChannelUpdateSchema, curr
             data["avatar"] = None
 
     updated_item = await update_item(item=channel, data=data)
+    if is_discoverable_channel(updated_item):
+        await invalidate_discovery_cache()
 
     await queue_bg_task(
         broadcast_event,
@@ -305,11 +340,13 @@ async def invite_members_to_channel(channel_id: str, members: List[str], current
         raise Exception(f"cannot change members of channel type: {channel.kind}")
 
     parsed_member_list = await parse_member_list(members=members)
+    existing_member_ids = await filter_channel_members(channel, [member.pk for member in parsed_member_list])
 
     new_users = []
-    final_channel_members = [m.pk for m in channel.members]
+    # channels with external members only check the invitees, their member list isn't loaded
+    final_channel_members = [m.pk for m in channel.members or []]
     for member in parsed_member_list:
-        if member not in channel.members:
+        if member.pk not in existing_member_ids:
             final_channel_members.append(member.pk)
             new_users.append(member)
 
@@ -320,8 +357,9 @@ async def invite_members_to_channel(channel_id: str, members: List[str], current
     if blocked_users:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="One of the invitees has blocked the user")
 
-    await update_item(item=channel, data={"members": final_channel_members})
-    await cache.client.hset(f"channel:{channel_id}", "members", ",".join([str(m) for m in final_channel_members]))
+    channel = await add_channel_members(channel, [new_user.pk for new_user in new_users])
+    await add_cached_channel_members(channel_id, [str(new_user.pk) for new_user in new_users])
+    await bump_permissions_version(channel_id=channel_id)
 
     for new_user in new_users:
         await queue_bg_task(
@@ -347,14 +385,12 @@ async def kick_member_from_channel(channel_id: str, member_id: str, current_user
     if str(channel.owner.pk) == member_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cannot kick owner from channel")
 
-    current_channel_members = [str(m.pk) for m in channel.members]
-
-    if member_id not in current_channel_members:
+    if not await is_channel_member(channel, ObjectId(member_id)):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="member is not part of the channel")
 
-    final_channel_members = [m for m in current_channel_members if m != member_id]
-    await update_item(item=channel, data={"members": final_channel_members})
-    await cache.client.hset(f"channel:{channel_id}", "members", ",".join([str(m) for m in final_channel_members]))
+    await remove_channel_members(channel, [ObjectId(member_id)])
+    await remove_cached_channel_members(channel_id, [member_id])
+    await bump_permissions_version(channel_id=channel_id)
 
     if member_id == str(current_user.pk):
         await delete_items(
@@ -370,10 +406,14 @@ async def update_channel_permissions(channel_id: str, update_data: List[Permissi
         ow = PermissionOverwrite(**permission.dict(exclude_none=True))
         ows.append(ow)
 
+    was_discoverable = is_discoverable_channel(channel)
     updated = await update_item(item=channel, data={"permission_overwrites": ows})
 
     cache_ps = await convert_permission_object_to_cached(updated)
-    await cache.client.hset(f"channel:{channel_id}", "permissions", cache_ps)
+    await cache.client.hset(get_channel_cache_key(channel_id), "permissions", cache_ps)
+    await bump_permissions_version(channel_id=channel_id)
+    if was_discoverable or is_discoverable_channel(updated):
+        await invalidate_discovery_cache()
 
 
 async def join_channel(channel_id: str, current_user: User):
@@ -383,14 +423,12 @@ async def join_channel(channel_id: str, current_user: User):
             status_code=status.HTTP_400_BAD_REQUEST, detail=f"cannot join channel of type: {channel.kind}"
         )
 
-    if current_user in channel.members:
+    if await is_channel_member(channel, current_user.pk):
         return
 
-    current_channel_members = [m.pk for m in channel.members]
-    current_channel_members.append(current_user.pk)
-
-    await update_item(item=channel, data={"members": current_channel_members})
-    await cache.client.hset(f"channel:{channel_id}", "members", ",".join([str(m) for m in current_channel_members]))
+    channel = await add_channel_members(channel, [current_user.pk])
+    await add_cached_channel_members(channel_id, [str(current_user.pk)])
+    await bump_permissions_version(channel_id=channel_id)
 
     await queue_bg_task(
         broadcast_event,
@@ -411,12 +449,7 @@ async def get_channel_permissions(channel_id: str, current_user_or_exception: Un
 
     user_id = str(current_user_or_exception.pk) if current_user_or_exception else None
 
-    user_whitelisted = False
-    if current_user_or_exception:
-        try:
-            user_whitelisted = await is_wallet_whitelisted(wallet_address=current_user_or_exception.wallet_address)
-        except Exception:
-            logger.error("failed to check user wallet address")
+    user_whitelisted = await is_user_whitelisted(current_user_or_exception)
 
     try:
         permissions = await fetch_user_permissions(
@@ -434,7 +467,16 @@ async def get_channel_permissions(channel_id: str, current_user_or_exception: Un
     return permissions
 
 
-async def get_channel_members(channel_id: str):
+async def get_user_channels_permissions(channel_ids: List[str], current_user: User) -> Dict[str, List[str]]:
+    channel_ids = list(dict.fromkeys([channel_id for channel_id in channel_ids if ObjectId.is_valid(channel_id)]))
+
+    user_whitelisted = await is_user_whitelisted(current_user)
+    return await fetch_user_channels_permissions(
+        channel_ids=channel_ids, user_id=str(current_user.pk), user_whitelisted=user_whitelisted
+    )
+
+
+async def get_channel_members(channel_id: str, after: Optional[str] = None, limit: Optional[int] = None):
     channel = await get_item_by_id(id_=channel_id, result_obj=Channel)
     if channel.deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
@@ -442,11 +484,16 @@ async def get_channel_members(channel_id: str):
     if channel.kind not in ["topic", "dm"]:
         raise Exception(f"cannot get members of channel type: {channel.kind}")
 
-    return await get_items(filters={"_id": {"$in": [user.pk for user in channel.members]}}, result_obj=User, limit=None)
+    # members are sorted by user id, the last id of a page is the cursor for the next one
+    after_id = await parse_object_id(after) if after else None
+    member_ids = await get_channel_member_ids(channel, after=after_id, limit=limit)
+    users = await get_items(filters={"_id": {"$in": member_ids}}, result_obj=User, limit=None)
+    return sorted(users, key=lambda user: user.pk)
 
 
 async def get_user_channels(current_user: User):
-    return await get_items(filters={"members": current_user.pk}, result_obj=Channel, limit=None)
+    filters = await get_member_channels_filter([current_user.pk])
+    return await get_items(filters=filters, result_obj=Channel, limit=None)
 
 
 async def get_user_member_channels(account_address: str, current_user: Optional[User] = None):
@@ -458,20 +505,19 @@ async def get_user_member_channels(account_address: str, current_user: Optional[
     }
     public_channels_matcher = {
         "deleted": False,
-        "members": {"$all": [target_user.pk]},
+        **await get_member_channels_filter([target_user.pk]),
         "permission_overwrites": {"$elemMatch": public_permission_overwrite_matcher},
     }
 
     if not current_user:
         matcher = public_channels_matcher
     else:
-        matcher = {
-            "$or": [public_channels_matcher, {"deleted": False, "members": {"$all": [target_user.pk, current_user.pk]}}]
-        }
+        shared_channels_filter = await get_member_channels_filter([target_user.pk, current_user.pk])
+        matcher = {"$or": [public_channels_matcher, {"deleted": False, **shared_channels_filter}]}
 
     pipeline_stages = [
         {"$match": matcher},
-        {"$sort": {"members": -1}},
+        {"$sort": {"member_count": -1}},
         {"$limit": 20},
     ]
 
@@ -482,48 +528,47 @@ async def get_user_member_channels(account_address: str, current_user: Optional[
     return channels
 
 
-async def get_public_channels(tags: Optional[str] = None, **common_params):
+async def _build_public_channels_payload(tag_list: Optional[List[str]], limit: int) -> str:
     filters: Dict[Any, Any] = {
         "deleted": False,
         "kind": "topic",
         "permission_overwrites": {
             "$elemMatch": {
                 "group": "@public",
-                "permissions": {"$all": ["messages.list", "channels.view"]},
+                "permissions": {"$all": DISCOVERY_PUBLIC_PERMISSIONS},
             }
         },
     }
 
-    cache_key = "discovery:channels:@public"
-
-    if tags:
-        cache_key += f":{tags}"
-        tag_list = tags.split(",")
+    if tag_list:
         filters["tags"] = {"$all": tag_list}
 
-    cached_channel_ids = await cache.client.get(cache_key)
+    channel_docs = await Channel.collection.aggregate(
+        [
+            {"$match": filters},
+            {"$sort": {"member_count": -1}},
+            {"$limit": limit},
+        ]
+    ).to_list(length=None)
+
+    channels = [EitherChannel.parse_obj(Channel.build_from_mongo(channel)) for channel in channel_docs]
+    return ORJSONResponse(content=jsonable_encoder(channels)).body.decode()
 
-    if cached_channel_ids:
-        channel_ids = json.loads(cached_channel_ids)
-        channel_pks = [ObjectId(channel_id) for channel_id in channel_ids]
-        channels = await get_items(filters={"_id": {"$in": channel_pks}}, result_obj=Channel, limit=None)
-    else:
-        channel_docs = await Channel.collection.aggregate(
-            [
-                {"$match": filters},
-                {"$sort": {"members": -1}},
-                {"$limit": common_params.get("limit", 20)},
-            ]
-        ).to_list(length=None)
-        channels = [Channel.build_from_mongo(channel) for channel in channel_docs]
-        channel_ids = [str(channel.pk) for channel in channels]
-        await cache.client.set(cache_key, json.dumps(channel_ids), ex=60)
 
-    return channels
+async def get_public_channels(tags: Optional[str] = None, **common_params) -> str:
+    """Serialized list of discoverable channels, served from cache and refreshed in the background."""
+    tag_list = tags.split(",") if tags else None
+    limit = common_params.get("limit", 20)
+
+    return await get_cached_discovery_payload(
+        cache_key=get_discovery_cache_key(tag_list, limit),
+        build_payload=lambda: _build_public_channels_payload(tag_list, limit),
+    )
 
 
 async def remove_user_channel_membership(user: User):
-    user_channels = await get_items(filters={"members": user.pk}, result_obj=Channel, limit=None)
+    filters = await get_member_channels_filter([user.pk])
+    user_channels = await get_items(filters=filters, result_obj=Channel, limit=None)
     for channel in user_channels:
         try:
             await kick_member_from_channel(channel_id=str(channel.pk), member_id=str(user.pk), current_user=user)
@@ -570,9 +615,9 @@ async def get_channels(
         if current_user not in model_users:
             model_users.insert(0, current_user)
 
-        filters["members"] = {"$all": [m.pk for m in model_users]}
+        filters.update(await get_member_channels_filter([m.pk for m in model_users]))
     else:
-        filters["members"] = current_user.pk
+        filters.update(await get_member_channels_filter([current_user.pk]))
 
     if tags:
         tag_list = tags.split(",")
@@ -132,7 +132,9 @@ async def update_item(item: APIDocumentType, data: dict) -> APIDocumentType:
     return item
 
 
-async def find_and_update_item(filters: dict, data: dict, result_obj: Type[APIDocumentType]) -> APIDocumentType:
+async def find_and_update_item(
+    filters: dict, data: Union[dict, List[dict]], result_obj: Type[APIDocumentType]
+) -> APIDocumentType:
     updated_item = await result_obj.collection.find_one_and_update(
         filter=filters, update=data, return_document=ReturnDocument.AFTER
     )
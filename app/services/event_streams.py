@@ -0,0 +1,164 @@
+import json
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette import status
+
+from app.helpers.cache_utils import cache
+from app.helpers.channels import get_channel_member_ids
+from app.helpers.events import EventType, fetch_event_channel_scope
+from app.helpers.queue_utils import timed_task
+from app.models.user import User
+from app.services.websockets import fetch_event_channel
+
+logger = logging.getLogger(__name__)
+
+EVENT_STREAM_MAX_LENGTH = 500
+EVENT_STREAM_TTL_SECONDS = 60 * 60 * 24
+EVENT_STREAM_ID_REGEX = re.compile(r"^\d+-\d+$")
+
+RESUMABLE_EVENTS = [
+    EventType.MESSAGE_CREATE,
+    EventType.MESSAGE_UPDATE,
+    EventType.MESSAGE_REMOVE,
+    EventType.MESSAGE_REACTION_ADD,
+    EventType.MESSAGE_REACTION_REMOVE,
+    EventType.CHANNEL_READ,
+    EventType.CHANNEL_UPDATE,
+    EventType.CHANNEL_USER_INVITED,
+    EventType.CHANNEL_USER_JOINED,
+    EventType.CHANNEL_DELETED,
+    EventType.CHANNEL_CREATED,
+]
+
+
+def _get_event_stream_key(user_id: str) -> str:
+    return f"events:{user_id}"
+
+
+def _get_channel_event_stream_key(channel_id: str) -> str:
+    return f"events:channel:{channel_id}"
+
+
+def _parse_stream_id(stream_id: str) -> Tuple[int, int]:
+    timestamp, sequence = stream_id.split("-")
+    return int(timestamp), int(sequence)
+
+
+async def _append_channel_event(event: EventType, data: dict, payload: str) -> Tuple[List[str], Dict[str, str]]:
+    channel = await fetch_event_channel(event, data)
+    member_ids = await get_channel_member_ids(channel)
+    if not member_ids:
+        return [], {}
+
+    # the payload is stored once per channel, member streams only get a reference to it
+    channel_id = str(channel.pk)
+    channel_stream_key = _get_channel_event_stream_key(channel_id)
+    async with cache.client.pipeline(transaction=False) as pipe:
+        pipe.xadd(channel_stream_key, {"payload": payload}, maxlen=EVENT_STREAM_MAX_LENGTH, approximate=True)
+        pipe.expire(channel_stream_key, EVENT_STREAM_TTL_SECONDS)
+        entry_id, _ = await pipe.execute()
+
+    return [str(member_id) for member_id in member_ids], {"channel": channel_id, "ref": entry_id}
+
+
+@timed_task()
+async def append_event_to_streams(event: EventType, data: dict):
+    if event not in RESUMABLE_EVENTS:
+        return
+
+    payload = json.dumps({"event": event.value, "data": data})
+
+    scope = await fetch_event_channel_scope(event)
+    if scope == "channel":
+        user_ids, entry_fields = await _append_channel_event(event, data, payload)
+    elif scope == "user":
+        user_dict = data.get("user")
+        if not user_dict:
+            raise Exception("expected 'user' in event data: %s. [event=%s]", data, event.name)
+        user_ids, entry_fields = [user_dict.get("id")], {"payload": payload}
+    else:
+        return
+
+    if not user_ids:
+        return
+
+    async with cache.client.pipeline(transaction=False) as pipe:
+        for user_id in set(user_ids):
+            stream_key = _get_event_stream_key(user_id)
+            pipe.xadd(stream_key, entry_fields, maxlen=EVENT_STREAM_MAX_LENGTH, approximate=True)
+            pipe.expire(stream_key, EVENT_STREAM_TTL_SECONDS)
+        await pipe.execute()
+
+    logger.debug("event appended to %d streams. [event=%s]", len(user_ids), event.name)
+
+
+async def _resolve_event_payloads(entries: List[Tuple[str, Dict[str, str]]]) -> Optional[List[str]]:
+    """Payloads of the given user stream entries, None if a referenced channel event isn't kept anymore."""
+    async with cache.client.pipeline(transaction=False) as pipe:
+        for _, fields in entries:
+            if "ref" in fields:
+                pipe.xrange(_get_channel_event_stream_key(fields["channel"]), min=fields["ref"], max=fields["ref"])
+        channel_entries = iter(await pipe.execute())
+
+    payloads = []
+    for _, fields in entries:
+        if "ref" not in fields:
+            payloads.append(fields["payload"])
+            continue
+
+        channel_entry = next(channel_entries)
+        if not channel_entry:
+            return None
+        payloads.append(channel_entry[0][1]["payload"])
+
+    return payloads
+
+
+async def get_user_events(current_user: User, since: Optional[str] = None, limit: int = 100) -> dict:
+    stream_key = _get_event_stream_key(str(current_user.pk))
+
+    if not since:
+        latest_entries = await cache.client.xrevrange(stream_key, count=1)
+        if latest_entries:
+            seq = latest_entries[0][0]
+        else:
+            # create an empty stream so that later events can be replayed from this position
+            seq = await cache.client.xadd(stream_key, {"payload": ""})
+            await cache.client.xdel(stream_key, seq)
+            await cache.client.expire(stream_key, EVENT_STREAM_TTL_SECONDS)
+
+        return {"seq": seq, "events": [], "resync": False, "has_more": False}
+
+    if not EVENT_STREAM_ID_REGEX.match(since):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="invalid 'since' value")
+
+    async with cache.client.pipeline(transaction=False) as pipe:
+        pipe.exists(stream_key)
+        pipe.xlen(stream_key)
+        pipe.xrange(stream_key, count=1)
+        pipe.xrange(stream_key, min=f"({since}", count=limit + 1)
+        stream_exists, stream_length, oldest_entries, entries = await pipe.execute()
+
+    # streams are only trimmed once they reach their max length, so events after `since` can only be
+    # missing if the whole stream expired or the oldest entry kept is already past the client's position
+    if not stream_exists:
+        return {"seq": since, "events": [], "resync": True, "has_more": False}
+
+    if stream_length >= EVENT_STREAM_MAX_LENGTH and oldest_entries:
+        if _parse_stream_id(oldest_entries[0][0]) > _parse_stream_id(since):
+            return {"seq": since, "events": [], "resync": True, "has_more": False}
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    payloads = await _resolve_event_payloads(entries)
+    if payloads is None:
+        return {"seq": since, "events": [], "resync": True, "has_more": False}
+
+    events = [{"seq": entry_id, **json.loads(payload)} for (entry_id, _), payload in zip(entries, payloads)]
+    seq = events[-1]["seq"] if events else since
+
+    return {"seq": seq, "events": events, "resync": False, "has_more": has_more}
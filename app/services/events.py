@@ -1,15 +1,52 @@
+import asyncio
 import logging
+from typing import Any, Awaitable, Callable, Dict, NamedTuple
+
+from sentry_sdk import capture_exception
 
 from app.helpers.events import EventType
+from app.services.event_streams import append_event_to_streams
 from app.services.push_notifications import dispatch_push_notification_event
 from app.services.websockets import broadcast_websocket_message
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SINK_TIMEOUT_SECONDS = 30
+
+EventSinkFunc = Callable[[EventType, dict], Awaitable[Any]]
+
+
+class EventSink(NamedTuple):
+    name: str
+    func: EventSinkFunc
+    timeout: float
+
+
+_event_sinks: Dict[str, EventSink] = {}
+
+
+def register_event_sink(name: str, func: EventSinkFunc, timeout: float = DEFAULT_SINK_TIMEOUT_SECONDS):
+    _event_sinks[name] = EventSink(name=name, func=func, timeout=timeout)
+
+
+async def _dispatch_to_sink(sink: EventSink, event: EventType, data: dict):
+    try:
+        await asyncio.wait_for(sink.func(event, data), timeout=sink.timeout)
+    except asyncio.TimeoutError as e:
+        logger.warning("event sink timed out. [sink=%s, event=%s, timeout=%s]", sink.name, event.name, sink.timeout)
+        capture_exception(e)
+    except Exception as e:
+        logger.exception("problem dispatching event to sink. [sink=%s, event=%s]", sink.name, event.name)
+        capture_exception(e)
+
 
 async def broadcast_event(event: EventType, data: dict):
     logger.info(f"broadcasting new event: {event}")
 
-    # future event pipeline dispatching will be here
-    await broadcast_websocket_message(event, data)
-    await dispatch_push_notification_event(event, data)
+    sinks = list(_event_sinks.values())
+    await asyncio.gather(*[_dispatch_to_sink(sink, event, data) for sink in sinks])
+
+
+register_event_sink("event_stream", append_event_to_streams, timeout=10)
+register_event_sink("websockets", broadcast_websocket_message)
+register_event_sink("push_notifications", dispatch_push_notification_event, timeout=60)
@@ -1,6 +1,16 @@
+import asyncio
+import json
 import logging
-from typing import List
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
 
+from bson import ObjectId
+from sentry_sdk import capture_exception
+
+from app.config import get_settings
+from app.helpers.cache_utils import cache
+from app.helpers.channels import get_channel_member_ids
 from app.helpers.events import EventType
 from app.helpers.expo import send_expo_push_notifications
 from app.helpers.list_utils import batch_list
@@ -9,10 +19,15 @@ from app.helpers.queue_utils import timed_task
 from app.models.channel import Channel, ChannelReadState
 from app.models.message import Message
 from app.models.user import User, UserBlock, UserPreferences
-from app.services.crud import get_item, get_item_by_id, get_items
+from app.services.crud import get_item_by_id, get_items
 
 logger = logging.getLogger(__name__)
 
+PUSH_COALESCE_DUE_KEY = "push:coalesce:due"
+PUSH_COALESCE_FLUSH_INTERVAL_SECONDS = 5
+PUSH_COALESCE_FLUSH_BATCH_SIZE = 500
+PUSH_COALESCE_KEY_MARGIN_SECONDS = 60 * 60
+
 
 async def parse_push_notification_data(event_data: dict, message: Message, channel: Channel):
     data = {}
@@ -48,22 +63,24 @@ async def parse_push_notification_data(event_data: dict, message: Message, chann
     return data
 
 
-async def should_send_push_notification(
-    user: User, channel: Channel, mentioned_users: List[User], message: Message
+def should_send_push_notification(
+    user: User,
+    channel: Channel,
+    message: Message,
+    mentioned_user_ids: Set[ObjectId],
+    blocked_author: bool = False,
+    user_prefs: Optional[UserPreferences] = None,
 ) -> bool:
-    if message.author == user:
+    if message.author and message.author.pk == user.pk:
         return False
 
-    blocks = await get_items(filters={"author": user.pk}, result_obj=UserBlock, limit=None)
-    blocked_users = [block.user for block in blocks]
-    if message.author in blocked_users:
+    if blocked_author:
         return False
 
     if message.type in [1, 5]:
         # ignore system messages like changing channel name or topic; or new members
         return False
 
-    user_prefs = await get_item(filters={"user": user}, result_obj=UserPreferences)
     if user_prefs:
         channels = user_prefs.channels
         channel_prefs = channels.get(str(channel.pk), {})
@@ -73,11 +90,219 @@ async def should_send_push_notification(
             return False
 
         if mentions:
-            return user in mentioned_users
+            return user.pk in mentioned_user_ids
 
     return True
 
 
+def build_push_messages(
+    users: List[User],
+    channel: Channel,
+    message: Message,
+    notification_data: dict,
+    mentioned_user_ids: Set[ObjectId],
+    blocking_user_ids: Set[ObjectId],
+    prefs_per_user_id: Dict[ObjectId, UserPreferences],
+    read_states_per_user_id: Dict[ObjectId, ChannelReadState],
+    used_push_tokens: Set[str],
+) -> Dict[ObjectId, dict]:
+    push_messages = {}
+
+    for user in users:
+        should_send_push = should_send_push_notification(
+            user=user,
+            channel=channel,
+            message=message,
+            mentioned_user_ids=mentioned_user_ids,
+            blocked_author=user.pk in blocking_user_ids,
+            user_prefs=prefs_per_user_id.get(user.pk),
+        )
+        if not should_send_push:
+            continue
+
+        user_read_state = read_states_per_user_id.get(user.pk, None)
+        mention_count = user_read_state.mention_count if user_read_state else 1
+
+        push_tokens = list(filter(lambda i: i not in used_push_tokens, user.push_tokens or []))
+        if len(push_tokens) == 0:
+            continue
+
+        push_message = {**notification_data, "to": push_tokens, "badge": mention_count}
+        if user.status != "online":
+            push_message["sound"] = "default"
+
+        push_messages[user.pk] = push_message
+        used_push_tokens.update(push_tokens)
+
+    return push_messages
+
+
+async def fetch_push_notification_batch_data(batch_user_ids: List[ObjectId], channel: Channel, message: Message):
+    users = await get_items(filters={"_id": {"$in": batch_user_ids}}, result_obj=User, limit=None)
+    read_states = await get_items(
+        filters={"user": {"$in": batch_user_ids}, "channel": channel.pk}, result_obj=ChannelReadState, limit=None
+    )
+    user_prefs = await get_items(filters={"user": {"$in": batch_user_ids}}, result_obj=UserPreferences, limit=None)
+
+    blocks = []
+    if message.author:
+        blocks = await get_items(
+            filters={"author": {"$in": batch_user_ids}, "user": message.author.pk}, result_obj=UserBlock, limit=None
+        )
+
+    return {
+        "users": users,
+        "read_states_per_user_id": {read_state.user.pk: read_state for read_state in read_states},
+        "prefs_per_user_id": {prefs.user.pk: prefs for prefs in user_prefs},
+        "blocking_user_ids": {block.author.pk for block in blocks},
+    }
+
+
+def _get_push_coalesce_key(user_id: str, channel_id: str) -> str:
+    return f"push:coalesce:{user_id}:{channel_id}"
+
+
+def build_coalesced_push_message(latest_push_message: dict, message_count: int, channel_name: Optional[str]) -> dict:
+    body = f"{message_count} new message{'s' if message_count > 1 else ''}"
+    if channel_name:
+        body += f" in #{channel_name}"
+
+    return {**latest_push_message, "body": body}
+
+
+async def coalesce_push_messages(
+    channel: Channel, push_messages: Dict[ObjectId, dict], mentioned_user_ids: Set[ObjectId], window_seconds: int
+) -> List[dict]:
+    # mentions are always delivered right away
+    messages_to_send = [message for user_id, message in push_messages.items() if user_id in mentioned_user_ids]
+    coalescing_user_ids = [user_id for user_id in push_messages.keys() if user_id not in mentioned_user_ids]
+    if not coalescing_user_ids:
+        return messages_to_send
+
+    channel_id = str(channel.pk)
+    async with cache.client.pipeline(transaction=False) as pipe:
+        for user_id in coalescing_user_ids:
+            coalesce_key = _get_push_coalesce_key(str(user_id), channel_id)
+            pipe.hincrby(coalesce_key, "count", 1)
+            pipe.hset(
+                coalesce_key,
+                mapping={"message": json.dumps(push_messages[user_id]), "channel_name": channel.name or ""},
+            )
+            # safety net in case no worker flushes the window for a long while
+            pipe.expire(coalesce_key, window_seconds + PUSH_COALESCE_KEY_MARGIN_SECONDS)
+        results = await pipe.execute()
+
+    window_members = {}
+    flush_at = time.time() + window_seconds
+    for index, user_id in enumerate(coalescing_user_ids):
+        message_count = results[index * 3]
+        if message_count == 1:
+            # first message of the window is sent, following ones are collapsed when the window closes
+            messages_to_send.append(push_messages[user_id])
+            window_members[f"{channel_id}:{str(user_id)}"] = flush_at
+
+    if window_members:
+        # pending windows live in redis, so any worker can flush them, even after a restart
+        await cache.client.zadd(PUSH_COALESCE_DUE_KEY, window_members)
+
+    return messages_to_send
+
+
+async def flush_coalesced_push_notifications(channel_id: str, user_ids: List[str]):
+    async with cache.client.pipeline(transaction=True) as pipe:
+        for user_id in user_ids:
+            coalesce_key = _get_push_coalesce_key(user_id, channel_id)
+            pipe.hgetall(coalesce_key)
+            pipe.delete(coalesce_key)
+        results = await pipe.execute()
+
+    push_messages = []
+    for coalesced in results[::2]:
+        suppressed_count = int(coalesced.get("count", 0)) - 1
+        if suppressed_count < 1 or "message" not in coalesced:
+            continue
+
+        latest_push_message = json.loads(coalesced["message"])
+        channel_name = coalesced.get("channel_name") or None
+        push_messages.append(build_coalesced_push_message(latest_push_message, suppressed_count, channel_name))
+
+    await send_expo_push_notifications(push_messages=push_messages)
+
+
+async def flush_due_push_notifications(until: Optional[float] = None) -> int:
+    until = until or time.time()
+    flushed_windows = 0
+
+    while True:
+        due_members = await cache.client.zrangebyscore(
+            PUSH_COALESCE_DUE_KEY, 0, until, start=0, num=PUSH_COALESCE_FLUSH_BATCH_SIZE
+        )
+        if not due_members:
+            break
+
+        # a window is flushed by whichever worker manages to remove it from the due set
+        async with cache.client.pipeline(transaction=False) as pipe:
+            for member in due_members:
+                pipe.zrem(PUSH_COALESCE_DUE_KEY, member)
+            removed = await pipe.execute()
+
+        user_ids_per_channel: Dict[str, List[str]] = defaultdict(list)
+        for member, was_removed in zip(due_members, removed):
+            if was_removed:
+                channel_id, user_id = member.split(":")
+                user_ids_per_channel[channel_id].append(user_id)
+
+        for channel_id, user_ids in user_ids_per_channel.items():
+            await flush_coalesced_push_notifications(channel_id=channel_id, user_ids=user_ids)
+            flushed_windows += len(user_ids)
+
+    return flushed_windows
+
+
+class PushCoalesceJob:
+    task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def _run(cls):
+        while True:
+            await asyncio.sleep(PUSH_COALESCE_FLUSH_INTERVAL_SECONDS)
+            try:
+                await flush_due_push_notifications()
+            except Exception as e:
+                logger.exception("problem flushing coalesced push notifications")
+                capture_exception(e)
+
+    @classmethod
+    def start(cls):
+        if get_settings().push_coalesce_window_seconds <= 0 or cls.task is not None:
+            return
+
+        cls.task = asyncio.create_task(cls._run(), name="PushCoalesceJob")
+
+    @classmethod
+    async def stop(cls):
+        if cls.task is None:
+            return
+
+        cls.task.cancel()
+        try:
+            await cls.task
+        except asyncio.CancelledError:
+            pass
+        cls.task = None
+
+        # windows that are already due don't wait for another worker
+        await flush_due_push_notifications()
+
+
+async def push_coalesce_job_start() -> None:
+    PushCoalesceJob.start()
+
+
+async def push_coalesce_job_shutdown() -> None:
+    await PushCoalesceJob.stop()
+
+
 @timed_task()
 async def dispatch_push_notification_event(event: EventType, data: dict):
     if event != EventType.MESSAGE_CREATE:
@@ -89,7 +314,8 @@ async def dispatch_push_notification_event(event: EventType, data: dict):
     if not channel:
         raise Exception("expected a channel")
 
-    if not channel.members:
+    channel_user_ids = await get_channel_member_ids(channel)
+    if not channel_user_ids:
         return
 
     message_push_data = await parse_push_notification_data(event_data=data, message=message, channel=channel)
@@ -98,40 +324,31 @@ async def dispatch_push_notification_event(event: EventType, data: dict):
         **message_push_data,
     }
 
-    channel_user_ids = [member.pk for member in channel.members]
     mentioned_users = await get_message_mentioned_users(message=message)
+    mentioned_user_ids = {mentioned_user.pk for mentioned_user in mentioned_users}
 
-    push_messages = []
-    used_push_tokens = set()
+    push_messages: Dict[ObjectId, dict] = {}
+    used_push_tokens: Set[str] = set()
 
     async for batch_user_ids in batch_list(channel_user_ids):
-        users = await get_items(filters={"_id": {"$in": batch_user_ids}}, result_obj=User, limit=None)
-        read_states = await get_items(
-            filters={"user": {"$in": batch_user_ids}, "channel": channel.pk}, result_obj=ChannelReadState, limit=None
-        )
-        read_states_per_user_id = {read_state.user.pk: read_state for read_state in read_states}
-
-        user: User
-        for user in users:
-            should_send_push = await should_send_push_notification(
-                user=user, channel=channel, mentioned_users=mentioned_users, message=message
+        batch_data = await fetch_push_notification_batch_data(batch_user_ids, channel=channel, message=message)
+        push_messages.update(
+            build_push_messages(
+                channel=channel,
+                message=message,
+                notification_data=notification_data,
+                mentioned_user_ids=mentioned_user_ids,
+                used_push_tokens=used_push_tokens,
+                **batch_data,
             )
-            if not should_send_push:
-                continue
-
-            user_read_state = read_states_per_user_id.get(user.pk, None)
-            mention_count = user_read_state.mention_count if user_read_state else 1
-
-            push_tokens = list(filter(lambda i: i not in used_push_tokens, user.push_tokens or []))
-            if len(push_tokens) == 0:
-                continue
-
-            push_message = {**notification_data, "to": push_tokens, "badge": mention_count}
-            if user.status != "online":
-                push_message["sound"] = "default"
+        )
 
-            push_messages.append(push_message)
-            used_push_tokens.update(push_tokens)
+    coalesce_window_seconds = get_settings().push_coalesce_window_seconds
+    if coalesce_window_seconds > 0:
+        messages_to_send = await coalesce_push_messages(
+            channel, push_messages, mentioned_user_ids=mentioned_user_ids, window_seconds=coalesce_window_seconds
+        )
+    else:
+        messages_to_send = list(push_messages.values())
 
-    async for batched_messages in batch_list(push_messages):
-        await send_expo_push_notifications(push_messages=batched_messages)
+    await send_expo_push_notifications(push_messages=messages_to_send)
@@ -1,6 +1,9 @@
 from bson import ObjectId
 
+from app.constants.permissions import permissions_to_mask
 from app.helpers.cache_utils import cache
+from app.helpers.permissions import bump_permissions_version
+from app.helpers.servers import clear_cached_channel_servers
 from app.models.user import Role, User
 from app.schemas.users import RoleCreateSchema
 from app.services.crud import create_item, get_items
@@ -16,5 +19,7 @@ async def create_role(server_id: str, role_model: RoleCreateSchema, current_user
     if not internal and role_name.strip().startswith("@"):
         raise Exception("Roles starting with '@' are protected.")
     role = await create_item(role_model, result_obj=Role, current_user=current_user, user_field=None)
-    await cache.client.hset(f"server:{server_id}", f"roles.{str(role.pk)}", ",".join(role.permissions))
+    await cache.client.hset(f"server:{server_id}", f"roles.{str(role.pk)}", permissions_to_mask(role.permissions))
+    await clear_cached_channel_servers(server_id)
+    await bump_permissions_version(server_id=server_id)
     return role
@@ -4,9 +4,11 @@ from bson import ObjectId
 from fastapi import HTTPException
 from starlette import status
 
-from app.helpers.cache_utils import cache
+from app.helpers.cache_utils import cache, get_channel_cache_key
 from app.helpers.events import EventType
+from app.helpers.permissions import bump_permissions_version
 from app.helpers.queue_utils import queue_bg_task
+from app.helpers.sections import clear_cached_channel_sections
 from app.models.section import Section
 from app.models.server import Server
 from app.models.user import User
@@ -51,6 +53,8 @@ async def update_section(section_id: str, update_data: SectionUpdateSchema, curr
 
     data = update_data.dict(exclude_unset=True)
     updated_section = await update_item(section, data=data)
+    await clear_cached_channel_sections([str(channel.pk) for channel in updated_section.channels or []])
+    await bump_permissions_version(server_id=str(server.pk))
 
     await queue_bg_task(
         broadcast_server_event,
@@ -92,17 +96,21 @@ async def update_server_sections(server_id: str, sections: List[SectionServerUpd
         updated_section = await update_item(section, data=update_data)
 
         for channel_id in filter(lambda elem: elem not in section_latest_channels, section_prev_channels):
-            old_section_id = await cache.client.hget(f"channel:{channel_id}", "section")
+            old_section_id = await cache.client.hget(get_channel_cache_key(channel_id), "section")
             if old_section_id != section_id:
                 continue
 
-            await cache.client.hset(f"channel:{channel_id}", "section", "")
+            await cache.client.hset(get_channel_cache_key(channel_id), "section", "")
+            await clear_cached_channel_sections([channel_id])
 
         for channel_id in filter(lambda elem: elem not in section_prev_channels, section_latest_channels):
-            await cache.client.hset(f"channel:{channel_id}", "section", section_id)
+            await cache.client.hset(get_channel_cache_key(channel_id), "section", section_id)
+            await clear_cached_channel_sections([channel_id])
 
         final_sections.append(updated_section)
 
+    await bump_permissions_version(server_id=server_id)
+
     await queue_bg_task(
         broadcast_server_event,
         server_id,
@@ -121,7 +129,9 @@ async def delete_section(section_id: str, current_user: User):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User has no permissions to delete section")
 
     for channel in section.channels:
-        await cache.client.hset(f"channel:{str(channel.pk)}", "section", "")
+        await cache.client.hset(get_channel_cache_key(str(channel.pk)), "section", "")
+    await clear_cached_channel_sections([str(channel.pk) for channel in section.channels])
+    await bump_permissions_version(server_id=str(server.pk))
 
     await queue_bg_task(
         broadcast_server_event,
@@ -8,7 +8,7 @@ from app.constants.permissions import DEFAULT_ROLE_PERMISSIONS
 from app.helpers.cache_utils import cache
 from app.helpers.events import EventType
 from app.helpers.guild_xyz import is_user_eligible_for_guild
-from app.helpers.permissions import user_belongs_to_server
+from app.helpers.permissions import bump_permissions_version, user_belongs_to_server
 from app.helpers.queue_utils import queue_bg_task
 from app.models.base import APIDocument
 from app.models.channel import Channel
@@ -99,6 +99,7 @@ async def join_server(server_id: str, current_user: User, ignore_joining_rules:
 
     member = ServerMember(server=server, user=current_user, roles=default_roles)
     await member.commit()
+    await bump_permissions_version(server_id=server_id)
 
     await queue_bg_task(
         broadcast_server_event,
@@ -7,6 +7,7 @@ from fastapi import HTTPException
 
 from app.helpers.events import EventType
 from app.helpers.pfp import extract_contract_and_token_from_string, upload_pfp_url_and_update_profile
+from app.helpers.principals import clear_cached_users
 from app.helpers.queue_utils import queue_bg_task, queue_bg_tasks
 from app.helpers.w3 import checksum_address, get_nft, get_nft_image_url, is_account_address, verify_token_ownership
 from app.models.base import APIDocument
@@ -138,6 +139,8 @@ async def update_user_profile(
             data["pfp"] = None
 
     updated_item = await update_item(item=profile, data=data)
+    if not server_id:
+        await clear_cached_users([current_user.pk])
 
     if data:
         if server_id:
@@ -265,6 +268,7 @@ async def delete_user(current_user: User):
             "signers": [],
         },
     )
+    await clear_cached_users([current_user.pk])
 
     logger.info("Deleted user %s. Queueing other data for deletion", current_user.pk)
 
@@ -1,14 +1,20 @@
+import asyncio
 import json
 import logging
-from typing import Optional, Union
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Type, Union
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from sentry_sdk import capture_exception
 
 from app.helpers.events import EventType
+from app.helpers.principals import clear_cached_apps, clear_cached_users
 from app.helpers.queue_utils import queue_bg_task
 from app.models.app import App
 from app.models.user import User
 from app.schemas.ws_events import CreateMarkChannelReadEvent
 from app.services.channels import update_channels_read_state
-from app.services.crud import get_item_by_id, update_item
 from app.services.events import broadcast_event
 from app.services.users import get_user_by_id
 
@@ -24,41 +30,118 @@ async def _get_user_from_event(event: dict) -> User:
     return user
 
 
-async def _get_actor_from_event(event: dict) -> Optional[Union[User, App]]:
-    channel_name = event["channel"]
-    actor_id = channel_name.split("-")[1]
-    user = await get_user_by_id(actor_id)
-    if user:
-        return user
+def _get_actor_id_from_channel_name(channel_name: str) -> str:
+    return channel_name.split("-")[1]
 
-    app = await get_item_by_id(id_=actor_id, result_obj=App)
-    if app:
-        return app
 
-    return None
+async def _get_actor_classes_by_ids(actor_ids: List[str]) -> Dict[ObjectId, Union[Type[User], Type[App]]]:
+    object_ids = [ObjectId(actor_id) for actor_id in set(actor_ids) if ObjectId.is_valid(actor_id)]
+    deleted_filter: Dict[str, Any] = {"$or": [{"deleted": {"$exists": False}}, {"deleted": False}]}
 
+    actor_class_options: List[Union[Type[User], Type[App]]] = [User, App]
+    actor_classes: Dict[ObjectId, Union[Type[User], Type[App]]] = {}
+    for actor_class in actor_class_options:
+        remaining_ids = [object_id for object_id in object_ids if object_id not in actor_classes]
+        if not remaining_ids:
+            break
 
-async def handle_pusher_event(event: dict):
-    event_name = event["name"]
-    if event_name == "client_event":
-        return await handle_pusher_client_event(event)
+        cursor = actor_class.collection.find({"_id": {"$in": remaining_ids}, **deleted_filter}, projection={"_id": 1})
+        async for doc in cursor:
+            actor_classes[doc["_id"]] = actor_class
 
-    channel_name = event["channel"]
-    actor = await _get_actor_from_event(event)
+    return actor_classes
 
-    if not actor:
-        logger.info(f"Missing actor from pusher event: {event} [channel_name={channel_name}]")
-        return
 
-    if event_name == "channel_occupied":
-        await process_channel_occupied_event(channel_name=channel_name, actor=actor)
-    elif event_name == "channel_vacated":
-        await process_channel_vacated_event(channel_name=channel_name, actor=actor)
-    else:
-        logger.error("unexpected pusher event: %s", event)
-        return
+async def handle_pusher_events(events: List[dict]):
+    presence_events = []
+    for event in events:
+        event_name = event["name"]
+        if event_name == "client_event":
+            try:
+                await handle_pusher_client_event(event)
+            except Exception as e:
+                logger.exception("problem handling pusher client event: %s", event)
+                capture_exception(e)
+        elif event_name in ["channel_occupied", "channel_vacated"]:
+            presence_events.append(event)
+        else:
+            logger.error("unexpected pusher event: %s", event)
+
+    if presence_events:
+        await process_channel_presence_events(presence_events)
+
+
+async def process_channel_presence_events(events: List[dict]):
+    # only the last event of each channel matters: {actor_id: {channel_name: occupied}}
+    actor_channel_states: Dict[str, Dict[str, bool]] = defaultdict(dict)
+    for event in events:
+        channel_name = event["channel"]
+        actor_id = _get_actor_id_from_channel_name(channel_name)
+        actor_channel_states[actor_id][channel_name] = event["name"] == "channel_occupied"
+
+    actor_classes = await _get_actor_classes_by_ids(list(actor_channel_states.keys()))
+
+    changes_per_class: Dict[Type[Union[User, App]], Dict[ObjectId, Dict[str, bool]]] = defaultdict(dict)
+    for actor_id, channel_states in actor_channel_states.items():
+        actor_pk = ObjectId(actor_id) if ObjectId.is_valid(actor_id) else None
+        actor_class = actor_classes.get(actor_pk)
+        if not actor_class:
+            logger.info("Missing actor from pusher events. [actor_id=%s, channels=%s]", actor_id, channel_states)
+            continue
+
+        changes_per_class[actor_class][actor_pk] = channel_states
+
+    for actor_class, actor_changes in changes_per_class.items():
+        await _apply_online_channels_changes(actor_class=actor_class, actor_changes=actor_changes)
+
+    logger.info("pusher events handled successfully. [events=%d, actors=%d]", len(events), len(actor_classes))
+
+
+async def _update_actor_status(actor_class: Type[Union[User, App]], actor_id: ObjectId) -> Optional[dict]:
+    # the returned document has the updated online channels but still the previous status
+    has_online_channels = {"$gt": [{"$size": {"$ifNull": ["$online_channels", []]}}, 0]}
+    return await actor_class.collection.find_one_and_update(
+        filter={"_id": actor_id},
+        update=[{"$set": {"status": {"$cond": [has_online_channels, "online", "offline"]}}}],
+        return_document=ReturnDocument.BEFORE,
+    )
 
-    logger.info("pusher event handled successfully. [event=%s, channel=%s]", event_name, channel_name)
+
+async def _apply_online_channels_changes(
+    actor_class: Type[Union[User, App]], actor_changes: Dict[ObjectId, Dict[str, bool]]
+):
+    operations = []
+    for actor_id, channel_states in actor_changes.items():
+        occupied = [channel_name for channel_name, is_occupied in channel_states.items() if is_occupied]
+        vacated = [channel_name for channel_name, is_occupied in channel_states.items() if not is_occupied]
+        if occupied:
+            operations.append(UpdateOne({"_id": actor_id}, {"$addToSet": {"online_channels": {"$each": occupied}}}))
+        if vacated:
+            operations.append(UpdateOne({"_id": actor_id}, {"$pull": {"online_channels": {"$in": vacated}}}))
+
+    if operations:
+        await actor_class.collection.bulk_write(operations, ordered=False)
+
+    previous_docs = await asyncio.gather(*[_update_actor_status(actor_class, actor_id) for actor_id in actor_changes])
+
+    for doc in previous_docs:
+        if not doc:
+            continue
+
+        new_status = "online" if doc.get("online_channels") else "offline"
+        if doc.get("status") == new_status:
+            continue
+
+        doc["status"] = new_status
+        if actor_class is User:
+            await clear_cached_users([doc["_id"]])
+            await queue_bg_task(
+                broadcast_event,
+                EventType.USER_PRESENCE_UPDATE,
+                {"status": new_status, "user": User.build_from_mongo(doc).dump()},
+            )
+        else:
+            await clear_cached_apps([doc["client_id"]])
 
 
 async def handle_pusher_client_event(event: dict):
@@ -80,28 +163,11 @@ async def handle_pusher_client_event(event: dict):
 
 
 async def process_channel_occupied_event(channel_name: str, actor: Union[User, App]):
-    update_data = {"$addToSet": {"online_channels": channel_name}, "$set": {"status": "online"}}
-    await actor.__class__.collection.update_one(filter={"_id": actor.pk}, update=update_data)
-    if isinstance(actor, User):
-        await queue_bg_task(
-            broadcast_event,
-            EventType.USER_PRESENCE_UPDATE,
-            {"status": "online", "user": actor.dump()},
-        )
+    await _apply_online_channels_changes(actor_class=actor.__class__, actor_changes={actor.pk: {channel_name: True}})
 
 
 async def process_channel_vacated_event(channel_name: str, actor: Union[User, App]):
-    update_data = {"$pull": {"online_channels": channel_name}}
-    await actor.__class__.collection.update_one(filter={"_id": actor.pk}, update=update_data)
-    await actor.reload()
-    if len(actor.online_channels) == 0:
-        await update_item(item=actor, data={"status": "offline"})
-        if isinstance(actor, User):
-            await queue_bg_task(
-                broadcast_event,
-                EventType.USER_PRESENCE_UPDATE,
-                {"status": "offline", "user": actor.dump()},
-            )
+    await _apply_online_channels_changes(actor_class=actor.__class__, actor_changes={actor.pk: {channel_name: False}})
 
 
 async def process_channel_mark_read_event(event_model: CreateMarkChannelReadEvent, current_user: User):
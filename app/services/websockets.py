@@ -1,26 +1,35 @@
+import json
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional
 
+from bson import ObjectId
+
+from app.config import get_settings
+from app.helpers.cache_utils import cache
+from app.helpers.channels import get_channel_member_ids
 from app.helpers.events import EventType, fetch_event_channel_scope
+from app.helpers.gateway import broadcast_gateway, is_gateway_channel
 from app.helpers.list_utils import batch_list
 from app.helpers.pusher import broadcast_pusher
 from app.helpers.queue_utils import timed_task
 from app.models.app import App, AppInstalled
-from app.models.channel import Channel
+from app.models.channel import Channel, ChannelMember
 from app.models.message import Message
 from app.models.user import User
 from app.services.crud import get_item_by_id, get_items
 
 logger = logging.getLogger(__name__)
 
+USER_CHANNELS_RECIPIENTS_CACHE_SECONDS = 30
+
 
 async def get_ws_online_channels(channel: Channel) -> List[str]:
     pusher_channels = []
 
-    if not channel.members:
+    all_user_ids = await get_channel_member_ids(channel)
+    if not all_user_ids:
         return []
 
-    all_user_ids = [member.pk for member in channel.members]
     async for batch_user_ids in batch_list(all_user_ids, chunk_size=100):
         users = await get_items(filters={"_id": {"$in": batch_user_ids}}, result_obj=User, limit=None)
         user: User
@@ -37,41 +46,92 @@ async def get_ws_online_channels(channel: Channel) -> List[str]:
     return pusher_channels
 
 
+async def _fetch_online_channels(collection, object_ids: List[ObjectId]) -> List[str]:
+    online_channels: List[str] = []
+    async for batch_ids in batch_list(object_ids, chunk_size=1000):
+        cursor = collection.find(
+            {"_id": {"$in": batch_ids}, "online_channels.0": {"$exists": True}}, projection={"online_channels": 1}
+        )
+        async for doc in cursor:
+            online_channels.extend(doc.get("online_channels", []))
+
+    return online_channels
+
+
+async def fetch_user_channels_recipients(user_id: str) -> Dict[str, List[str]]:
+    cache_key = f"ws:user_channels:{user_id}"
+    cached_recipients = await cache.client.get(cache_key)
+    if cached_recipients:
+        return json.loads(cached_recipients)
+
+    pipeline_stages = [
+        {"$match": {"members": ObjectId(user_id), "$or": [{"deleted": {"$exists": False}}, {"deleted": False}]}},
+        {"$project": {"members": 1}},
+        {"$unwind": "$members"},
+        {"$group": {"_id": None, "members": {"$addToSet": "$members"}, "channels": {"$addToSet": "$_id"}}},
+    ]
+    results = await Channel.collection.aggregate(pipeline_stages).to_list(length=None)
+
+    member_ids = set(results[0]["members"]) if results else set()
+    channel_ids = list(results[0]["channels"]) if results else []
+
+    external_channel_ids = await ChannelMember.collection.distinct("channel", {"user": ObjectId(user_id)})
+    if external_channel_ids:
+        member_ids.update(await ChannelMember.collection.distinct("user", {"channel": {"$in": external_channel_ids}}))
+        channel_ids.extend(external_channel_ids)
+
+    recipients: Dict[str, List[str]] = {"users": [], "apps": []}
+    if channel_ids:
+        recipients["users"] = [str(member_id) for member_id in member_ids]
+        app_ids = await AppInstalled.collection.distinct("app", {"channel": {"$in": channel_ids}})
+        recipients["apps"] = [str(app_id) for app_id in app_ids]
+
+    # presence and profile updates come in bursts, so keep the recipients around for a little while
+    await cache.client.set(cache_key, json.dumps(recipients), ex=USER_CHANNELS_RECIPIENTS_CACHE_SECONDS)
+
+    return recipients
+
+
 async def broadcast_server_event(
     server_id: str, current_user_id: str, event: EventType, custom_data: Optional[dict] = None
 ):
     raise NotImplementedError("servers not supported anymore")
 
 
-async def fetch_ws_channels_for_scope(scope: str, event: EventType, data: dict) -> List[str]:
-    if scope == "channel":
-        channel_dict = data.get("channel")
-        message_dict = data.get("message")
-        message_id = data.get("message_id", "")
-
-        if channel_dict:
-            if isinstance(channel_dict, dict):
-                channel_id = channel_dict.get("id")
-            else:
-                channel_id = channel_dict
-        elif message_dict:
-            if isinstance(message_dict, dict):
-                channel_id = message_dict.get("channel")
-            elif isinstance(message_dict, str):
-                message = await get_item_by_id(id_=message_dict, result_obj=Message)
-                channel_id = str(message.channel.pk)
-            else:
-                raise Exception("unexpected data", data)
-        elif message_id:
-            message = await get_item_by_id(id_=message_id, result_obj=Message)
+async def fetch_event_channel(event: EventType, data: dict) -> Channel:
+    channel_dict = data.get("channel")
+    message_dict = data.get("message")
+    message_id = data.get("message_id", "")
+
+    if channel_dict:
+        if isinstance(channel_dict, dict):
+            channel_id = channel_dict.get("id")
+        else:
+            channel_id = channel_dict
+    elif message_dict:
+        if isinstance(message_dict, dict):
+            channel_id = message_dict.get("channel")
+        elif isinstance(message_dict, str):
+            message = await get_item_by_id(id_=message_dict, result_obj=Message)
             channel_id = str(message.channel.pk)
         else:
-            raise Exception(f"expected 'channel' or 'message' in event {event}: {data}")
+            raise Exception("unexpected data", data)
+    elif message_id:
+        message = await get_item_by_id(id_=message_id, result_obj=Message)
+        channel_id = str(message.channel.pk)
+    else:
+        raise Exception(f"expected 'channel' or 'message' in event {event}: {data}")
+
+    channel = await get_item_by_id(id_=channel_id, result_obj=Channel)
+    if not channel:
+        raise Exception(f"channel not found: {channel_id}")
+
+    return channel
 
-        channel = await get_item_by_id(id_=channel_id, result_obj=Channel)
-        if not channel:
-            raise Exception(f"channel not found: {channel_id}")
 
+async def fetch_ws_channels_for_scope(scope: str, event: EventType, data: dict) -> List[str]:
+    if scope == "channel":
+        channel = await fetch_event_channel(event, data)
         websocket_channels = await get_ws_online_channels(channel)
     elif scope == "user":
         user_dict = data.get("user")
@@ -83,17 +143,16 @@ async def fetch_ws_channels_for_scope(scope: str, event: EventType, data: dict)
 
         websocket_channels = user.online_channels
     elif scope == "user_channels":
-        websocket_channels = []
         user_dict = data.get("user")
         if not user_dict:
             raise Exception("expected 'user' in event data: %s. [event=%s]", data, event.name)
 
-        user_id = user_dict.get("id")
-        user = await get_item_by_id(id_=user_id, result_obj=User)
+        recipients = await fetch_user_channels_recipients(user_dict.get("id"))
+        user_ids = [ObjectId(user_id) for user_id in recipients["users"]]
+        app_ids = [ObjectId(app_id) for app_id in recipients["apps"]]
 
-        channels = await get_items(filters={"members": user.pk}, result_obj=Channel, limit=None)
-        for channel in channels:
-            websocket_channels.extend(await get_ws_online_channels(channel))
+        websocket_channels = await _fetch_online_channels(User.collection, user_ids)
+        websocket_channels.extend(await _fetch_online_channels(App.collection, app_ids))
     else:
         raise Exception("unexpected scope: %s", scope)
 
@@ -111,4 +170,13 @@ async def broadcast_websocket_message(event: EventType, data: dict):
     websocket_channels = await fetch_ws_channels_for_scope(event_scope, event, data)
     logger.debug("# online websocket channels: %d. [event=%s]", len(websocket_channels), event.name)
 
-    await broadcast_pusher(event, data=data, pusher_channels=websocket_channels)
+    settings = get_settings()
+    provider = settings.websocket_provider.lower()
+
+    if provider in ["pusher", "all"]:
+        pusher_channels = [channel for channel in websocket_channels if not is_gateway_channel(channel)]
+        await broadcast_pusher(event, data=data, pusher_channels=pusher_channels)
+
+    if provider in ["native", "all"]:
+        gateway_channels = [channel for channel in websocket_channels if is_gateway_channel(channel)]
+        await broadcast_gateway(event, data=data, gateway_channels=gateway_channels)
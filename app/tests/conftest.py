@@ -18,7 +18,7 @@ from app.helpers import cloudflare
 from app.helpers.cache_utils import cache
 from app.helpers.connection import get_client, get_db
 from app.helpers.crypto import create_ed25519_keypair
-from app.helpers.jwt import generate_jwt_token
+from app.helpers.tokens import generate_actor_tokens
 from app.main import get_application
 from app.models.app import App, AppInstalled
 from app.models.auth import RefreshToken
@@ -218,14 +218,12 @@ async def authorized_client(client: AsyncClient, private_key: bytes, current_use
 @pytest.fixture
 async def get_authorized_client(client: AsyncClient, redis: Redis):
     async def _get_authorized_client(user: User):
-        access_token = generate_jwt_token(data={"sub": str(user.id)})
-        refresh_token = generate_jwt_token(data={"sub": str(user.id)}, token_type="refresh")
+        access_token, refresh_token = await generate_actor_tokens(str(user.pk), claims={})
         await create_item(
             RefreshTokenCreateSchema(refresh_token=refresh_token, user=str(user.id)),
             result_obj=RefreshToken,
             current_user=user,
         )
-        await redis.sadd(f"refresh_tokens:{str(user.pk)}", refresh_token)
         client.headers.update({"Authorization": f"Bearer {access_token}"})
         return client
 
@@ -244,15 +242,11 @@ async def get_app_authorized_client(client: AsyncClient, redis: Redis, current_u
         if not scopes:
             scopes = ["messages.list", "messages.create"]
 
-        if not access_token:
-            access_token = generate_jwt_token(
-                data={"sub": str(integration.pk), "client_id": integration.client_id, "scopes": scopes}
-            )
-        if not refresh_token:
-            refresh_token = generate_jwt_token(
-                data={"sub": str(integration.pk), "client_id": integration.client_id, "scopes": scopes},
-                token_type="refresh",
-            )
+        new_access_token, new_refresh_token = await generate_actor_tokens(
+            str(integration.pk), claims={"client_id": integration.client_id, "scopes": scopes}
+        )
+        access_token = access_token or new_access_token
+        refresh_token = refresh_token or new_refresh_token
 
         if channels:
             for channel in channels:
@@ -266,7 +260,6 @@ async def get_app_authorized_client(client: AsyncClient, redis: Redis, current_u
             result_obj=RefreshToken,
             user_field=None,
         )
-        await redis.sadd(f"refresh_tokens:{str(integration.pk)}", refresh_token)
         client.headers.update({"Authorization": f"Bearer {access_token}"})
         return client
 
@@ -317,3 +310,22 @@ async def mock_whitelist_feature(monkeypatch):
     yield monkeypatch
     get_settings.cache_clear()
     monkeypatch.delenv("FEATURE_WHITELIST", raising=False)
+
+
+@pytest.fixture(scope="function")
+async def mock_auto_join_feature(monkeypatch):
+    get_settings.cache_clear()
+    monkeypatch.setenv("FEATURE_AUTO_JOIN", "1")
+    yield monkeypatch
+    monkeypatch.delenv("FEATURE_AUTO_JOIN", raising=False)
+    monkeypatch.delenv("FEATURE_AUTO_JOIN_CHANNEL_IDS", raising=False)
+    get_settings.cache_clear()
+
+
+@pytest.fixture(scope="function")
+async def mock_channel_last_message_coalescing(monkeypatch):
+    get_settings.cache_clear()
+    monkeypatch.setenv("CHANNEL_LAST_MESSAGE_COALESCE_SECONDS", "1")
+    yield monkeypatch
+    monkeypatch.delenv("CHANNEL_LAST_MESSAGE_COALESCE_SECONDS", raising=False)
+    get_settings.cache_clear()
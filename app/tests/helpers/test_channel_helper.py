@@ -1,9 +1,24 @@
+import asyncio
+import datetime
+import time
+
 import pytest
 from pymongo.database import Database
 
-from app.helpers.channels import is_user_in_channel
+from app.helpers import channels as channels_helper
+from app.helpers.cache_utils import cache
+from app.helpers.channels import (
+    fetch_and_cache_channel,
+    flush_due_channel_last_messages,
+    get_channel_members_key,
+    is_user_channel_member,
+    is_user_in_channel,
+    update_channel_last_message,
+)
 from app.models.channel import Channel
 from app.models.user import User
+from app.services.channels import join_channel
+from app.services.crud import get_item_by_id
 
 
 class TestChannelHelper:
@@ -26,3 +41,78 @@ class TestChannelHelper:
         self, db: Database, current_user: User, dm_channel: Channel, guest_user: User
     ):
         assert await is_user_in_channel(guest_user, dm_channel) is False
+
+    @pytest.mark.asyncio
+    async def test_fetch_and_cache_channel_members(self, db: Database, current_user: User, dm_channel: Channel):
+        await fetch_and_cache_channel(str(dm_channel.pk))
+        await fetch_and_cache_channel(str(dm_channel.pk))
+
+        members_key = get_channel_members_key(str(dm_channel.pk))
+        assert await cache.client.sismember(members_key, str(current_user.pk))
+        assert await cache.client.ttl(members_key) == -1
+        assert await cache.client.keys(f"{members_key}:*") == []
+
+    @pytest.mark.asyncio
+    async def test_fetch_and_cache_channel_keeps_concurrent_join(
+        self, db: Database, current_user: User, guest_user: User, topic_channel: Channel, monkeypatch
+    ):
+        channel_id = str(topic_channel.pk)
+        await fetch_and_cache_channel(channel_id)
+
+        original_get_channel_member_ids = channels_helper.get_channel_member_ids
+
+        async def _get_channel_member_ids(*args, **kwargs):
+            member_ids = await original_get_channel_member_ids(*args, **kwargs)
+            # the guest joins after the members were read, but before the rebuilt set is swapped in
+            await join_channel(channel_id, current_user=guest_user)
+            return member_ids
+
+        monkeypatch.setattr(channels_helper, "get_channel_member_ids", _get_channel_member_ids)
+        await fetch_and_cache_channel(channel_id)
+
+        assert await is_user_channel_member(channel_id, str(guest_user.pk)) is True
+        assert await is_user_channel_member(channel_id, str(current_user.pk)) is True
+
+    @pytest.mark.asyncio
+    async def test_update_channel_last_message_out_of_order(self, db: Database, topic_channel: Channel):
+        latest = datetime.datetime(2023, 1, 1, 12, 0, 5, tzinfo=datetime.timezone.utc)
+        earlier = latest - datetime.timedelta(seconds=3)
+
+        await update_channel_last_message(str(topic_channel.pk), latest)
+        await update_channel_last_message(str(topic_channel.pk), earlier)
+
+        channel = await get_item_by_id(id_=topic_channel.pk, result_obj=Channel)
+        assert channel.last_message_at == latest
+
+    @pytest.mark.asyncio
+    async def test_update_channel_last_message_coalesced(
+        self, db: Database, topic_channel: Channel, mock_channel_last_message_coalescing
+    ):
+        first = datetime.datetime(2023, 1, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+        await update_channel_last_message(str(topic_channel.pk), first)
+        await update_channel_last_message(str(topic_channel.pk), first + datetime.timedelta(seconds=5))
+        await update_channel_last_message(str(topic_channel.pk), first + datetime.timedelta(seconds=2))
+
+        channel = await get_item_by_id(id_=topic_channel.pk, result_obj=Channel)
+        assert channel.last_message_at == first
+
+        assert await flush_due_channel_last_messages() == 0
+        assert await flush_due_channel_last_messages(until=time.time() + 2) == 1
+        channel = await get_item_by_id(id_=topic_channel.pk, result_obj=Channel)
+        assert channel.last_message_at == first + datetime.timedelta(seconds=5)
+
+    @pytest.mark.asyncio
+    async def test_update_channel_last_message_coalesced_without_follow_up(
+        self, db: Database, topic_channel: Channel, mock_channel_last_message_coalescing
+    ):
+        first = datetime.datetime(2023, 1, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+        await update_channel_last_message(str(topic_channel.pk), first)
+        await update_channel_last_message(str(topic_channel.pk), first + datetime.timedelta(seconds=1))
+
+        # the lock expires and nothing else is posted, the pending message still has to be written
+        await asyncio.sleep(1.5)
+        assert await flush_due_channel_last_messages() == 1
+        channel = await get_item_by_id(id_=topic_channel.pk, result_obj=Channel)
+        assert channel.last_message_at == first + datetime.timedelta(seconds=1)
+
+        assert await flush_due_channel_last_messages() == 0
@@ -0,0 +1,35 @@
+import pytest
+from redis.asyncio.client import Redis
+
+from app.helpers.discovery import (
+    DISCOVERY_CACHE_LOCK_SECONDS,
+    _acquire_lock,
+    _get_lock_key,
+    get_cached_discovery_payload,
+    get_discovery_cache_key,
+)
+
+
+class TestDiscoveryHelper:
+    @pytest.mark.asyncio
+    async def test_expired_build_keeps_new_lock(self, redis: Redis):
+        cache_key = get_discovery_cache_key(tags=None, limit=10)
+        lock_key = _get_lock_key(cache_key)
+
+        async def _build_payload() -> str:
+            # the lock expires mid-build and another worker takes it
+            await redis.set(lock_key, "other-worker", ex=DISCOVERY_CACHE_LOCK_SECONDS)
+            return "[]"
+
+        assert await get_cached_discovery_payload(cache_key, _build_payload) == "[]"
+        assert await redis.get(lock_key) == "other-worker"
+
+    @pytest.mark.asyncio
+    async def test_build_releases_own_lock(self, redis: Redis):
+        cache_key = get_discovery_cache_key(tags=None, limit=10)
+
+        async def _build_payload() -> str:
+            return "[]"
+
+        assert await get_cached_discovery_payload(cache_key, _build_payload) == "[]"
+        assert await _acquire_lock(cache_key) is not None
@@ -0,0 +1,110 @@
+import json
+import time
+
+import pytest
+from aiohttp import web
+
+from app.helpers import expo
+from app.helpers.expo import (
+    PUSH_RECEIPTS_PENDING_KEY,
+    ExpoClient,
+    check_push_receipts,
+    chunk_push_messages,
+    send_expo_push_notifications,
+)
+from app.models.user import User
+
+
+@pytest.fixture
+async def fake_expo_server(monkeypatch):
+    state = {"send_requests": [], "receipt_requests": [], "failures": 0, "receipts": {}}
+
+    async def send(request: web.Request):
+        if state["failures"] > 0:
+            state["failures"] -= 1
+            return web.Response(status=503)
+
+        messages = json.loads(await request.read())
+        state["send_requests"].append(messages)
+        tickets = []
+        for message in messages:
+            for token in message["to"]:
+                if token.endswith("[invalid]"):
+                    details = {"error": "DeviceNotRegistered", "expoPushToken": token}
+                    tickets.append({"status": "error", "message": "not registered", "details": details})
+                else:
+                    tickets.append({"status": "ok", "id": f"ticket-{token}"})
+        return web.json_response({"data": tickets})
+
+    async def get_receipts(request: web.Request):
+        ticket_ids = json.loads(await request.read())["ids"]
+        state["receipt_requests"].append(ticket_ids)
+        receipts = {ticket_id: state["receipts"].get(ticket_id, {"status": "ok"}) for ticket_id in ticket_ids}
+        return web.json_response({"data": receipts})
+
+    server_app = web.Application()
+    server_app.router.add_post("/push/send", send)
+    server_app.router.add_post("/push/getReceipts", get_receipts)
+
+    runner = web.AppRunner(server_app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    client = ExpoClient(base_url=f"http://127.0.0.1:{port}", retry_base_delay=0.01)
+    monkeypatch.setattr(expo, "expo_client", client)
+
+    yield state
+
+    await client.close()
+    await runner.cleanup()
+
+
+class TestExpoHelper:
+    def test_chunk_push_messages(self):
+        push_messages = [{"to": [f"token-{index}", f"token-{index}-2"]} for index in range(120)]
+        chunks = chunk_push_messages(push_messages)
+        assert [len(chunk) for chunk in chunks] == [50, 50, 20]
+
+    @pytest.mark.asyncio
+    async def test_send_push_notifications(self, db, redis, fake_expo_server, create_new_user):
+        user: User = await create_new_user()
+        user.push_tokens = ["ExponentPushToken[ok]", "ExponentPushToken[invalid]"]
+        await user.commit()
+
+        fake_expo_server["failures"] = 1
+        push_messages = [{"to": [f"ExponentPushToken[{index}]"], "body": "hey"} for index in range(250)]
+        push_messages.append({"to": user.push_tokens, "body": "hey"})
+        await send_expo_push_notifications(push_messages=push_messages)
+
+        assert sorted(len(messages) for messages in fake_expo_server["send_requests"]) == [51, 100, 100]
+        assert await redis.zcard(PUSH_RECEIPTS_PENDING_KEY) == 251
+
+        await user.reload()
+        assert user.push_tokens == ["ExponentPushToken[ok]"]
+
+    @pytest.mark.asyncio
+    async def test_check_push_receipts(self, db, redis, fake_expo_server, create_new_user):
+        user: User = await create_new_user()
+        user.push_tokens = ["ExponentPushToken[1]", "ExponentPushToken[2]"]
+        await user.commit()
+
+        await send_expo_push_notifications(push_messages=[{"to": user.push_tokens, "body": "hey"}])
+
+        fake_expo_server["receipts"]["ticket-ExponentPushToken[2]"] = {
+            "status": "error",
+            "details": {"error": "DeviceNotRegistered"},
+        }
+
+        assert await check_push_receipts() == 0
+
+        sent_at = time.time() - expo.EXPO_RECEIPT_DELAY_SECONDS - 1
+        await redis.zadd(PUSH_RECEIPTS_PENDING_KEY, {"ticket-ExponentPushToken[1]": sent_at})
+        await redis.zadd(PUSH_RECEIPTS_PENDING_KEY, {"ticket-ExponentPushToken[2]": sent_at})
+
+        assert await check_push_receipts() == 2
+        assert await redis.zcard(PUSH_RECEIPTS_PENDING_KEY) == 0
+
+        await user.reload()
+        assert user.push_tokens == ["ExponentPushToken[1]"]
@@ -1,8 +1,28 @@
+import json
+
 import pytest
+from starlette.requests import Request
 
-from app.helpers.permissions import _calc_final_permissions, user_belongs_to_server
+from app.constants.permissions import (
+    ALL_PERMISSIONS,
+    ALL_PERMISSIONS_MASK,
+    has_permissions,
+    mask_to_permissions,
+    permissions_to_mask,
+)
+from app.helpers.groups import _group_handlers, fetch_user_groups_membership, register_group_handler
+from app.helpers.permissions import (
+    PERMISSIONS_MAX_BODY_SIZE_BYTES,
+    _calc_final_permissions,
+    _fetch_channel_from_request,
+    _fetch_server_from_request,
+    fetch_user_permissions,
+    user_belongs_to_server,
+)
+from app.models.channel import Channel
 from app.models.server import Server
 from app.models.user import User
+from app.services.channels import kick_member_from_channel, update_channel_permissions
 from app.services.servers import join_server
 
 
@@ -21,6 +41,31 @@ class TestPermissionsHelper:
         await join_server(str(server.pk), current_user=guest_user, ignore_joining_rules=True)
         assert await user_belongs_to_server(user=guest_user, server_id=str(server.pk)) is True
 
+    @pytest.mark.asyncio
+    async def test_compiled_permissions_invalidated_on_changes(
+        self, db, redis, current_user: User, guest_user: User, topic_channel: Channel
+    ):
+        channel_id = str(topic_channel.pk)
+        guest_user_id = str(guest_user.pk)
+
+        topic_channel.members.append(guest_user)
+        await topic_channel.commit()
+
+        permissions = await fetch_user_permissions(channel_id=channel_id, server_id=None, user_id=guest_user_id)
+        assert "messages.create" in permissions
+        assert await redis.keys(f"permissions:{guest_user_id}:{channel_id}:*")
+
+        # repeated checks are served from the compiled cache
+        assert await fetch_user_permissions(channel_id=channel_id, server_id=None, user_id=guest_user_id) == permissions
+
+        await update_channel_permissions(channel_id=channel_id, update_data=[])
+        permissions = await fetch_user_permissions(channel_id=channel_id, server_id=None, user_id=guest_user_id)
+        assert "messages.create" in permissions
+
+        await kick_member_from_channel(channel_id=channel_id, member_id=guest_user_id, current_user=current_user)
+        permissions = await fetch_user_permissions(channel_id=channel_id, server_id=None, user_id=guest_user_id)
+        assert "messages.create" not in permissions
+
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
         "required, user_roles, section_overwrites, channel_overwrites, expected_result",
@@ -75,9 +120,98 @@ class TestPermissionsHelper:
     async def test_permission_calculations(
         self, required, user_roles, channel_overwrites, section_overwrites, expected_result
     ):
-        user_permissions = await _calc_final_permissions(
-            user_roles=user_roles, section_overwrites=section_overwrites, channel_overwrites=channel_overwrites
+        permissions_mask = await _calc_final_permissions(
+            user_roles={role: permissions_to_mask(perms) for role, perms in user_roles.items()},
+            section_overwrites={role: permissions_to_mask(perms) for role, perms in section_overwrites.items()},
+            channel_overwrites={role: permissions_to_mask(perms) for role, perms in channel_overwrites.items()},
+        )
+        assert has_permissions(permissions_mask, required) == expected_result
+
+    @pytest.mark.asyncio
+    async def test_permission_mask_conversions(self):
+        assert permissions_to_mask([]) == 0
+        assert permissions_to_mask(ALL_PERMISSIONS) == ALL_PERMISSIONS_MASK
+        assert mask_to_permissions(ALL_PERMISSIONS_MASK) == sorted(ALL_PERMISSIONS)
+
+        mask = permissions_to_mask(["messages.list", "channels.view"])
+        assert mask_to_permissions(mask) == ["channels.view", "messages.list"]
+        assert permissions_to_mask(str(mask)) == mask
+        assert permissions_to_mask("messages.list,channels.view") == mask
+        assert permissions_to_mask(["messages.list", "unknown.permission", ""]) == permissions_to_mask(
+            ["messages.list"]
         )
-        u_perms = list(user_permissions)
-        calc_result = all([r_perm in u_perms for r_perm in required])
-        assert calc_result == expected_result
+
+        assert has_permissions(mask, ["messages.list"]) is True
+        assert has_permissions(mask, ["messages.list", "messages.create"]) is False
+        assert has_permissions(mask, ["unknown.permission"]) is False
+
+    @pytest.mark.asyncio
+    async def test_custom_group_membership_cached(self, db, redis, guest_user: User):
+        handler_calls = []
+
+        async def _is_test_member(wallet_addresses):
+            handler_calls.append(wallet_addresses)
+            return [True for _ in wallet_addresses]
+
+        register_group_handler("@testers", _is_test_member)
+        try:
+            user_id = str(guest_user.pk)
+            assert await fetch_user_groups_membership(user_id, ["@testers"]) == {"@testers": True}
+            assert await fetch_user_groups_membership(user_id, ["@testers"]) == {"@testers": True}
+            assert handler_calls == [[guest_user.wallet_address]]
+            assert await redis.hget(f"user:{user_id}", "wallet_address") == guest_user.wallet_address
+        finally:
+            _group_handlers.pop("@testers", None)
+
+    @staticmethod
+    def _build_request(body: bytes, path: str = "/messages", path_params: dict = None) -> Request:
+        receive_calls = []
+
+        async def receive():
+            receive_calls.append(1)
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": path,
+            "path_params": path_params or {},
+            "query_string": b"",
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        }
+        request = Request(scope, receive)
+        request.state.receive_calls = receive_calls
+        return request
+
+    @pytest.mark.asyncio
+    async def test_request_body_parsed_once(self):
+        body = json.dumps({"channel": "c" * 24, "server": "s" * 24, "content": "hello"}).encode()
+        request = self._build_request(body)
+
+        assert await _fetch_channel_from_request(request) == "c" * 24
+        assert await _fetch_server_from_request(request) == "s" * 24
+        assert len(request.state.receive_calls) == 1
+        assert request.state.permissions_json_body["channel"] == "c" * 24
+
+    @pytest.mark.asyncio
+    async def test_request_path_params_preferred_over_body(self):
+        body = json.dumps({"channel": "b" * 24}).encode()
+        request = self._build_request(body, path=f"/channels/{'c' * 24}", path_params={"channel_id": "c" * 24})
+
+        assert await _fetch_channel_from_request(request) == "c" * 24
+        assert len(request.state.receive_calls) == 0
+
+    @pytest.mark.asyncio
+    async def test_large_request_body_not_decoded(self):
+        content = "a" * PERMISSIONS_MAX_BODY_SIZE_BYTES
+        body = json.dumps({"channel": "c" * 24, "content": content}).encode()
+        request = self._build_request(body)
+
+        assert await _fetch_channel_from_request(request) is None
+        assert len(request.state.receive_calls) == 0
+
+        # bodies already decoded for the route's model are reused
+        request = self._build_request(body)
+        await request.json()
+        assert await _fetch_channel_from_request(request) == "c" * 24
+        assert len(request.state.receive_calls) == 1
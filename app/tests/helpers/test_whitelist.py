@@ -0,0 +1,44 @@
+import pytest
+
+from app.helpers import whitelist
+from app.helpers.whitelist import (
+    WHITELIST_KEY,
+    WHITELIST_LOADED_KEY,
+    is_user_whitelisted,
+    is_wallet_whitelisted,
+    whitelist_wallet,
+)
+from app.models.user import User
+
+
+class TestWhitelistHelper:
+    @pytest.mark.asyncio
+    async def test_whitelisted_wallet_kept_in_redis(self, db, redis, current_user: User, guest_user: User):
+        assert await is_wallet_whitelisted(current_user.wallet_address) is False
+        assert await redis.exists(WHITELIST_LOADED_KEY)
+
+        await whitelist_wallet(current_user.wallet_address)
+        assert await redis.sismember(WHITELIST_KEY, current_user.wallet_address)
+        assert await is_wallet_whitelisted(current_user.wallet_address.lower()) is True
+        assert await is_wallet_whitelisted(guest_user.wallet_address) is False
+
+    @pytest.mark.asyncio
+    async def test_whitelist_reloaded_from_db(self, db, redis, current_user: User):
+        await whitelist_wallet(current_user.wallet_address)
+
+        await redis.flushdb()
+        whitelist._local_whitelist_cache.clear()
+
+        assert await is_wallet_whitelisted(current_user.wallet_address) is True
+        assert await redis.sismember(WHITELIST_KEY, current_user.wallet_address)
+
+    @pytest.mark.asyncio
+    async def test_whitelist_skipped_when_feature_disabled(self, db, redis, current_user: User):
+        await whitelist_wallet(current_user.wallet_address)
+        assert await is_user_whitelisted(current_user) is False
+
+    @pytest.mark.asyncio
+    async def test_whitelist_checked_when_feature_enabled(self, db, redis, current_user: User, mock_whitelist_feature):
+        assert await is_user_whitelisted(current_user) is False
+        await whitelist_wallet(current_user.wallet_address)
+        assert await is_user_whitelisted(current_user) is True
@@ -14,6 +14,7 @@ from eth_account.messages import encode_defunct
 from fastapi import FastAPI
 from httpx import AsyncClient
 from pymongo.database import Database
+from redis.asyncio.client import Redis
 from web3 import Web3
 from web3.auto import w3
 
@@ -305,6 +306,75 @@ class TestAuthRoutes:
         response = await client.post("/auth/refresh", json=data)
         assert response.status_code == 401
 
+    @pytest.mark.asyncio
+    async def test_revoked_access_token_stays_revoked_after_new_login(
+        self,
+        app: FastAPI,
+        db: Database,
+        client: AsyncClient,
+        private_key: bytes,
+        wallet: str,
+        server: Server,
+        get_signed_message_data: Callable,
+    ):
+        data = await get_signed_message_data(private_key, wallet)
+        response = await client.post("/auth/login", json=data)
+        assert response.status_code == 201
+        old_access_token = response.json()["access_token"]
+
+        client.headers.update({"Authorization": f"Bearer {old_access_token}"})
+        response = await client.post("/auth/revoke")
+        assert response.status_code == 204
+
+        data = await get_signed_message_data(private_key, wallet)
+        response = await client.post("/auth/login", json=data)
+        assert response.status_code == 201
+        new_access_token = response.json()["access_token"]
+
+        response = await client.get("/users/me")
+        assert response.status_code == 401
+
+        client.headers.update({"Authorization": f"Bearer {new_access_token}"})
+        response = await client.get("/users/me")
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_revoked_access_token_stays_revoked_after_cache_loss(
+        self,
+        app: FastAPI,
+        db: Database,
+        redis: Redis,
+        client: AsyncClient,
+        private_key: bytes,
+        wallet: str,
+        server: Server,
+        get_signed_message_data: Callable,
+    ):
+        data = await get_signed_message_data(private_key, wallet)
+        response = await client.post("/auth/login", json=data)
+        assert response.status_code == 201
+        old_access_token = response.json()["access_token"]
+        user_id = decode_jwt_token(old_access_token)["sub"]
+
+        client.headers.update({"Authorization": f"Bearer {old_access_token}"})
+        response = await client.post("/auth/revoke")
+        assert response.status_code == 204
+
+        data = await get_signed_message_data(private_key, wallet)
+        response = await client.post("/auth/login", json=data)
+        assert response.status_code == 201
+        new_access_token = response.json()["access_token"]
+
+        # the cached generation is evicted, revocation still holds
+        await redis.delete(f"token_generation:{user_id}")
+
+        response = await client.get("/users/me")
+        assert response.status_code == 401
+
+        client.headers.update({"Authorization": f"Bearer {new_access_token}"})
+        response = await client.get("/users/me")
+        assert response.status_code == 200
+
     @pytest.mark.asyncio
     async def test_auth_with_signer(
         self,
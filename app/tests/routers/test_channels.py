@@ -14,7 +14,7 @@ from pymongo.database import Database
 from app.helpers.cache_utils import cache
 from app.helpers.whitelist import whitelist_wallet
 from app.models.app import App
-from app.models.channel import Channel
+from app.models.channel import Channel, ChannelMember
 from app.models.section import Section
 from app.models.server import Server
 from app.models.user import User
@@ -954,6 +954,154 @@ class TestChannelsRoutes:
         response = await member_client.get(f"/channels/{str(topic_channel.pk)}")
         assert response.status_code == 404
 
+    @pytest.mark.asyncio
+    async def test_cached_channel_members_set(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        topic_channel: Channel,
+        get_authorized_client: Callable,
+        create_new_user: Callable,
+    ):
+        members_key = f"channel:{{{str(topic_channel.pk)}}}:members"
+        member: User = await create_new_user()
+
+        user_client = await get_authorized_client(current_user)
+        response = await user_client.get(f"/channels/{str(topic_channel.pk)}")
+        assert response.status_code == 200
+        assert await cache.client.sismember(members_key, str(current_user.pk))
+        assert not await cache.client.hexists(f"channel:{{{str(topic_channel.pk)}}}", "members")
+
+        data = {"members": [member.wallet_address]}
+        response = await user_client.post(f"/channels/{str(topic_channel.pk)}/invite", json=data)
+        assert response.status_code == 204
+        assert await cache.client.sismember(members_key, str(member.pk))
+
+        response = await user_client.delete(f"/channels/{str(topic_channel.pk)}/members/{str(member.pk)}")
+        assert response.status_code == 204
+        assert not await cache.client.sismember(members_key, str(member.pk))
+        assert await cache.client.sismember(members_key, str(current_user.pk))
+
+    @pytest.mark.asyncio
+    async def test_external_channel_members(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        topic_channel: Channel,
+        get_authorized_client: Callable,
+        create_new_user: Callable,
+    ):
+        channel_id = str(topic_channel.pk)
+        await Channel.collection.update_one(
+            {"_id": topic_channel.pk}, {"$set": {"external_members": True}, "$unset": {"members": ""}}
+        )
+        await ChannelMember.collection.insert_one({"channel": topic_channel.pk, "user": current_user.pk})
+        await cache.client.delete(f"channel:{{{channel_id}}}", f"channel:{{{channel_id}}}:members")
+
+        members = [await create_new_user() for _ in range(3)]
+        user_client = await get_authorized_client(current_user)
+        data = {"members": [member.wallet_address for member in members]}
+        response = await user_client.post(f"/channels/{channel_id}/invite", json=data)
+        assert response.status_code == 204
+
+        channel_doc = await Channel.collection.find_one({"_id": topic_channel.pk})
+        assert "members" not in channel_doc
+        assert await ChannelMember.collection.count_documents({"channel": topic_channel.pk}) == 4
+
+        expected_ids = sorted([str(current_user.pk)] + [str(member.pk) for member in members])
+        response = await user_client.get(f"/channels/{channel_id}/members", params={"limit": 2})
+        assert response.status_code == 200
+        first_page = [member["id"] for member in response.json()]
+        assert first_page == expected_ids[:2]
+
+        response = await user_client.get(f"/channels/{channel_id}/members", params={"after": first_page[-1]})
+        assert response.status_code == 200
+        assert [member["id"] for member in response.json()] == expected_ids[2:]
+
+        response = await user_client.delete(f"/channels/{channel_id}/members/{str(members[0].pk)}")
+        assert response.status_code == 204
+        assert not await ChannelMember.collection.find_one({"channel": topic_channel.pk, "user": members[0].pk})
+
+        member_client = await get_authorized_client(members[1])
+        response = await member_client.get("/users/me/channels")
+        assert response.status_code == 200
+        assert channel_id in [channel["id"] for channel in response.json()]
+
+    @pytest.mark.asyncio
+    async def test_channel_member_count(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        topic_channel: Channel,
+        get_authorized_client: Callable,
+        create_new_user: Callable,
+    ):
+        public_permissions = [{"group": "@public", "permissions": ["channels.view", "messages.list"]}]
+        small_channel = await create_topic_channel(
+            channel_model=TopicChannelCreateSchema(name="small", permission_overwrites=public_permissions),
+            current_user=current_user,
+        )
+        assert (await Channel.collection.find_one({"_id": topic_channel.pk}))["member_count"] == 1
+
+        members = [await create_new_user() for _ in range(2)]
+        user_client = await get_authorized_client(current_user)
+        data = {"members": [member.wallet_address for member in members]}
+        response = await user_client.post(f"/channels/{str(topic_channel.pk)}/invite", json=data)
+        assert response.status_code == 204
+        response = await user_client.post(f"/channels/{str(topic_channel.pk)}/invite", json=data)
+        assert response.status_code == 204
+        assert (await Channel.collection.find_one({"_id": topic_channel.pk}))["member_count"] == 3
+
+        response = await user_client.delete(f"/channels/{str(topic_channel.pk)}/members/{str(members[0].pk)}")
+        assert response.status_code == 204
+        assert (await Channel.collection.find_one({"_id": topic_channel.pk}))["member_count"] == 2
+
+        response = await user_client.put(f"/channels/{str(topic_channel.pk)}/permissions", json=public_permissions)
+        assert response.status_code == 204
+
+        response = await user_client.get("/channels", params={"scope": "discovery"})
+        assert response.status_code == 200
+        assert [channel["id"] for channel in response.json()] == [str(topic_channel.pk), str(small_channel.pk)]
+
+    @pytest.mark.asyncio
+    async def test_discovery_cache_invalidated_on_update(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        topic_channel: Channel,
+        get_authorized_client: Callable,
+    ):
+        user_client = await get_authorized_client(current_user)
+        public_permissions = [{"group": "@public", "permissions": ["channels.view", "messages.list"]}]
+        response = await user_client.put(f"/channels/{str(topic_channel.pk)}/permissions", json=public_permissions)
+        assert response.status_code == 204
+
+        response = await user_client.get("/channels", params={"scope": "discovery", "tags": "web3"})
+        assert response.status_code == 200
+        assert response.json() == []
+
+        response = await user_client.get("/channels", params={"scope": "discovery"})
+        assert response.status_code == 200
+        assert [channel["name"] for channel in response.json()] == ["my-topic"]
+
+        response = await user_client.patch(f"/channels/{str(topic_channel.pk)}", json={"name": "renamed"})
+        assert response.status_code == 200
+
+        response = await user_client.get("/channels", params={"scope": "discovery"})
+        assert response.status_code == 200
+        assert [channel["name"] for channel in response.json()] == ["renamed"]
+
+        response = await user_client.put(f"/channels/{str(topic_channel.pk)}/permissions", json=[])
+        assert response.status_code == 204
+
+        response = await user_client.get("/channels", params={"scope": "discovery"})
+        assert response.status_code == 200
+        assert response.json() == []
+
     @pytest.mark.asyncio
     async def test_kick_member_from_channel_as_guest_nok(
         self,
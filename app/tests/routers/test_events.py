@@ -0,0 +1,144 @@
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from pymongo.database import Database
+
+from app.helpers.events import EventType
+from app.models.channel import Channel
+from app.models.user import User
+from app.services import event_streams
+from app.services.event_streams import append_event_to_streams
+
+
+class TestEventsRoutes:
+    @pytest.mark.asyncio
+    async def test_get_events_no_since(
+        self, app: FastAPI, db: Database, current_user: User, authorized_client: AsyncClient
+    ):
+        response = await authorized_client.get("/events")
+        assert response.status_code == 200
+        json_response = response.json()
+        assert json_response["seq"] is not None
+        assert json_response["events"] == []
+        assert json_response["resync"] is False
+
+    @pytest.mark.asyncio
+    async def test_get_events_since_seq(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        authorized_client: AsyncClient,
+        topic_channel: Channel,
+    ):
+        response = await authorized_client.get("/events")
+        assert response.status_code == 200
+        seq = response.json()["seq"]
+
+        channel_id = str(topic_channel.pk)
+        for read_at in ["2023-04-19T11:06:21", "2023-04-19T11:07:21"]:
+            event_data = {"user": {"id": str(current_user.pk)}, "channel": channel_id, "read_at": read_at}
+            await append_event_to_streams(EventType.CHANNEL_READ, event_data)
+
+        response = await authorized_client.get("/events", params={"since": seq})
+        assert response.status_code == 200
+        json_response = response.json()
+        assert json_response["resync"] is False
+        assert json_response["has_more"] is False
+        assert len(json_response["events"]) == 2
+        assert [event["event"] for event in json_response["events"]] == ["CHANNEL_READ", "CHANNEL_READ"]
+        assert json_response["events"][0]["data"]["read_at"] == "2023-04-19T11:06:21"
+        assert json_response["seq"] == json_response["events"][-1]["seq"]
+
+        response = await authorized_client.get("/events", params={"since": seq, "limit": 1})
+        assert response.status_code == 200
+        json_response = response.json()
+        assert len(json_response["events"]) == 1
+        assert json_response["has_more"] is True
+
+        response = await authorized_client.get("/events", params={"since": json_response["seq"]})
+        assert response.status_code == 200
+        json_response = response.json()
+        assert len(json_response["events"]) == 1
+        assert json_response["events"][0]["data"]["read_at"] == "2023-04-19T11:07:21"
+
+    @pytest.mark.asyncio
+    async def test_get_events_channel_scoped(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        authorized_client: AsyncClient,
+        topic_channel: Channel,
+    ):
+        response = await authorized_client.get("/events")
+        assert response.status_code == 200
+        seq = response.json()["seq"]
+
+        channel_id = str(topic_channel.pk)
+        message_data = {"message": {"id": "64414a3bf2e2e2ee1bd30c38", "channel": channel_id, "content": "gm"}}
+        await append_event_to_streams(EventType.MESSAGE_CREATE, message_data)
+
+        # the payload is kept once in the channel stream, member streams only reference it
+        assert await event_streams.cache.client.xlen(f"events:channel:{channel_id}") == 1
+        user_entries = await event_streams.cache.client.xrange(f"events:{str(current_user.pk)}")
+        assert "payload" not in user_entries[-1][1]
+
+        response = await authorized_client.get("/events", params={"since": seq})
+        assert response.status_code == 200
+        json_response = response.json()
+        assert json_response["resync"] is False
+        assert len(json_response["events"]) == 1
+        assert json_response["events"][0]["event"] == "MESSAGE_CREATE"
+        assert json_response["events"][0]["data"] == message_data
+
+        await event_streams.cache.client.delete(f"events:channel:{channel_id}")
+        response = await authorized_client.get("/events", params={"since": seq})
+        assert response.status_code == 200
+        assert response.json()["resync"] is True
+
+    @pytest.mark.asyncio
+    async def test_get_events_since_trimmed_resync(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        authorized_client: AsyncClient,
+        topic_channel: Channel,
+        monkeypatch,
+    ):
+        monkeypatch.setattr(event_streams, "EVENT_STREAM_MAX_LENGTH", 2)
+
+        response = await authorized_client.get("/events")
+        seq = response.json()["seq"]
+
+        channel_id = str(topic_channel.pk)
+        async with event_streams.cache.client.pipeline(transaction=False) as pipe:
+            for _ in range(5):
+                pipe.xadd(f"events:{str(current_user.pk)}", {"payload": "{}"})
+            pipe.xtrim(f"events:{str(current_user.pk)}", maxlen=2)
+            await pipe.execute()
+
+        event_data = {"user": {"id": str(current_user.pk)}, "channel": channel_id, "read_at": "2023-04-19"}
+        await append_event_to_streams(EventType.CHANNEL_READ, event_data)
+
+        response = await authorized_client.get("/events", params={"since": seq})
+        assert response.status_code == 200
+        json_response = response.json()
+        assert json_response["resync"] is True
+        assert json_response["events"] == []
+
+    @pytest.mark.asyncio
+    async def test_get_events_since_expired_resync(
+        self, app: FastAPI, db: Database, current_user: User, authorized_client: AsyncClient
+    ):
+        response = await authorized_client.get("/events", params={"since": "1681902381043-0"})
+        assert response.status_code == 200
+        assert response.json()["resync"] is True
+
+    @pytest.mark.asyncio
+    async def test_get_events_invalid_since(
+        self, app: FastAPI, db: Database, current_user: User, authorized_client: AsyncClient
+    ):
+        response = await authorized_client.get("/events", params={"since": "not-a-seq"})
+        assert response.status_code == 400
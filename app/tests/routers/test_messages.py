@@ -9,6 +9,7 @@ from fastapi import FastAPI
 from httpx import AsyncClient
 from pymongo.database import Database
 
+from app import dependencies
 from app.helpers.message_utils import blockify_content, get_message_mentions
 from app.helpers.whitelist import whitelist_wallet
 from app.models.app import App
@@ -1483,3 +1484,40 @@ class TestMessagesRoutes:
         assert response.status_code == 200
         json_response = response.json()
         assert json_response == []
+
+    @pytest.mark.asyncio
+    async def test_create_message_resolves_auth_once(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        authorized_client: AsyncClient,
+        topic_channel: Channel,
+        monkeypatch,
+    ):
+        calls = {"jwt": 0, "user": 0, "revocation": 0}
+
+        original_decode_jwt_token = dependencies.decode_jwt_token
+        original_fetch_cached_user = dependencies.fetch_cached_user
+        original_is_token_revoked = dependencies.is_token_revoked
+
+        def _decode_jwt_token(*args, **kwargs):
+            calls["jwt"] += 1
+            return original_decode_jwt_token(*args, **kwargs)
+
+        async def _fetch_cached_user(*args, **kwargs):
+            calls["user"] += 1
+            return await original_fetch_cached_user(*args, **kwargs)
+
+        async def _is_token_revoked(*args, **kwargs):
+            calls["revocation"] += 1
+            return await original_is_token_revoked(*args, **kwargs)
+
+        monkeypatch.setattr(dependencies, "decode_jwt_token", _decode_jwt_token)
+        monkeypatch.setattr(dependencies, "fetch_cached_user", _fetch_cached_user)
+        monkeypatch.setattr(dependencies, "is_token_revoked", _is_token_revoked)
+
+        data = {"content": "gm!", "channel": str(topic_channel.pk)}
+        response = await authorized_client.post("/messages", json=data)
+        assert response.status_code == 201
+        assert calls == {"jwt": 1, "user": 1, "revocation": 1}
@@ -3,7 +3,7 @@ from fastapi import FastAPI
 from httpx import AsyncClient
 from pymongo.database import Database
 
-from app.constants.permissions import Permission
+from app.constants.permissions import Permission, permissions_to_mask
 from app.helpers.cache_utils import cache
 from app.models.server import Server
 from app.models.user import User
@@ -34,7 +34,7 @@ class TestRoleRoutes:
 
         for role, perms in resp_roles.items():
             cached_perms = await cache.client.hget(f"server:{str(server.pk)}", f"roles.{role}")
-            assert cached_perms == perms
+            assert cached_perms == str(permissions_to_mask(perms))
 
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
@@ -7,7 +7,7 @@ from fastapi import FastAPI
 from httpx import AsyncClient
 from pymongo.database import Database
 
-from app.helpers.cache_utils import cache
+from app.helpers.cache_utils import cache, get_channel_cache_key
 from app.models.channel import Channel
 from app.models.section import Section
 from app.models.server import Server, ServerJoinRule, ServerMember
@@ -522,14 +522,14 @@ class TestServerRoutes:
         response = await authorized_client.put(f"/servers/{str(server.pk)}/sections", json=section_updates)
         assert response.status_code == 200
 
-        cached_section_id = await cache.client.hget(f"channel:{str(server_channel.pk)}", "section")
+        cached_section_id = await cache.client.hget(get_channel_cache_key(str(server_channel.pk)), "section")
         assert cached_section_id == str(section.pk)
 
         section_updates = [{"id": str(section.pk), "channels": []}]
         response = await authorized_client.put(f"/servers/{str(server.pk)}/sections", json=section_updates)
         assert response.status_code == 200
 
-        cached_section_id = await cache.client.hget(f"channel:{str(server_channel.pk)}", "section")
+        cached_section_id = await cache.client.hget(get_channel_cache_key(str(server_channel.pk)), "section")
         assert cached_section_id == ""
 
     @pytest.mark.asyncio
@@ -1,10 +1,13 @@
-from typing import Callable
+from typing import Callable, List
 
 import pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
+from motor.motor_asyncio import AsyncIOMotorCollection
 from pymongo.database import Database
+from redis.asyncio.client import Redis
 
+from app.helpers.principals import clear_cached_users
 from app.models.channel import Channel
 from app.models.server import Server
 from app.models.user import User
@@ -135,6 +138,67 @@ class TestUserRoutes:
         assert json_response["display_name"] != old_display_name
         assert json_response["display_name"] == data["display_name"]
 
+    @pytest.mark.asyncio
+    async def test_update_user_profile_clears_cached_user(
+        self, app: FastAPI, db: Database, redis: Redis, authorized_client: AsyncClient, current_user: User
+    ):
+        response = await authorized_client.get("/users/me")
+        assert response.status_code == 200
+        assert await redis.exists(f"principal:user:{str(current_user.pk)}")
+
+        data = {"description": "cached no more"}
+        response = await authorized_client.patch("/users/me", json=data)
+        assert response.status_code == 200
+        assert not await redis.exists(f"principal:user:{str(current_user.pk)}")
+
+        response = await authorized_client.get("/users/me")
+        assert response.status_code == 200
+        assert response.json()["description"] == data["description"]
+
+    @pytest.mark.asyncio
+    async def test_get_user_me_auth_calls(
+        self,
+        app: FastAPI,
+        db: Database,
+        redis: Redis,
+        authorized_client: AsyncClient,
+        current_user: User,
+        monkeypatch,
+    ):
+        mongo_calls: List[str] = []
+        redis_calls: List[str] = []
+
+        original_find_one = AsyncIOMotorCollection.find_one
+        original_execute_command = redis.execute_command
+
+        def _find_one(collection, *args, **kwargs):
+            mongo_calls.append(collection.name)
+            return original_find_one(collection, *args, **kwargs)
+
+        async def _execute_command(*args, **options):
+            redis_calls.append(args[0])
+            return await original_execute_command(*args, **options)
+
+        await clear_cached_users([current_user.pk])
+        await redis.delete(f"token_generation:{str(current_user.pk)}")
+        monkeypatch.setattr(AsyncIOMotorCollection, "find_one", _find_one)
+        monkeypatch.setattr(redis, "execute_command", _execute_command)
+
+        # cold caches: the user and the token generation are loaded from mongo and cached
+        response = await authorized_client.get("/users/me")
+        assert response.status_code == 200
+        assert mongo_calls == ["users", "token_generations"]
+        assert redis_calls == ["GET", "SET", "GET", "EVALSHA"]
+
+        mongo_calls.clear()
+        redis_calls.clear()
+
+        # warm principal cache: only the token generation is read
+        response = await authorized_client.get("/users/me")
+        assert response.status_code == 200
+        assert mongo_calls == []
+        assert redis_calls == ["GET"]
+
     @pytest.mark.asyncio
     async def test_list_channels_ok(
         self, app: FastAPI, db: Database, authorized_client: AsyncClient, topic_channel: Channel, dm_channel: Channel
@@ -431,3 +495,44 @@ class TestUserRoutes:
         response_channel_ids = [c["id"] for c in response.json()]
         expected_channel_ids = [str(c.pk) for c in [current_user_channel, target_user_channel]]
         assert sorted(response_channel_ids) == sorted(expected_channel_ids)
+
+    @pytest.mark.asyncio
+    async def test_fetch_user_channels_permissions(
+        self,
+        authorized_client: AsyncClient,
+        current_user: User,
+        create_new_user: Callable,
+        create_new_topic_channel: Callable,
+        topic_channel: Channel,
+        dm_channel: Channel,
+    ):
+        other_user = await create_new_user()
+        other_user_channel = await create_new_topic_channel(other_user)
+        public_channel = await create_new_topic_channel(other_user)
+        await update_item(
+            item=public_channel,
+            data={"permission_overwrites": [{"group": "@public", "permissions": ["channels.view", "messages.list"]}]},
+        )
+
+        channel_ids = [str(channel.pk) for channel in [topic_channel, dm_channel, other_user_channel, public_channel]]
+
+        # batch results (cold and warm cache) match the single channel endpoint
+        for _ in range(2):
+            response = await authorized_client.post("/users/me/permissions", json={"channels": channel_ids})
+            assert response.status_code == 200
+            json_response = response.json()
+            assert set(json_response.keys()) == set(channel_ids)
+
+            for channel_id in channel_ids:
+                response = await authorized_client.get(f"/channels/{channel_id}/permissions")
+                expected = response.json() if response.status_code == 200 else []
+                assert sorted(json_response[channel_id]) == sorted(expected)
+
+        assert json_response[str(other_user_channel.pk)] == []
+        assert json_response[str(public_channel.pk)] == ["channels.view", "messages.list"]
+
+    @pytest.mark.asyncio
+    async def test_fetch_user_channels_permissions_too_many(self, authorized_client: AsyncClient):
+        channel_ids = ["0" * 24] * 201
+        response = await authorized_client.post("/users/me/permissions", json={"channels": channel_ids})
+        assert response.status_code == 422
@@ -349,6 +349,56 @@ class TestWebhookRoutes:
         assert current_user.online_channels == []
         assert current_user.status == "offline"
 
+    @pytest.mark.asyncio
+    async def test_pusher_batched_events(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        guest_user: User,
+        integration_app: App,
+        authorized_client: AsyncClient,
+    ):
+        settings = get_settings()
+
+        user_channel1_id = f"private-{str(current_user.id)}-1"
+        user_channel2_id = f"private-{str(current_user.id)}-2"
+        guest_channel_id = f"private-{str(guest_user.id)}"
+        app_channel_id = f"private-{str(integration_app.id)}"
+
+        guest_user.online_channels = [guest_channel_id]
+        guest_user.status = "online"
+        await guest_user.commit()
+
+        events = [
+            {"channel": user_channel1_id, "name": "channel_occupied"},
+            {"channel": user_channel2_id, "name": "channel_occupied"},
+            {"channel": app_channel_id, "name": "channel_occupied"},
+            {"channel": guest_channel_id, "name": "channel_vacated"},
+            {"channel": user_channel1_id, "name": "channel_vacated"},
+            {"channel": "private-unknown", "name": "channel_occupied"},
+        ]
+        json_data = {"time_ms": time.time() * 1000, "events": events}
+        signature = hmac.new(
+            settings.pusher_secret.encode("utf8"), json.dumps(json_data).encode("utf8"), hashlib.sha256
+        ).hexdigest()
+        headers = {"X-Pusher-Key": settings.pusher_key, "X-Pusher-Signature": signature}
+        response = await authorized_client.post("/webhooks/pusher", json=json_data, headers=headers)
+        assert response.status_code == 200
+        await asyncio.sleep(random.random())
+
+        await current_user.reload()
+        assert current_user.online_channels == [user_channel2_id]
+        assert current_user.status == "online"
+
+        await guest_user.reload()
+        assert guest_user.online_channels == []
+        assert guest_user.status == "offline"
+
+        await integration_app.reload()
+        assert integration_app.online_channels == [app_channel_id]
+        assert integration_app.status == "online"
+
     @pytest.mark.asyncio
     async def test_post_webhook_message_ok(
         self,
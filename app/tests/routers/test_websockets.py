@@ -1,14 +1,49 @@
+import asyncio
+import json
+from typing import cast
+
 import pytest
+from eth_account import Account
 from fastapi import FastAPI
 from httpx import AsyncClient
 from pymongo.database import Database
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocket, WebSocketDisconnect
 
+from app.config import get_settings
+from app.helpers.events import EventType
+from app.helpers.gateway import (
+    GATEWAY_CHANNEL_PREFIX,
+    SEND_BUFFER_MAX_SIZE,
+    SLOW_CONSUMER_CLOSE_CODE,
+    GatewayConnection,
+    gateway,
+)
+from app.helpers.tokens import generate_actor_tokens
 from app.models.channel import Channel
 from app.models.message import Message
 from app.models.user import User
 from app.schemas.messages import MessageCreateSchema
-from app.services.crud import create_item
-from app.services.websockets import get_ws_online_channels
+from app.schemas.users import UserCreateSchema
+from app.services.crud import create_item, get_item_by_id
+from app.services.users import create_user
+from app.services.websockets import broadcast_websocket_message, fetch_ws_channels_for_scope, get_ws_online_channels
+
+
+class MockWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data: str):
+        self.sent.append(data)
+
+
+@pytest.fixture
+async def native_websocket_provider(monkeypatch):
+    get_settings.cache_clear()
+    monkeypatch.setenv("WEBSOCKET_PROVIDER", "native")
+    yield
+    get_settings.cache_clear()
 
 
 class TestWebsocketRoutes:
@@ -92,3 +127,86 @@ class TestWebsocketRoutes:
         assert len(channels) == 1
         channels = await get_ws_online_channels(channel=message_channel)
         assert len(channels) == 1
+
+    @pytest.mark.asyncio
+    async def test_websocket_user_channels_unique_members(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        guest_user: User,
+        create_new_topic_channel,
+    ):
+        for _ in range(3):
+            channel = await create_new_topic_channel(user=current_user)
+            channel.members.append(guest_user)
+            await channel.commit()
+
+        current_user.online_channels = [f"private-{str(current_user.id)}"]
+        await current_user.commit()
+        guest_user.online_channels = [f"private-{str(guest_user.id)}"]
+        await guest_user.commit()
+
+        event_data = {"user": current_user.dump()}
+        channels = await fetch_ws_channels_for_scope("user_channels", EventType.USER_PRESENCE_UPDATE, event_data)
+        assert sorted(channels) == sorted([f"private-{str(current_user.id)}", f"private-{str(guest_user.id)}"])
+
+    @pytest.mark.asyncio
+    async def test_websocket_gateway_broadcast(
+        self,
+        app: FastAPI,
+        db: Database,
+        current_user: User,
+        native_websocket_provider,
+    ):
+        connection = GatewayConnection(websocket=cast(WebSocket, MockWebSocket()), actor_id=str(current_user.pk))
+        await gateway.register(connection)
+
+        current_user.online_channels = [connection.channel_name]
+        await current_user.commit()
+
+        try:
+            event_data = {"read_at": "2023-01-01T00:00:00+00:00", "channel": "123", "user": current_user.dump()}
+            await broadcast_websocket_message(EventType.CHANNEL_READ, event_data)
+
+            payload = await asyncio.wait_for(connection.send_buffer.get(), timeout=2)
+        finally:
+            await gateway.unregister(connection)
+
+        assert json.loads(payload) == {"event": EventType.CHANNEL_READ.value, "data": event_data}
+
+    @pytest.mark.asyncio
+    async def test_websocket_gateway_slow_consumer_closed(self, app: FastAPI, current_user: User):
+        connection = GatewayConnection(websocket=cast(WebSocket, MockWebSocket()), actor_id=str(current_user.pk))
+
+        for index in range(SEND_BUFFER_MAX_SIZE):
+            assert connection.enqueue(str(index)) is True
+
+        assert connection.enqueue("overflow") is False
+        assert connection.close_code == SLOW_CONSUMER_CLOSE_CODE
+        assert connection.enqueue("after close") is False
+
+    def test_websocket_gateway_connection(self, app: FastAPI, native_websocket_provider):
+        # the gateway runs in the test client's own event loop, so setup goes through its portal as well
+        with TestClient(app) as test_client:
+            portal = test_client.portal
+            assert portal is not None
+
+            user = portal.call(create_user, UserCreateSchema(wallet_address=Account.create().address))
+            access_token, _ = portal.call(generate_actor_tokens, str(user.pk), {})
+
+            with test_client.websocket_connect(f"/websockets/gateway?token={access_token}") as websocket:
+                websocket.send_json({"event": "PING"})
+                assert websocket.receive_json() == {"event": "PONG"}
+
+                user = portal.call(get_item_by_id, user.pk, User)
+                assert [channel for channel in user.online_channels if channel.startswith(GATEWAY_CHANNEL_PREFIX)]
+
+            user = portal.call(get_item_by_id, user.pk, User)
+            assert not [channel for channel in user.online_channels if channel.startswith(GATEWAY_CHANNEL_PREFIX)]
+
+    def test_websocket_gateway_invalid_token_closed(self, app: FastAPI, native_websocket_provider):
+        with TestClient(app) as test_client:
+            with pytest.raises(WebSocketDisconnect):
+                with test_client.websocket_connect("/websockets/gateway?token=invalid") as websocket:
+                    websocket.receive_text()
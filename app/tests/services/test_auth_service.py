@@ -4,6 +4,7 @@ from typing import Callable
 
 import arrow
 import pytest
+from bson import ObjectId
 from cryptography.hazmat.primitives._serialization import Encoding, PublicFormat
 from eth_account.datastructures import SignedMessage
 from eth_account.messages import encode_defunct
@@ -19,9 +20,11 @@ from app.helpers.w3 import (
     get_wallet_address_from_broadcast_identity_payload,
 )
 from app.models.auth import RefreshToken
+from app.models.channel import Channel
 from app.models.server import Server
 from app.models.user import User
 from app.schemas.auth import AccountBroadcastIdentitySchema, AuthWalletSchema, RefreshTokenCreateSchema
+from app.services import auth as auth_service
 from app.services.auth import broadcast_user_identity, create_refresh_token, generate_wallet_token, revoke_tokens
 from app.services.crud import delete_item, get_item, get_items, update_item
 from app.services.users import get_user_by_id
@@ -60,6 +63,35 @@ class TestAuthService:
         assert user is not None
         assert user.wallet_address == wallet
 
+    @pytest.mark.asyncio
+    async def test_add_user_to_default_channels_only_once(
+        self, db, mock_auto_join_feature, current_user: User, guest_user: User, topic_channel: Channel
+    ):
+        monkeypatch = mock_auto_join_feature
+        monkeypatch.setenv("FEATURE_AUTO_JOIN_CHANNEL_IDS", str(topic_channel.pk))
+
+        queued_tasks = []
+
+        async def _queue_bg_task(f, *args, **kwargs):
+            queued_tasks.append(args)
+
+        monkeypatch.setattr(auth_service, "queue_bg_task", _queue_bg_task)
+
+        await auth_service.queue_add_user_to_default_channels(str(guest_user.pk))
+        assert queued_tasks == [(str(guest_user.pk),)]
+
+        await auth_service.add_user_to_default_channels(str(guest_user.pk))
+        await topic_channel.reload()
+        assert guest_user in topic_channel.members
+
+        await auth_service.queue_add_user_to_default_channels(str(guest_user.pk))
+        assert len(queued_tasks) == 1
+
+        get_settings.cache_clear()
+        monkeypatch.setenv("FEATURE_AUTO_JOIN_CHANNEL_IDS", f"{str(topic_channel.pk)},{str(ObjectId())}")
+        await auth_service.queue_add_user_to_default_channels(str(guest_user.pk))
+        assert len(queued_tasks) == 2
+
     @pytest.mark.asyncio
     async def test_generate_access_token_missing_signed_at_in_message(
         self, db, private_key: bytes, wallet: str, server: Server, get_signed_message_data: Callable
@@ -326,6 +358,40 @@ class TestAuthService:
         assert len(user.signers) == 1
         assert user.signers[0] == signer_str_public_key
 
+    @pytest.mark.asyncio
+    async def test_broadcast_account_identity_caches_signers(self, db, redis, private_key: bytes, wallet: str):
+        async def _broadcast_new_signer() -> str:
+            _, signer_public_key = await create_ed25519_keypair()
+            signer_str_public_key = (
+                "0x" + signer_public_key.public_bytes(encoding=Encoding.Raw, format=PublicFormat.Raw).hex()
+            )
+            to_sign_input_struct = {
+                "account": wallet,
+                "timestamp": int(time.time() * 1000),
+                "type": "account-broadcast",
+                "body": {"signers": [{"public_key": signer_str_public_key}]},
+            }
+            signable_message = await get_signable_message_for_broadcast_identity_payload(to_sign_input_struct)
+            signed_message: SignedMessage = w3.eth.account.sign_message(signable_message, private_key=private_key.hex())
+            data = {
+                "headers": {
+                    "signature_scheme": "EIP-712",
+                    "hash_scheme": "SHA256",
+                    "signature": signed_message.signature.hex(),
+                },
+                "payload": to_sign_input_struct,
+            }
+            await broadcast_user_identity(AccountBroadcastIdentitySchema(**data))
+            return signer_str_public_key
+
+        first_signer = await _broadcast_new_signer()
+        user = await get_item(filters={"wallet_address": wallet}, result_obj=User)
+        assert await redis.get(f"signer:{first_signer}") == str(user.pk)
+
+        second_signer = await _broadcast_new_signer()
+        assert await redis.get(f"signer:{second_signer}") == str(user.pk)
+        assert await redis.get(f"signer:{first_signer}") is None
+
     @pytest.mark.asyncio
     async def test_broadcast_account_identity_wrong_signer(self, db, private_key: bytes, wallet: str):
         user = await get_item(filters={"wallet_address": wallet}, result_obj=User)
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.helpers.events import EventType
+from app.services import events
+from app.services.events import broadcast_event, register_event_sink
+
+
+@pytest.fixture
+def event_sinks(monkeypatch):
+    monkeypatch.setattr(events, "_event_sinks", {})
+
+
+class TestEventsService:
+    @pytest.mark.asyncio
+    async def test_broadcast_event_sink_failure_isolated(self, event_sinks):
+        received = []
+
+        async def failing_sink(event: EventType, data: dict):
+            raise Exception("sink failure")
+
+        async def working_sink(event: EventType, data: dict):
+            received.append((event, data))
+
+        register_event_sink("failing", failing_sink)
+        register_event_sink("working", working_sink)
+
+        await broadcast_event(EventType.CHANNEL_READ, {"channel": "1"})
+        assert received == [(EventType.CHANNEL_READ, {"channel": "1"})]
+
+    @pytest.mark.asyncio
+    async def test_broadcast_event_sinks_concurrent(self, event_sinks):
+        started = asyncio.Event()
+        seen_by_waiting_sink = []
+
+        async def waiting_sink(event: EventType, data: dict):
+            # only completes if the other sink runs while this one is still waiting
+            await asyncio.wait_for(started.wait(), timeout=1)
+            seen_by_waiting_sink.append(True)
+
+        async def starting_sink(event: EventType, data: dict):
+            started.set()
+
+        register_event_sink("waiting", waiting_sink)
+        register_event_sink("starting", starting_sink)
+
+        await broadcast_event(EventType.CHANNEL_READ, {"channel": "1"})
+        assert seen_by_waiting_sink == [True]
+
+    @pytest.mark.asyncio
+    async def test_broadcast_event_sink_timeout(self, event_sinks):
+        received = []
+
+        async def slow_sink(event: EventType, data: dict):
+            await asyncio.sleep(10)
+            received.append("slow")
+
+        async def fast_sink(event: EventType, data: dict):
+            received.append("fast")
+
+        register_event_sink("slow", slow_sink, timeout=0.1)
+        register_event_sink("fast", fast_sink)
+
+        await asyncio.wait_for(broadcast_event(EventType.CHANNEL_READ, {"channel": "1"}), timeout=2)
+        assert received == ["fast"]
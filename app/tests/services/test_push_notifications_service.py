@@ -0,0 +1,106 @@
+import time
+
+import pytest
+from bson import ObjectId
+
+from app.models.channel import Channel
+from app.models.message import Message
+from app.models.user import User, UserBlock, UserPreferences
+from app.schemas.messages import MessageCreateSchema
+from app.services import push_notifications
+from app.services.crud import create_item
+from app.services.push_notifications import (
+    build_push_messages,
+    coalesce_push_messages,
+    fetch_push_notification_batch_data,
+    flush_due_push_notifications,
+)
+
+
+class TestPushNotificationsService:
+    @pytest.mark.asyncio
+    async def test_build_push_messages(self, db, current_user: User, topic_channel: Channel, create_new_user):
+        members = [await create_new_user() for _ in range(4)]
+        blocking_member, muted_member, mentions_member, member = members
+        for index, user in enumerate(members):
+            user.push_tokens = [f"ExponentPushToken[{index}]"]
+            await user.commit()
+            topic_channel.members.append(user)
+        await topic_channel.commit()
+
+        await UserBlock(author=blocking_member, user=current_user).commit()
+        await UserPreferences(user=muted_member, channels={str(topic_channel.pk): {"muted": True}}).commit()
+        await UserPreferences(user=mentions_member, channels={str(topic_channel.pk): {"mentions": True}}).commit()
+
+        message_model = MessageCreateSchema(content="hey", channel=str(topic_channel.pk))
+        message = await create_item(message_model, result_obj=Message, current_user=current_user, user_field="author")
+
+        batch_user_ids = [member.pk for member in topic_channel.members]
+        batch_data = await fetch_push_notification_batch_data(batch_user_ids, channel=topic_channel, message=message)
+        assert batch_data["blocking_user_ids"] == {blocking_member.pk}
+        assert set(batch_data["prefs_per_user_id"].keys()) == {muted_member.pk, mentions_member.pk}
+
+        push_messages = build_push_messages(
+            channel=topic_channel,
+            message=message,
+            notification_data={"title": "title", "body": "body"},
+            mentioned_user_ids=set(),
+            used_push_tokens=set(),
+            **batch_data,
+        )
+        assert list(push_messages.keys()) == [member.pk]
+        assert push_messages[member.pk]["to"] == member.push_tokens
+
+        push_messages = build_push_messages(
+            channel=topic_channel,
+            message=message,
+            notification_data={"title": "title", "body": "body"},
+            mentioned_user_ids={mentions_member.pk},
+            used_push_tokens=set(),
+            **batch_data,
+        )
+        assert set(push_messages.keys()) == {member.pk, mentions_member.pk}
+
+    @pytest.mark.asyncio
+    async def test_coalesce_push_messages(self, redis, topic_channel: Channel, monkeypatch):
+        sent_messages = []
+
+        async def mock_send_expo_push_notifications(push_messages):
+            sent_messages.extend(push_messages)
+
+        monkeypatch.setattr(push_notifications, "send_expo_push_notifications", mock_send_expo_push_notifications)
+
+        user_id, mentioned_user_id = ObjectId(), ObjectId()
+        for index in range(3):
+            push_messages = {
+                user_id: {"title": "my-topic", "body": f"message {index}", "to": ["token-1"], "badge": index},
+                mentioned_user_id: {"title": "my-topic", "body": f"message {index}", "to": ["token-2"], "badge": 1},
+            }
+            messages_to_send = await coalesce_push_messages(
+                topic_channel, push_messages, mentioned_user_ids={mentioned_user_id}, window_seconds=30
+            )
+            if index == 0:
+                assert [message["to"] for message in messages_to_send] == [["token-2"], ["token-1"]]
+            else:
+                assert [message["to"] for message in messages_to_send] == [["token-2"]]
+
+        due_members = await redis.zrange(push_notifications.PUSH_COALESCE_DUE_KEY, 0, -1)
+        assert due_members == [f"{str(topic_channel.pk)}:{str(user_id)}"]
+
+        # nothing is flushed before the window closes
+        assert await flush_due_push_notifications() == 0
+        assert sent_messages == []
+
+        assert await flush_due_push_notifications(until=time.time() + 31) == 1
+        assert await redis.zcard(push_notifications.PUSH_COALESCE_DUE_KEY) == 0
+        assert sent_messages == [
+            {"title": "my-topic", "body": "2 new messages in #my-topic", "to": ["token-1"], "badge": 2}
+        ]
+
+        messages_to_send = await coalesce_push_messages(
+            topic_channel,
+            {user_id: {"body": "message 4", "to": ["token-1"]}},
+            mentioned_user_ids=set(),
+            window_seconds=30,
+        )
+        assert len(messages_to_send) == 1
@@ -0,0 +1,33 @@
+import asyncio
+import logging
+
+from asgi_lifespan import LifespanManager
+
+from app.main import get_application
+from app.models.channel import Channel, ChannelMember
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_member_count():
+    result = await Channel.collection.update_many(
+        {"external_members": {"$ne": True}},
+        [{"$set": {"member_count": {"$size": {"$ifNull": ["$members", []]}}}}],
+    )
+    logger.info("updated member_count of %d channels", result.modified_count)
+
+    cursor = ChannelMember.collection.aggregate([{"$group": {"_id": "$channel", "count": {"$sum": 1}}}])
+    async for doc in cursor:
+        await Channel.collection.update_one(
+            {"_id": doc["_id"], "external_members": True}, {"$set": {"member_count": doc["count"]}}
+        )
+
+
+async def main():
+    app = get_application()
+    async with LifespanManager(app):
+        await backfill_member_count()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from typing import List, Optional
+
+import arrow
+from asgi_lifespan import LifespanManager
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from httpx import AsyncClient
+from web3 import Web3
+
+from app.main import get_application
+
+logger = logging.getLogger(__name__)
+
+
+def _build_login_data(account) -> dict:
+    nonce = 1234
+    signed_at = arrow.utcnow().isoformat()
+    message = f"""NOM wants you to sign in with your web3 account
+
+        {account.address}
+
+        URI: localhost
+        Nonce: {nonce}
+        Issued At: {signed_at}"""
+
+    signed_message = Web3().eth.account.sign_message(encode_defunct(text=message), private_key=account.key)
+    return {
+        "message": message,
+        "signature": signed_message.signature.hex(),
+        "signed_at": signed_at,
+        "nonce": nonce,
+        "address": account.address,
+    }
+
+
+async def _login(client: AsyncClient, account, semaphore: asyncio.Semaphore, durations: List[float]):
+    data = _build_login_data(account)
+    async with semaphore:
+        start_time = time.perf_counter()
+        response = await client.post("/auth/login", json=data)
+        durations.append((time.perf_counter() - start_time) * 1000)
+
+    if response.status_code != 201:
+        logger.warning("login failed: %s %s", response.status_code, response.text)
+
+
+async def run_benchmark(client: AsyncClient, logins: int, concurrency: int, rounds: int):
+    # the same wallets log in every round: the first one measures sign-ups, the next ones returning users
+    accounts = [Account.create() for _ in range(logins)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    for round_number in range(1, rounds + 1):
+        durations: List[float] = []
+        start_time = time.perf_counter()
+        await asyncio.gather(*[_login(client, account, semaphore, durations) for account in accounts])
+        total_seconds = time.perf_counter() - start_time
+
+        durations.sort()
+        print(
+            f"round={round_number} logins={logins} concurrency={concurrency} "
+            f"total={total_seconds:.2f}s throughput={logins / total_seconds:.1f}/s "
+            f"p50={statistics.median(durations):.1f}ms "
+            f"p95={durations[int(len(durations) * 0.95) - 1]:.1f}ms "
+            f"max={durations[-1]:.1f}ms"
+        )
+
+
+async def main(logins: int, concurrency: int, rounds: int, url: Optional[str]):
+    if url:
+        async with AsyncClient(base_url=url, timeout=None) as client:
+            await run_benchmark(client, logins=logins, concurrency=concurrency, rounds=rounds)
+        return
+
+    app = get_application()
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://benchmark", timeout=None) as client:
+            await run_benchmark(client, logins=logins, concurrency=concurrency, rounds=rounds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent wallet logins (/auth/login)")
+    parser.add_argument("--logins", type=int, default=200, help="number of distinct wallets logging in")
+    parser.add_argument("--concurrency", type=int, default=50, help="maximum number of logins in flight")
+    parser.add_argument("--rounds", type=int, default=2, help="how many times every wallet logs in")
+    parser.add_argument("--url", help="base url of a running api, runs the app in-process if not given")
+    args = parser.parse_args()
+
+    asyncio.run(main(logins=args.logins, concurrency=args.concurrency, rounds=args.rounds, url=args.url))
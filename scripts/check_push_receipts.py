@@ -0,0 +1,22 @@
+import asyncio
+import logging
+
+from asgi_lifespan import LifespanManager
+
+from app.helpers.expo import check_push_receipts
+from app.main import get_application
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    app = get_application()
+    async with LifespanManager(app):
+        try:
+            await check_push_receipts()
+        except Exception as e:
+            logger.warning(f"problem checking push receipts: {e}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
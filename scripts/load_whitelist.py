@@ -0,0 +1,19 @@
+import asyncio
+import logging
+
+from asgi_lifespan import LifespanManager
+
+from app.helpers.whitelist import load_whitelisted_wallets
+from app.main import get_application
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    app = get_application()
+    async with LifespanManager(app):
+        await load_whitelisted_wallets()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import logging
+from typing import List, Optional, Set
+
+from asgi_lifespan import LifespanManager
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.helpers.channels import fetch_and_cache_channel
+from app.helpers.dates import get_mongo_utc_date
+from app.helpers.permissions import bump_permissions_version
+from app.main import get_application
+from app.models.channel import Channel, ChannelMember
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_CHANNEL_MAX_ATTEMPTS = 10
+
+
+async def _copy_members(channel_id: ObjectId, member_ids: List[ObjectId]):
+    if not member_ids:
+        return
+
+    joined_at = get_mongo_utc_date()
+    operations = [
+        UpdateOne(
+            {"channel": channel_id, "user": member_id},
+            {"$setOnInsert": {"joined_at": joined_at, "created_at": joined_at, "deleted": False}},
+            upsert=True,
+        )
+        for member_id in member_ids
+    ]
+    await ChannelMember.collection.bulk_write(operations, ordered=False)
+
+
+async def migrate_channel(channel_id: ObjectId):
+    copied_ids: Set[ObjectId] = set()
+    for _ in range(MIGRATE_CHANNEL_MAX_ATTEMPTS):
+        channel = await Channel.collection.find_one({"_id": channel_id}, projection={"members": 1})
+        members = channel.get("members")
+        member_ids = members or []
+
+        # until the flip the rows aren't read by anyone, so they can follow the array as it changes
+        await _copy_members(channel_id, [member_id for member_id in member_ids if member_id not in copied_ids])
+        removed_ids = list(copied_ids - set(member_ids))
+        if removed_ids:
+            await ChannelMember.collection.delete_many({"channel": channel_id, "user": {"$in": removed_ids}})
+        copied_ids = set(member_ids)
+
+        # the flip only goes through if nobody joined or left since the read, so the rows match the array exactly
+        result = await Channel.collection.update_one(
+            {"_id": channel_id, "members": members},
+            {"$set": {"external_members": True}, "$unset": {"members": ""}},
+        )
+        if result.modified_count:
+            break
+    else:
+        await ChannelMember.collection.delete_many({"channel": channel_id})
+        logger.warning("members of channel %s kept changing, skipped it", channel_id)
+        return
+
+    member_count = await ChannelMember.collection.count_documents({"channel": channel_id})
+    await Channel.collection.update_one({"_id": channel_id}, {"$set": {"member_count": member_count}})
+
+    await fetch_and_cache_channel(str(channel_id))
+    await bump_permissions_version(channel_id=str(channel_id))
+    logger.info("moved %d members of channel %s", len(member_ids), channel_id)
+
+
+async def main(min_members: int, channel_id: Optional[str]):
+    app = get_application()
+    async with LifespanManager(app):
+        if channel_id:
+            await migrate_channel(ObjectId(channel_id))
+            return
+
+        cursor = Channel.collection.find(
+            {
+                f"members.{min_members - 1}": {"$exists": True},
+                "external_members": {"$ne": True},
+                "deleted": {"$ne": True},
+            },
+            projection={"_id": 1},
+        )
+        async for channel in cursor:
+            await migrate_channel(channel["_id"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move the members of large channels to the channel_members collection")
+    parser.add_argument(
+        "--min-members", type=int, default=10000, help="migrate channels with at least this many members"
+    )
+    parser.add_argument("--channel", help="only migrate this channel id")
+    args = parser.parse_args()
+
+    asyncio.run(main(min_members=args.min_members, channel_id=args.channel))